@@ -0,0 +1,107 @@
+"""Jämför den gamla struct-baserade CRD-kodaren med den numpy-baserade.
+
+Kör från repots rot:
+    python benchmarks/crd_codec.py [antal punkter]
+"""
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from crd_reader import crd_to_json, json_to_crd  # noqa: E402
+
+
+def legacy_crd_to_json(file_content):
+    """Tidigare implementation: struct.unpack per post."""
+    json_data = {"header": {}, "points": []}
+    header = file_content[:104]
+    id, date, des, format_str = struct.unpack("<d32s32s32s", header)
+    json_data["header"] = {
+        "id": id,
+        "date": date.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
+        "des": des.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
+        "format": format_str.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
+    }
+    for i in range(len(header), len(file_content), 66):
+        record = file_content[i : i + 66]
+        nor, eas, elv, des, id = struct.unpack("<ddd32s10s", record)
+        json_data["points"].append({
+            "nor": nor,
+            "eas": eas,
+            "elv": elv,
+            "des": des.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
+            "id": id.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
+        })
+    return json.dumps(json_data, indent=4)
+
+
+def legacy_json_to_crd(json_data):
+    """Tidigare implementation: struct.pack per post."""
+    crd_content = bytearray()
+    data = json.loads(json_data)
+    header = data.get("header", {})
+    crd_content.extend(struct.pack(
+        "<d32s32s32s",
+        header.get("id", 0.0),
+        header.get("date", "").encode("utf-8").ljust(32, b"\x00"),
+        header.get("des", "").encode("utf-8").ljust(32, b"\x00"),
+        header.get("format", "").encode("utf-8").ljust(32, b"\x00"),
+    ))
+    for point in data.get("points", []):
+        crd_content.extend(struct.pack(
+            "<ddd32s10s",
+            point.get("nor", 0.0),
+            point.get("eas", 0.0),
+            point.get("elv", 0.0),
+            point.get("des", "").encode("utf-8").ljust(32, b"\x00"),
+            point.get("id", "").encode("utf-8").ljust(10, b"\x00"),
+        ))
+    return bytes(crd_content)
+
+
+def synthetic_crd(count: int) -> bytes:
+    random.seed(1)
+    content = bytearray(struct.pack(
+        "<d32s32s32s", 0.0, b"2024-08-21", b"Benchmark", b"Alphanumeric"
+    ))
+    for i in range(count):
+        content += struct.pack(
+            "<ddd32s10s",
+            6300000 + random.random() * 1000,
+            500000 + random.random() * 1000,
+            100 + random.random() * 10,
+            random.choice([b"K", b"L el_SKP", b"R", b"A K ST"]),
+            str(i + 1).encode(),
+        )
+    return bytes(content)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    crd = synthetic_crd(count)
+    print(f"{count} punkter, {len(crd) / 1e6:.1f} MB")
+
+    legacy_json, legacy_read = timed(legacy_crd_to_json, crd)
+    new_json, new_read = timed(crd_to_json, crd)
+    assert legacy_json == new_json
+
+    legacy_crd, legacy_write = timed(legacy_json_to_crd, new_json)
+    new_crd, new_write = timed(json_to_crd, new_json)
+    assert legacy_crd == new_crd == crd
+
+    print(f"crd_to_json  gammal {legacy_read:.3f}s  ny {new_read:.3f}s")
+    print(f"json_to_crd  gammal {legacy_write:.3f}s  ny {new_write:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Jämför den tidigare DXF-genereringen med den numpy-baserade byggaren.
+
+Mäter tid och högsta minnesanvändning (tracemalloc) för en syntetisk
+samling fastigheter. Kör från repots rot:
+    python benchmarks/dxf_builder.py [antal fastigheter]
+"""
+import io
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import ezdxf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fastighet.dxf_builder import build_dxf  # noqa: E402
+
+
+def legacy_create_dxf(data):
+    """Tidigare implementation: kontroll och tupler punkt för punkt, bara Polygon."""
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+
+    for feature in data:
+        if "geometry" in feature and feature["geometry"].get("type") == "Polygon":
+            for coords in feature["geometry"]["coordinates"]:
+                if isinstance(coords, list) and all(isinstance(point, list) and len(point) == 2 for point in coords):
+                    points = [(float(y), float(x)) for x, y in coords]
+                    msp.add_lwpolyline(points, close=True)
+    return doc
+
+
+def _ring(north, east, radius, count):
+    ring = [
+        [north + radius * math.sin(2 * math.pi * i / count),
+         east + radius * math.cos(2 * math.pi * i / count)]
+        for i in range(count)
+    ]
+    return ring + [ring[0]]
+
+
+def synthetic_features(count: int) -> list:
+    """Fastigheter med 8-60 hörn, var tionde med hål och var tjugonde i flera delar."""
+    random.seed(1)
+    features = []
+    for i in range(count):
+        north = 6400000 + (i // 100) * 120
+        east = 330000 + (i % 100) * 120
+        polygon = [_ring(north, east, 50, random.randint(8, 60))]
+        if i % 10 == 0:
+            polygon.append(_ring(north, east, 10, 8))
+        if i % 20 == 0:
+            geometry = {"type": "MultiPolygon", "coordinates": [
+                polygon, [_ring(north + 55, east + 55, 4, 6)]
+            ]}
+        else:
+            geometry = {"type": "Polygon", "coordinates": polygon}
+        features.append({
+            "type": "Feature",
+            "geometry": geometry,
+            "properties": {
+                "objektidentitet": f"id-{i}",
+                "trakt": "BENCHMARK",
+                "etikett": f"{i // 100}:{i % 100}",
+            },
+        })
+    return features
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    doc = func(*args)
+    stream = io.StringIO()
+    doc.write(stream)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return doc, elapsed, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    features = synthetic_features(count)
+    points = sum(
+        len(ring)
+        for feature in features
+        for polygon in (
+            feature["geometry"]["coordinates"]
+            if feature["geometry"]["type"] == "MultiPolygon"
+            else [feature["geometry"]["coordinates"]]
+        )
+        for ring in polygon
+    )
+    print(f"{count} fastigheter, {points} punkter")
+
+    legacy, legacy_time, legacy_peak = measure(legacy_create_dxf, features)
+    new, new_time, new_peak = measure(build_dxf, features)
+    legacy_count = len(legacy.modelspace().query("LWPOLYLINE"))
+    new_count = len(new.modelspace().query("LWPOLYLINE"))
+
+    print(f"gammal  {legacy_time:.3f}s  {legacy_peak / 1e6:.1f} MB  {legacy_count} polylinjer")
+    print(f"ny      {new_time:.3f}s  {new_peak / 1e6:.1f} MB  {new_count} polylinjer "
+          f"(med MultiPolygon, XDATA och text)")
+    _, plain_time, plain_peak = measure(build_dxf, features, False)
+    print(f"ny utan text  {plain_time:.3f}s  {plain_peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
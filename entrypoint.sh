@@ -5,12 +5,18 @@ set -e
 if [ "$1" = "celery" ]; then
     echo "Starting Celery worker..."
     exec celery -A src.tasks worker
+elif [ "$1" = "beat" ]; then
+    # Schemalägger städningen av utgångna filer, kör bara en
+    echo "Starting Celery beat..."
+    exec celery -A src.tasks beat --schedule /tmp/celerybeat-schedule
 else
     # Kör DB-migreringar
     cd /app/src
     flask db upgrade
     cd /app
 
-    # Starta Gunicorn
-    exec gunicorn --bind 0.0.0.0:8000 "src.app:app"
+    # Starta Gunicorn, trådar så att öppna förloppsströmmar inte blockerar
+    exec gunicorn --bind 0.0.0.0:8000 \
+        --worker-class gthread --threads "${GUNICORN_THREADS:-32}" \
+        "src.app:app"
 fi
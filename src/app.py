@@ -1,4 +1,3 @@
-import base64
 import json
 import os
 import re
@@ -26,21 +25,35 @@ from config import (
     build_version,
     client_id,
     client_secret,
+    database_url,
     login_required,
     token_url,
 )
-from crd_reader import crd_to_json
+from crd_reader import CrdFile
 from crs_systems import crs_list
 from db import db
 from fastighet.routes import fastighetsindelning_bp, limiter
 from hojd.routes import hojd_bp
+from gitea import fetch_file_info as gitea_fetch_file_info
 from gitea import (
     _prepare_content,
+    fetch_dir_listing,
     fetch_file_content,
+    fetch_settings_index,
+    file_exists,
+    get_gitea,
+    get_head_sha,
+    invalidate_repo,
+    pool_stats,
+    post_contents,
+    read_setting,
 )
 from rw5_reader import read_rw5_data
+from search_index import get_tree_index
 from tasks import edit_file_task
-from tasks_routes import tasks_routes
+from tasks_routes import remember_task, tasks_routes
+
+SEARCH_PAGE_SIZE = 100
 
 app = Flask(__name__)
 app.secret_key = os.getenv("secret_key")
@@ -59,7 +72,7 @@ def sanitize_folder_name(name):
     return name
 
 # Konfigurera SQLite som databas
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////app/data/app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db.init_app(app)
@@ -168,7 +181,7 @@ def before_request():
 def repos():
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
         response = gitea.get(api_base_url + "/user/repos")
         response.raise_for_status()
@@ -201,7 +214,7 @@ def repos():
 def admin_dashboard():
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
         # Get the list of all users
         users = gitea.get(f"{api_base_url}/admin/users").json()
@@ -264,15 +277,23 @@ def admin_dashboard():
     )
 
 
+@app.route("/admin/gitea_pool")
+@login_required
+def gitea_pool():
+    """Statistik för anslutningspoolen mot Gitea i denna process."""
+    if not session["user"].get("is_admin"):
+        return jsonify({"error": "Endast för administratörer."}), 403
+    return jsonify(pool_stats())
+
+
 @app.route("/repo/<owner>/<repo_name>/contents/", defaults={"path": ""})
 @app.route("/repo/<owner>/<repo_name>/contents/<path:path>")
 @login_required
 def repo_content(owner, repo_name, path):
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
-        api_url = f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}"
         # Dela upp path i delar och bygg upp current_paths
         path_parts = path.split("/")
         current_paths = []
@@ -281,9 +302,7 @@ def repo_content(owner, repo_name, path):
             temp_path = temp_path + "/" + part if temp_path else part
             current_paths.append((temp_path, part))
 
-        response = gitea.get(api_url)
-        response.raise_for_status()
-        contents = response.json()
+        contents = fetch_dir_listing(gitea, owner, repo_name, path)
         files = [
             item
             for item in contents
@@ -371,7 +390,7 @@ def create_folder(repo_name):
     full_path = f"{path}/{folder_name}".lstrip("/")
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
         # Skicka en tom fil för att skapa en ny mapp (en tom README.md fil t.ex.)
         data = {
@@ -384,6 +403,7 @@ def create_folder(repo_name):
             json=data,
         )
         response.raise_for_status()
+        invalidate_repo(owner, repo_name, data["branch"])
 
         if response.status_code == 201:
             flash("Mappen skapades framgångsrikt.", "success")
@@ -414,21 +434,15 @@ def upload_file(repo_name):
                     repo_name=repo_name, path=path)
         )
 
-    file_content = uploaded_file.read()  # Läser filens innehåll
     file_name = uploaded_file.filename
     full_path = f"{path}/{file_name}".lstrip("/")
 
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
         # Kontrollera om filen redan finns
-        get_response = gitea.get(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{full_path}",
-            params={"ref": branch},
-        )
-
-        if get_response.status_code == 200:
+        if file_exists(gitea, owner, repo_name, full_path, ref=branch):
             flash(
                 "En fil med detta namn finns redan på den angivna platsen.", "warning"
             )
@@ -437,19 +451,16 @@ def upload_file(repo_name):
                         repo_name=repo_name, path=path)
             )
 
-        encoded_content = base64.b64encode(file_content).decode("utf-8")
-
+        # Filen base64-kodas i bitar medan den skickas
         data = {
             "message": f"Add file {full_path}",
-            "content": encoded_content,
+            "content": uploaded_file.stream,
             "branch": branch,
         }
 
-        response = gitea.post(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{full_path}",
-            json=data,
-        )
+        response = post_contents(gitea, owner, repo_name, data, path=full_path)
         response.raise_for_status()
+        invalidate_repo(owner, repo_name, branch)
 
         if response.status_code == 201:
             flash("Filen skapades framgångsrikt.", "success")
@@ -472,15 +483,10 @@ def fetch_file_info(owner, repo_name, path):
     """
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
-        # Hämta den befintliga filinformationen
-        response = gitea.get(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}"
-        )
-        response.raise_for_status()
-        file_data = response.json()
-        return file_data
+        # Hämta den befintliga filinformationen, innehållet som bytes
+        return gitea_fetch_file_info(gitea, owner, repo_name, path)
     except HTTPError as http_err:
         raise http_err
     except Exception as e:
@@ -488,20 +494,23 @@ def fetch_file_info(owner, repo_name, path):
 
 
 def find_settings_file(owner, repo_name, path, setting, max_levels=3):
-    """Letar efter settings.ini filen i denna mapp eller tre våningar upp."""
+    """Letar efter settings.ini filen i denna mapp eller tre våningar upp.
+
+    Alla settings.ini i repot hittas med ett enda träd-anrop per commit och
+    värdena cachas per blob-SHA, så uppåtvandringen sker i minnet.
+    """
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
+        sha = get_head_sha(gitea, owner, repo_name)
+        settings_index = fetch_settings_index(gitea, owner, repo_name, sha)
         current_path = path
         for _ in range(max_levels):
-            settings_path = os.path.join(current_path, "settings.ini")
-            # Kontrollera om filen existerar
-            response = gitea.get(
-                f"{api_base_url}/repos/{owner}/{repo_name}/contents/{settings_path}"
-            )
-            crs = check_crs_in_settings(response, setting)
-            if crs is not None:
-                return crs.rstrip("\\n")
+            blob_sha = settings_index.get(current_path)
+            if blob_sha:
+                crs = read_setting(gitea, owner, repo_name, blob_sha, setting)
+                if crs is not None:
+                    return crs.rstrip("\\n")
             # Gå en nivå upp
             current_path = os.path.dirname(current_path)
         return ""
@@ -512,21 +521,6 @@ def find_settings_file(owner, repo_name, path, setting, max_levels=3):
         raise e
 
 
-def check_crs_in_settings(response, setting) -> str | None:
-    """Kontrollerar om settings.ini innehåller defaultCrs= och returnerar crs."""
-
-    if response.status_code != 200:
-        return None
-
-    # Hämta och avkoda filens innehåll
-    file_data = response.json()
-    file_content = base64.b64decode(file_data["content"]).decode(
-        "utf-8", errors="ignore"
-    )
-    match = re.search(rf"{setting}=([^\s]+)", file_content)
-    return match.group(1) if match else None
-
-
 @app.route("/repo/<owner>/<repo_name>/check_file_exists", methods=["GET"])
 @login_required
 def check_file_exists(owner, repo_name):
@@ -536,17 +530,10 @@ def check_file_exists(owner, repo_name):
 
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
-        # Kontrollera om filen redan finns
-        response = gitea.get(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}"
-        )
-
-        if response.status_code == 200:
-            return jsonify({"exists": True})
-        else:
-            return jsonify({"exists": False})
+        # Kontrollera om filen redan finns, utan att ladda ner den
+        return jsonify({"exists": file_exists(gitea, owner, repo_name, path)})
     except HTTPError as http_err:
         if http_err.response.status_code == 404:
             return jsonify({"exists": False})
@@ -561,19 +548,27 @@ def get_file_content(repo_name, owner):
     path = request.args.get("path", "")
     editProject = request.args.get("editProject", "")
     editProject = True if editProject.lower() == "true" else False
+    # Valfri sidindelning av punkterna i en CRD-fil
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", None, type=int)
     if not path:
         return jsonify({"error": "Ingen fil angiven."}), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({"error": "offset och limit får inte vara negativa."}), 400
 
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
         # Hämta innehållet för den begärda filen
         file_content = fetch_file_content(gitea, owner, repo_name, path)
 
         # Kontrollera om filen är en CRD-fil
         if editProject or path.endswith(".crd"):
-            # Konvertera CRD-filens innehåll till JSON
-            file_content_json = crd_to_json(file_content)
+            # Konvertera CRD-filens innehåll till JSON, bara de punkter som efterfrågas
+            stop = offset + limit if limit is not None else None
+            with CrdFile(file_content) as crd_file:
+                file_content_json = crd_file.to_json(offset, stop)
+                point_count = len(crd_file)
 
             # Hämta .rw5-filens innehåll
             rw5_path = path.replace(".crd", ".rw5")
@@ -584,7 +579,11 @@ def get_file_content(repo_name, owner):
                 rw5_content.decode("utf-8", errors="ignore"))
 
             # Returnera båda resultaten
-            return jsonify({"content": file_content_json, "info": rw5_result})
+            return jsonify({
+                "content": file_content_json,
+                "info": rw5_result,
+                "point_count": point_count,
+            })
         else:
             # För icke-CRD-filer, returnera innehållet som text
             file_content = file_content.decode("utf-8", errors="ignore")
@@ -625,6 +624,8 @@ def edit_file(repo_name):
             session["oauth_token"]
         ]
     )
+    # Filredigeringar har ingen TaskTracker, förloppet följs via sessionen
+    remember_task(task.id)
     return jsonify({"task_id": task.id}), 202
 
 
@@ -658,7 +659,7 @@ def export_projekt(repo_name, owner, path):
     )
     commitMsg = f"Export av {projName} i {crs_name}."
 
-    gitea = OAuth2Session(client_id, token=session["oauth_token"])
+    gitea = get_gitea(session["oauth_token"])
 
     settingsFileCommit = []
     if defaultCRS.strip() != exportCRS.strip():
@@ -669,14 +670,8 @@ def export_projekt(repo_name, owner, path):
     rw5FileCommit = []
     try:
         # Hämta filens nuvarande innehåll och SHA
-        response = gitea.get(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}"
-        )
-        response.raise_for_status()
-        file_data = response.json()
-        current_content = base64.b64decode(file_data["content"]).decode(
-            "utf-8", errors="ignore"
-        )
+        file_data = gitea_fetch_file_info(gitea, owner, repo_name, path)
+        current_content = file_data["content"].decode("utf-8", errors="ignore")
         if current_content[-1] == " ":
             current_content = current_content[:-1]
         else:
@@ -706,10 +701,9 @@ def export_projekt(repo_name, owner, path):
 
     # Skapa commiten via Gitea API
     try:
-        commit_response = gitea.post(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents", json=commit_data
-        )
+        commit_response = post_contents(gitea, owner, repo_name, commit_data)
         commit_response.raise_for_status()
+        invalidate_repo(owner, repo_name, commit_data["branch"])
     except Exception as e:
         flash(f"Något gick fel: {str(e)}", "danger")
         return redirect(
@@ -737,10 +731,9 @@ def export_projekt(repo_name, owner, path):
 
     if deleteSettingsfiles:
         try:
-            delete_response = gitea.post(
-                f"{api_base_url}/repos/{owner}/{repo_name}/contents", json=delete_data
-            )
+            delete_response = post_contents(gitea, owner, repo_name, delete_data)
             delete_response.raise_for_status()
+            invalidate_repo(owner, repo_name, delete_data["branch"])
         except Exception as e:
             flash(f"Något gick fel: {str(e)}", "danger")
             return redirect(
@@ -772,9 +765,7 @@ def createSettingsFile(
     # Hämta filens nuvarande innehåll och SHA
     if settingsFilePath:
         settingsFile = fetch_file_info(owner, repo_name, settingsFilePath)
-        current_content = base64.b64decode(settingsFile["content"]).decode(
-            "utf-8", errors="ignore"
-        )
+        current_content = settingsFile["content"].decode("utf-8", errors="ignore")
         new_content = update_default_crs(current_content, exportCRS)
         return [
             {
@@ -816,14 +807,24 @@ def update_default_crs(current_content, new_crs_value):
 @app.route("/repo/<owner>/<repo_name>/search", methods=["GET"])
 @login_required
 def search_repo(owner, repo_name):
+    """Sök efter filer och mappar med namn som innehåller q.
+
+    Svaret är en sida med rankade träffar, totala antalet finns i
+    X-Total-Count. Sida och sidstorlek anges med page och limit.
+    """
     search_term = request.args.get("q", "").lower()
     sha = request.args.get("sha", "HEAD")
+    page = request.args.get("page", 1, type=int)
+    limit = max(1, min(request.args.get("limit", SEARCH_PAGE_SIZE, type=int), SEARCH_PAGE_SIZE))
 
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
-        filtered_items = search(gitea, owner, repo_name, sha, search_term)
+        if sha == "HEAD":
+            sha = get_head_sha(gitea, owner, repo_name)
+        index = get_tree_index(gitea, owner, repo_name, sha)
+        filtered_items, total = index.search(search_term, page, limit)
 
         for item in filtered_items:
             if item["type"] == "blob":
@@ -841,55 +842,19 @@ def search_repo(owner, repo_name):
                 path=path,
             )
 
-        return jsonify(filtered_items)
+        response = jsonify(filtered_items)
+        response.headers["X-Total-Count"] = str(total)
+        return response
     except Exception as e:
         return jsonify({"error": f"Fel: {e}"}), 500
 
 
-def search(
-    gitea: OAuth2Session,
-    owner: str,
-    repo: str,
-    sha: str,
-    search_term: str,
-    page: int = 0,
-) -> list:
-    # Hämta den befintliga filinformationen
-    response = gitea.get(
-        f"{api_base_url}/repos/{owner}/{repo}/git/trees/{sha}?recursive=1&page={page}"
-    )
-    response.raise_for_status()
-    tree_data = response.json()
-    result = []
-
-    # Loopa igenom hela fil-trädet
-    if not tree_data["tree"]:
-        return result
-
-    for item in tree_data["tree"]:
-        if item["path"].startswith("."):
-            continue
-
-        if "/" in item["path"]:
-            filedirname = item["path"].split("/")[-1]
-        else:
-            filedirname = item["path"]
-
-        if search_term in filedirname.lower():
-            result.append(item)
-
-    if tree_data["truncated"]:
-        result += search(gitea, owner, repo, sha, search_term, page + 1)
-
-    return result
-
-
 @app.route("/repo/<owner>/<repo_name>/actions/running", methods=["GET"])
 @login_required
 def running_actions(owner, repo_name):
     try:
         before_request()
-        gitea = OAuth2Session(client_id, token=session["oauth_token"])
+        gitea = get_gitea(session["oauth_token"])
 
         # Be Gitea endast returnera pågående workflows
         resp = gitea.get(
@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from config import artifact_dir
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def temp_dir() -> str:
+    """Katalog för filer under arbete, på samma volym som artefakterna."""
+    path = os.path.join(artifact_dir, "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def temp_path(prefix: str = "", suffix: str = "") -> str:
+    """Skapa en tom temporär fil som sedan kan lämnas till store_file."""
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=temp_dir())
+    os.close(fd)
+    return path
+
+
+def artifact_path(manifest: dict) -> str:
+    """Absolut sökväg till en artefakt utifrån dess manifest."""
+    return os.path.join(artifact_dir, manifest["path"])
+
+
+def _manifest(relative_path: str, size: int, sha256: str, content_type: str) -> dict:
+    return {
+        "path": relative_path,
+        "size": size,
+        "sha256": sha256,
+        "content_type": content_type,
+    }
+
+
+def store_file(path: str, content_type: str) -> dict:
+    """
+    Flytta en färdig fil in i artefaktlagret, adresserad efter sitt innehåll.
+
+    Filen flyttas (den finns inte kvar på path). Finns samma innehåll redan
+    återanvänds den befintliga artefakten. Returnerar ett litet manifest som
+    kan skickas via Celerys result backend i stället för själva filen.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    sha256 = digest.hexdigest()
+
+    suffix = os.path.splitext(path)[1]
+    relative_path = os.path.join(sha256[:2], sha256 + suffix)
+    target = os.path.join(artifact_dir, relative_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        os.remove(path)
+        # Förnya tiden så att den inte städas bort som gammal
+        os.utime(target)
+    else:
+        os.chmod(path, 0o644)
+        os.replace(path, target)
+    return _manifest(relative_path, size, sha256, content_type)
+
+
+def store_bytes(data: bytes, content_type: str, suffix: str = "") -> dict:
+    """Spara bytes som en artefakt, se store_file."""
+    path = temp_path(suffix=suffix)
+    with open(path, "wb") as f:
+        f.write(data)
+    return store_file(path, content_type)
+
+
+def store_gzip(chunks, content_type: str, suffix: str = "") -> dict:
+    """Spara bytes i bitar gzip-komprimerat som en artefakt.
+
+    Utan filnamn och tidsstämpel i gzip-headern, så att samma data får
+    samma artefakt.
+    """
+    path = temp_path(suffix=suffix + ".gz")
+    with open(path, "wb") as f, gzip.GzipFile(filename="", fileobj=f, mode="wb", mtime=0) as gz:
+        for chunk in chunks:
+            gz.write(chunk)
+    return store_file(path, content_type)
+
+
+def store_json(data, content_type: str = "application/json", suffix: str = ".json") -> dict:
+    """Spara JSON gzip-komprimerat som en artefakt, se store_gzip."""
+    return store_gzip(
+        [json.dumps(data, separators=(",", ":")).encode("utf-8")], content_type, suffix
+    )
+
+
+def as_manifest(value, content_type: str, suffix: str = "") -> dict:
+    """
+    Manifest för en fil i ett taskresultat.
+
+    Resultat från före artefaktlagret kan ligga kvar i result backend efter
+    en uppdatering och har då filen som bytes, eller GeoJSON som dict. De
+    sparas i lagret här. Ett manifest returneras som det är.
+    """
+    if isinstance(value, dict) and "sha256" in value:
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return store_bytes(bytes(value), content_type, suffix)
+    return store_json(value, content_type, suffix)
+
+
+def is_gzipped(manifest: dict) -> bool:
+    return manifest["path"].endswith(".gz")
+
+
+def read_bytes(manifest: dict) -> bytes:
+    """Artefaktens innehåll, packat upp om den är gzip-komprimerad."""
+    opener = gzip.open if is_gzipped(manifest) else open
+    with opener(artifact_path(manifest), "rb") as f:
+        return f.read()
+
+
+def read_artifact_json(manifest: dict):
+    return json.loads(read_bytes(manifest))
+
@@ -0,0 +1,138 @@
+from functools import lru_cache
+
+import numpy as np
+from pyproj import Transformer
+
+from geometry import parse_bbox
+
+# Antal decimaler en bbox i grader normaliseras till, 1e-6 grader är runt 10 cm.
+BBOX_DECIMALS = 6
+# Punkter per kant, räknat med hörnen, när en bbox transformeras. Kanterna
+# är raka i grader men krökta i t.ex. SWEREF99 TM.
+DENSIFY_POINTS = 21
+
+
+@lru_cache(maxsize=32)
+def get_transformer(source: str, target: str) -> Transformer:
+    """
+    Transformer mellan två CRS, t.ex. "EPSG:4326" och något ur crs_list.
+
+    Skapas första gången paret används och delas sedan inom processen.
+    Axlarna är alltid (x, y), dvs. (lon, lat) och (E, N).
+    """
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+def densify(bounds: tuple, points: int = DENSIFY_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Kanterna på bounds som en ring med points punkter per kant.
+
+    Ringen går moturs från (minx, miny): nederkant, högerkant, överkant,
+    vänsterkant. Sista punkten är inte en upprepning av den första.
+    """
+    minx, miny, maxx, maxy = bounds
+    steps = np.linspace(0.0, 1.0, points)[:-1]
+    width, height = maxx - minx, maxy - miny
+    xs = np.concatenate([
+        minx + width * steps, np.full_like(steps, maxx),
+        maxx - width * steps, np.full_like(steps, minx),
+    ])
+    ys = np.concatenate([
+        np.full_like(steps, miny), miny + height * steps,
+        np.full_like(steps, maxy), maxy - height * steps,
+    ])
+    return xs, ys
+
+
+def _project(bounds: tuple, source: str, target: str,
+             points: int) -> tuple[np.ndarray, np.ndarray]:
+    xs, ys = densify(bounds, points)
+    return get_transformer(source, target).transform(xs, ys)
+
+
+def transform_bounds(bounds: tuple, source: str, target: str,
+                     points: int = DENSIFY_POINTS) -> tuple:
+    """Omslutande (minx, miny, maxx, maxy) i target, med hörn och förtätade kanter."""
+    xs, ys = _project(bounds, source, target, points)
+    return float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())
+
+
+def measure_bbox(bounds: tuple, source: str = "EPSG:4326", target: str = "EPSG:3006",
+                 points: int = DENSIFY_POINTS) -> tuple[float, float, float]:
+    """
+    Bredd, höjd och area för bounds mätt i target, i dess enheter.
+
+    Bredden är den längsta av över- och nederkanten och höjden den längsta
+    av sidorna, längs de förtätade kanterna. Arean räknas på hela ringen,
+    så den stämmer även när rutan blir vriden och krökt i target.
+    """
+    xs, ys = _project(bounds, source, target, points)
+    dx = np.roll(xs, -1) - xs
+    dy = np.roll(ys, -1) - ys
+    bottom, right, top, left = np.hypot(dx, dy).reshape(4, points - 1).sum(axis=1)
+    area = abs(float(np.dot(xs, np.roll(ys, -1)) - np.dot(ys, np.roll(xs, -1)))) / 2
+    return float(max(bottom, top)), float(max(left, right)), area
+
+
+def degrees_to_meters(minx, miny, maxx, maxy) -> tuple[float, float]:
+    """
+    Storleken i meter i SWEREF99 TM (EPSG:3006) för en bbox i EPSG:4326.
+
+    Mäts mellan det nedre vänstra och det övre högra hörnet, som API:ets
+    gräns alltid har gjort. Kanternas verkliga längd ger measure_bbox.
+
+    :return: (bredd i meter, höjd i meter)
+    """
+    xs, ys = get_transformer("EPSG:4326", "EPSG:3006").transform(
+        np.array([minx, maxx]), np.array([miny, maxy])
+    )
+    return float(abs(xs[1] - xs[0])), float(abs(ys[1] - ys[0]))
+
+
+def validate_bbox(value: str, max_meters: float | None = None) -> tuple:
+    """
+    Tolka och kontrollera en bbox "minx,miny,maxx,maxy" i grader i EPSG:4326.
+
+    Med max_meters får ingen sida vara längre än så, mätt i SWEREF99 TM,
+    och arean längs de förtätade kanterna inte vara större än max_meters i
+    kvadrat. Returnerar (minx, miny, maxx, maxy). ValueError har ett
+    meddelande som kan visas för den som anropat API:et.
+    """
+    try:
+        minx, miny, maxx, maxy = parse_bbox(value)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError("Invalid bbox format")
+    if not (-180 <= minx and maxx <= 180 and -90 <= miny and maxy <= 90):
+        raise ValueError("Invalid bbox format")
+    if max_meters is not None:
+        width_m, height_m = degrees_to_meters(minx, miny, maxx, maxy)
+        if width_m > max_meters or height_m > max_meters:
+            raise ValueError(
+                f"Bounding box with {width_m:.0f}x{height_m:.0f} exceeds "
+                f"{max_meters}x{max_meters} meter limit"
+            )
+        _, _, area = measure_bbox((minx, miny, maxx, maxy))
+        if area > max_meters ** 2:
+            raise ValueError(
+                f"Bounding box with area {area:.0f} m² exceeds "
+                f"{max_meters ** 2} m² limit"
+            )
+    return minx, miny, maxx, maxy
+
+
+def normalize_bbox(value: str, decimals: int = BBOX_DECIMALS) -> str:
+    """
+    bbox avrundad till decimals och skriven på ett bestämt sätt.
+
+    Samma område ger samma sträng oavsett mellanslag, nollor och brus i sista
+    decimalerna, så den kan användas som nyckel i cacher och för att samordna
+    jobb. ValueError som validate_bbox.
+    """
+    parts = []
+    for coord in validate_bbox(value):
+        # + 0.0 gör -0.0 till 0.0
+        text = f"{round(coord, decimals) + 0.0:.{decimals}f}"
+        if "." in text:
+            text = text.rstrip("0").rstrip(".")
+        parts.append(text)
+    return ",".join(parts)
@@ -0,0 +1,222 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from config import cache_redis_url
+
+# Om Redis inte svarar försöker vi igen först efter så här många sekunder.
+REDIS_RETRY_INTERVAL = 30
+
+_redis_client = None
+_redis_retry_at = 0.0
+
+
+def get_redis() -> redis.Redis | None:
+    """Returnera en Redis-klient för cachen, eller None om Redis saknas."""
+    global _redis_client
+    if not cache_redis_url or time.time() < _redis_retry_at:
+        return None
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            cache_redis_url,
+            socket_connect_timeout=0.5,
+            socket_timeout=1,
+        )
+    return _redis_client
+
+
+def redis_failed(exc: Exception):
+    """Markera Redis som otillgänglig en stund så att anropen inte hänger."""
+    global _redis_retry_at
+    print(f"Redis-cache otillgänglig: {exc}")
+    _redis_retry_at = time.time() + REDIS_RETRY_INTERVAL
+
+
+class LRUCache:
+    """Trådsäker LRU-cache i processen med gräns på antal och/eller bytes."""
+
+    def __init__(self, max_items: int = 1024, max_bytes: int | None = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float | None = None, size: int = 0):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_items
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Sparar ett värde i Redis och tar bort de minst nyligen använda tills
+# namnrymden ryms i max_bytes. KEYS: nyckel, index (sorted set med senaste
+# användning), storlekar (hash), summa. ARGV: värde, ttl, storlek, nu, max_bytes.
+_SET_BOUNDED = """
+local key, index, sizes, total = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local old = redis.call('HGET', sizes, key)
+if old then redis.call('DECRBY', total, old) end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('SET', key, ARGV[1], 'EX', ARGV[2])
+else
+    redis.call('SET', key, ARGV[1])
+end
+redis.call('ZADD', index, ARGV[4], key)
+redis.call('HSET', sizes, key, ARGV[3])
+local used = redis.call('INCRBY', total, ARGV[3])
+while used > tonumber(ARGV[5]) do
+    local oldest = redis.call('ZPOPMIN', index)
+    if #oldest == 0 then break end
+    used = redis.call('DECRBY', total, redis.call('HGET', sizes, oldest[1]) or 0)
+    redis.call('HDEL', sizes, oldest[1])
+    redis.call('DEL', oldest[1])
+end
+return used
+"""
+
+# Tar bort en nyckel och dess plats i indexet. KEYS som _SET_BOUNDED.
+_DELETE_BOUNDED = """
+local key, index, sizes, total = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local old = redis.call('HGET', sizes, key)
+if old then redis.call('DECRBY', total, old) end
+redis.call('HDEL', sizes, key)
+redis.call('ZREM', index, key)
+return redis.call('DEL', key)
+"""
+
+
+class Cache:
+    """Cache i två nivåer: LRU i processen och Redis som delas mellan processer.
+
+    Med local=False används processens LRU bara när Redis saknas, så att
+    invalidering från en annan process (t.ex. en Celery-worker) syns direkt.
+    max_bytes gäller både för varje process och för namnrymden i Redis, där
+    de minst nyligen använda nycklarna tas bort när den är full. Nycklar som
+    har löpt ut räknas tills de trängs undan.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_items: int = 1024,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+        local: bool = True,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = local
+        self.max_bytes = max_bytes
+        self._lru = LRUCache(max_items=max_items, max_bytes=max_bytes)
+
+    def _redis_key(self, key) -> str:
+        if isinstance(key, tuple):
+            key = ":".join(str(part) for part in key)
+        return f"repo_browser:{self.namespace}:{key}"
+
+    def _index_keys(self) -> list:
+        """Index, storlekar och summa för namnrymden i Redis, se _SET_BOUNDED."""
+        return [f"repo_browser:_{part}:{self.namespace}" for part in ("lru", "sizes", "bytes")]
+
+    def get(self, key):
+        client = get_redis()
+        if self.local or client is None:
+            value = self._lru.get(key)
+            if value is not None:
+                return value
+        if client is None:
+            return None
+        try:
+            if self.max_bytes is None:
+                raw = client.get(self._redis_key(key))
+            else:
+                # Markera nyckeln som använd, XX lägger inte till saknade
+                pipe = client.pipeline()
+                pipe.get(self._redis_key(key))
+                pipe.zadd(self._index_keys()[0], {self._redis_key(key): time.time()}, xx=True)
+                raw, _ = pipe.execute()
+        except redis.RedisError as exc:
+            redis_failed(exc)
+            return self._lru.get(key)
+        if raw is None:
+            return None
+        value = pickle.loads(raw)
+        if self.local:
+            self._lru.set(key, value, ttl=self.ttl, size=len(raw))
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = ttl or self.ttl
+        raw = pickle.dumps(value)
+        self._lru.set(key, value, ttl=ttl, size=len(raw))
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            if self.max_bytes is None:
+                client.set(self._redis_key(key), raw, ex=int(ttl) if ttl else None)
+            elif len(raw) <= self.max_bytes:
+                client.eval(
+                    _SET_BOUNDED, 4, self._redis_key(key), *self._index_keys(),
+                    raw, int(ttl) if ttl else 0, len(raw), time.time(), self.max_bytes,
+                )
+        except redis.RedisError as exc:
+            redis_failed(exc)
+
+    def delete(self, key):
+        self._lru.delete(key)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            if self.max_bytes is None:
+                client.delete(self._redis_key(key))
+            else:
+                client.eval(_DELETE_BOUNDED, 4, self._redis_key(key), *self._index_keys())
+        except redis.RedisError as exc:
+            redis_failed(exc)
+
+    def clear(self):
+        """Töm processens LRU. Delade nycklar i Redis löper ut via TTL."""
+        self._lru.clear()
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import threading
+import uuid
+
+import redis
+
+from bbox import normalize_bbox
+from cache import LRUCache, get_redis, redis_failed
+
+# Hur länge en identisk beställning kopplas till samma task, räknat från start.
+# Täcker både jobb som pågår och nyss avslutade jobb.
+COALESCE_TTL = 15 * 60
+
+_KEY_PREFIX = "repo_browser:coalesce"
+
+# Används när Redis saknas, t.ex. i tester. Delas då bara inom processen.
+_local = LRUCache(max_items=1024)
+_local_lock = threading.Lock()
+
+
+def job_key(job_type: str, bbox: str, **params) -> str | None:
+    """Nyckel för ett jobb, None om bbox inte går att tolka."""
+    try:
+        bbox = normalize_bbox(bbox)
+    except ValueError:
+        return None
+    normalized = json.dumps(
+        {"type": job_type, "bbox": bbox, "params": params}, sort_keys=True
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _task_key(task_id: str) -> str:
+    return f"{_KEY_PREFIX}:task:{task_id}"
+
+
+def _claim_local(key: str, task_id: str) -> str | None:
+    with _local_lock:
+        existing = _local.get(key)
+        if existing is not None:
+            return existing
+        _local.set(key, task_id, ttl=COALESCE_TTL)
+        _local.set(("task", task_id), key, ttl=COALESCE_TTL)
+        return None
+
+
+def _claim(key: str, task_id: str) -> str | None:
+    """Registrera task_id för nyckeln, eller returnera tasken som redan finns."""
+    client = get_redis()
+    if client is None:
+        return _claim_local(key, task_id)
+    job = f"{_KEY_PREFIX}:{key}"
+    try:
+        # Jobbet kan gå ut mellan SET och GET, försök då igen
+        for _ in range(3):
+            if client.set(job, task_id, nx=True, ex=COALESCE_TTL):
+                client.set(_task_key(task_id), job, ex=COALESCE_TTL)
+                return None
+            existing = client.get(job)
+            if existing is not None:
+                return existing.decode("utf-8")
+    except redis.RedisError as exc:
+        redis_failed(exc)
+    return _claim_local(key, task_id)
+
+
+def submit(job_type: str, bbox: str, start, **params) -> tuple[str, bool]:
+    """
+    Starta ett jobb, eller koppla på ett identiskt som redan körs.
+
+    Jobb med samma typ, bbox (avrundad) och parametrar som startats inom
+    COALESCE_TTL delar task och resultat. start(task_id) anropas bara när
+    ett nytt jobb behövs och ska starta tasken med det givna id:t.
+
+    Returnerar (task_id, True om ett befintligt jobb återanvändes).
+    """
+    task_id = str(uuid.uuid4())
+    key = job_key(job_type, bbox, **params)
+    if key is not None:
+        existing = _claim(key, task_id)
+        if existing is not None:
+            return existing, True
+    try:
+        start(task_id)
+    except Exception:
+        forget(task_id)
+        raise
+    return task_id, False
+
+
+def forget(task_id: str):
+    """Ta bort ett jobb, t.ex. när det har misslyckats, så att nästa försök startar om."""
+    with _local_lock:
+        key = _local.get(("task", task_id))
+        if key is not None:
+            _local.delete(("task", task_id))
+            if _local.get(key) == task_id:
+                _local.delete(key)
+
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        job = client.get(_task_key(task_id))
+        if job is None:
+            return
+        if client.get(job) == task_id.encode("utf-8"):
+            client.delete(job)
+        client.delete(_task_key(task_id))
+    except redis.RedisError as exc:
+        redis_failed(exc)
+
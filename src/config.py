@@ -23,6 +23,11 @@ client_secret = os.getenv("client_secret")
 gitea_url = os.getenv("gitea_url", "http://localhost:8000/")
 app_url = os.getenv("app_url", "http://localhost:5000/")
 
+# Anslutningspool mot Gitea (per gunicorn- och Celery-process)
+gitea_pool_connections = int(os.getenv("GITEA_POOL_CONNECTIONS", "4"))
+gitea_pool_maxsize = int(os.getenv("GITEA_POOL_MAXSIZE", "16"))
+gitea_pool_block = os.getenv("GITEA_POOL_BLOCK", "false").lower() == "true"
+
 # Celery-konfiguration
 celery_broker_url = os.getenv(
     "CELERY_BROKER_URL",
@@ -33,8 +38,34 @@ celery_result_backend = os.getenv(
     "redis://redis:6379/0"
 )
 
+# Cache för Gitea-anrop. Tom sträng stänger av Redis och cachar bara i processen.
+cache_redis_url = os.getenv("CACHE_REDIS_URL", "redis://redis:6379/2")
+# Hur länge en grens senaste commit-SHA litas på innan den kontrolleras igen.
+repo_head_ttl = int(os.getenv("REPO_HEAD_TTL", "10"))
+# Max antal bytes filinnehåll som cachas (per blob-SHA), både i varje process
+# och sammanlagt i Redis, där de minst nyligen använda tas bort först.
+content_cache_max_bytes = int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
 # STAC API scope (default can överridas med env)
 LM_stac_scope = os.getenv("LM_stac_scope", "ogc-features:fastighetsindelning.read")
+# Max antal anrop per minut till Lantmäteriet, gemensamt för alla workers.
+LM_rate_limit = int(os.getenv("LM_RATE_LIMIT", "240"))
+# Hur länge fastighetsgränser per ruta cachas, i sekunder.
+fastighet_tile_ttl = int(os.getenv("FASTIGHET_TILE_TTL", str(24 * 3600)))
+# Databas för TaskTracker, delas av appen och Celery-workern.
+database_url = os.getenv("DATABASE_URL", "sqlite:////app/data/app.db")
+# Sekunder mellan varje körning av städningen av utgångna filer (Celery beat).
+sweep_interval = int(os.getenv("SWEEP_INTERVAL", "600"))
+# Skriv DXF-filer i binärt format, mindre och snabbare att läsa in men
+# stöds inte av alla program.
+dxf_binary = os.getenv("DXF_BINARY", "false").lower() == "true"
+# Antal decimaler i fastighetsgränsernas GeoJSON, i meter, t.ex. 3. Tom
+# (standard) behåller koordinaterna som de kommer från Lantmäteriet.
+geojson_precision = os.getenv("GEOJSON_PRECISION", "")
+geojson_precision = int(geojson_precision) if geojson_precision else None
+# Artefaktlager för färdiga filer (DXF, ZIP, GeoJSON). Skrivs av
+# Celery-workern och läses av appen, måste ligga på en delad volym.
+artifact_dir = os.getenv("ARTIFACT_DIR", "/app/data/artifacts")
 
 # Build enviroments
 build_date = os.getenv("BUILD_DATE", time.strftime("%Y-%m-%d"))
@@ -1,103 +1,242 @@
 import json
-import struct
+import mmap
+from json.encoder import encode_basestring_ascii
+
+import numpy as np
+
+# Carlson CRD-filer består av en header följd av poster med fast längd.
+HEADER_DTYPE = np.dtype(
+    [("id", "<f8"), ("date", "S32"), ("des", "S32"), ("format", "S32")]
+)
+NUMERIC_HEADER_DTYPE = np.dtype(
+    [("nor", "<f8"), ("eas", "<f8"), ("elv", "<f8"), ("des", "S32")]
+)
+# Alfanumerisk post, 66 bytes
+POINT_DTYPE = np.dtype(
+    [("nor", "<f8"), ("eas", "<f8"), ("elv", "<f8"), ("des", "S32"), ("id", "S10")]
+)
+# Numerisk post, 56 bytes
+NUMERIC_POINT_DTYPE = NUMERIC_HEADER_DTYPE
+
+HEADER_SIZE = HEADER_DTYPE.itemsize
+RECORD_SIZE = POINT_DTYPE.itemsize
+
+# En punkt formaterad som json.dumps(..., indent=4) gör inuti "points"
+_POINT_JSON = (
+    "        {\n"
+    '            "nor": %r,\n'
+    '            "eas": %r,\n'
+    '            "elv": %r,\n'
+    '            "des": %s,\n'
+    '            "id": %s\n'
+    "        }"
+)
+
+
+def _decode(values: np.ndarray) -> list:
+    """Avkoda en array med fasta byte-strängar till trimmade str.
+
+    numpy tar redan bort avslutande nollbytes när arrayen görs om till lista.
+    """
+    return [
+        value.strip(b"\x00").decode("utf-8", errors="ignore").strip()
+        for value in values.tolist()
+    ]
+
+
+def _encode(values, length: int) -> list:
+    return [value.encode("utf-8")[:length] for value in values]
+
+
+def read_header(file_content) -> dict:
+    """Läs headern i en alfanumerisk CRD-fil."""
+    header = np.frombuffer(file_content, dtype=HEADER_DTYPE, count=1)
+    return {
+        "id": float(header["id"][0]),
+        "date": _decode(header["date"])[0],
+        "des": _decode(header["des"])[0],
+        "format": _decode(header["format"])[0],
+    }
+
+
+def read_records(file_content) -> np.ndarray:
+    """Returnera punkterna som en strukturerad array utan att kopiera bufferten.
+
+    Ofullständiga poster i slutet av filen ignoreras.
+    """
+    count = max(len(file_content) - HEADER_SIZE, 0) // RECORD_SIZE
+    return np.frombuffer(
+        file_content, dtype=POINT_DTYPE, count=count, offset=HEADER_SIZE
+    )
+
+
+def records_to_points(records: np.ndarray) -> list:
+    """Konvertera poster till en lista med punkt-dictionaries."""
+    return [
+        {"nor": nor, "eas": eas, "elv": elv, "des": des, "id": id}
+        for nor, eas, elv, des, id in zip(
+            records["nor"].tolist(),
+            records["eas"].tolist(),
+            records["elv"].tolist(),
+            _decode(records["des"]),
+            _decode(records["id"]),
+        )
+    ]
+
+
+def points_to_records(points: list, dtype: np.dtype = POINT_DTYPE) -> np.ndarray:
+    """Packa punkt-dictionaries till en strukturerad array."""
+    records = np.zeros(len(points), dtype=dtype)
+    for field in ("nor", "eas", "elv"):
+        records[field] = [point.get(field, 0.0) for point in points]
+    records["des"] = _encode((point.get("des", "") for point in points), 32)
+    if "id" in dtype.names:
+        records["id"] = _encode((point.get("id", "") for point in points), 10)
+    return records
+
+
+def encode_header(header: dict) -> bytes:
+    """Packa en alfanumerisk eller numerisk header."""
+    if "format" in header:  # Alfanumerisk fil
+        packed = np.zeros(1, dtype=HEADER_DTYPE)
+        packed["id"] = header.get("id", 0.0)
+        for field in ("date", "des", "format"):
+            packed[field] = header.get(field, "").encode("utf-8")[:32]
+    else:  # Numerisk fil
+        packed = np.zeros(1, dtype=NUMERIC_HEADER_DTYPE)
+        for field in ("nor", "eas", "elv"):
+            packed[field] = header.get(field, 0.0)
+        packed["des"] = header.get("des", "").encode("utf-8")[:32]
+    return packed.tobytes()
+
+
+def _points_to_json(records: np.ndarray) -> str:
+    """Formatera poster som JSON-text, samma utseende som json.dumps(indent=4)."""
+    return ",\n".join([
+        _POINT_JSON % point
+        for point in zip(
+            records["nor"].tolist(),
+            records["eas"].tolist(),
+            records["elv"].tolist(),
+            map(encode_basestring_ascii, _decode(records["des"])),
+            map(encode_basestring_ascii, _decode(records["id"])),
+        )
+    ])
+
+
+def _to_json(header: dict, records: np.ndarray) -> str:
+    finite = all(
+        np.isfinite(records[field]).all() for field in ("nor", "eas", "elv")
+    )
+    if not len(records) or not finite:
+        # NaN och Infinity skrivs som i json-modulen
+        json_data = {"header": header, "points": records_to_points(records)}
+        return json.dumps(json_data, indent=4)
+
+    json_text = json.dumps({"header": header, "points": []}, indent=4)
+    return (
+        json_text[:-len("[]\n}")]
+        + "[\n"
+        + _points_to_json(records)
+        + "\n    ]\n}"
+    )
+
+
+class CrdFile:
+    """Lat vy över en CRD-fil i en buffert (bytes, memoryview eller mmap).
+
+    Antalet punkter räknas fram ur längden och bara de punkter som
+    efterfrågas avkodas. Stängs med close() eller som context manager.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = memoryview(buffer)
+        self._mmap = None
+        self.records = read_records(self._buffer)
+
+    @classmethod
+    def open(cls, path):
+        """Öppna en CRD-fil på disk via mmap."""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        crd_file = cls(mapped)
+        crd_file._mmap = mapped
+        return crd_file
+
+    def close(self):
+        """Släpp bufferten, och stäng mmap:en om filen öppnades med open()."""
+        # Arrayen och vyn pekar in i bufferten och måste släppas först
+        self.records = None
+        self._buffer.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def header(self) -> dict:
+        return read_header(self._buffer)
+
+    @property
+    def ids(self) -> list:
+        """Punkternas id utan att resten av posterna avkodas."""
+        return _decode(self.records["id"])
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return records_to_points(self.records[index])
+        index = range(len(self.records))[index]
+        return records_to_points(self.records[index:index + 1])[0]
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def iter_chunks(self, size: int = 1000):
+        """Avkoda punkterna i bitar om size åt gången."""
+        for start in range(0, len(self.records), size):
+            yield records_to_points(self.records[start:start + size])
+
+    def to_json(self, start: int = 0, stop: int | None = None) -> str:
+        """JSON som i crd_to_json, med ett urval av punkterna."""
+        return _to_json(self.header, self.records[start:stop])
 
 
 def crd_to_json(file_content):
-    json_data = {"header": {}, "points": []}
-
-    # Kontrollera om filen är numerisk eller alfanumerisk baserat på storleken på headern
-    header = file_content[:56]  # Testa med numerisk header först
-    nor, eas, elv, des = struct.unpack("<ddd32s", header)
-
-    if len(des.strip(b"\x00")) > 0 and False:  # Numerisk fil
-        json_data["header"] = {
-            "nor": nor,
-            "eas": eas,
-            "elv": elv,
-            "des": des.decode("utf-8", errors="ignore").strip(),
-        }
-        record_size = 56
-        file_type = "numeric"
-    else:  # Alfanumerisk fil
-        header = file_content[:104]  # Läsa 104 bytes för alfanumerisk header
-        id, date, des, format_str = struct.unpack("<d32s32s32s", header)
-        json_data["header"] = {
-            "id": id,
-            "date": date.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
-            "des": des.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
-            "format": format_str.strip(b"\x00")
-            .decode("utf-8", errors="ignore")
-            .strip(),
-        }
-        record_size = 66
-        file_type = "alphanumeric"
-
-    # Nu går vi igenom alla poster
-    for i in range(len(header), len(file_content), record_size):
-        if file_type == "numeric":
-            record = file_content[i : i + record_size]
-            nor, eas, elv, des = struct.unpack("<ddd32s", record)
-            point = {
-                "nor": nor,
-                "eas": eas,
-                "elv": elv,
-                "des": des.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
-            }
-        else:
-            record = file_content[i : i + record_size]
-            nor, eas, elv, des, id = struct.unpack("<ddd32s10s", record)
-            point = {
-                "nor": nor,
-                "eas": eas,
-                "elv": elv,
-                "des": des.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
-                "id": id.strip(b"\x00").decode("utf-8", errors="ignore").strip(),
-            }
-        json_data["points"].append(point)
-
-    return json.dumps(json_data, indent=4)
+    return CrdFile(file_content).to_json()
 
 
 def json_to_crd(json_data):
-    crd_content = bytearray()
-
     data = json.loads(json_data)
 
     # Hantera headern först
     header = data.get("header", {})
+    dtype = POINT_DTYPE if "format" in header else NUMERIC_POINT_DTYPE
+    records = points_to_records(data.get("points", []), dtype)
 
-    if "format" in header:  # Alfanumerisk fil
-        id = header.get("id", 0.0)
-        date = header.get("date", "").encode("utf-8").ljust(32, b"\x00")
-        des = header.get("des", "").encode("utf-8").ljust(32, b"\x00")
-        format_str = header.get("format", "").encode("utf-8").ljust(32, b"\x00")
-        crd_content.extend(struct.pack("<d32s32s32s", id, date, des, format_str))
-
-        # Packa punkterna
-        for point in data.get("points", []):
-            nor = point.get("nor", 0.0)
-            eas = point.get("eas", 0.0)
-            elv = point.get("elv", 0.0)
-            des = point.get("des", "").encode("utf-8").ljust(32, b"\x00")
-            id = point.get("id", "").encode("utf-8").ljust(10, b"\x00")
-            crd_content.extend(struct.pack("<ddd32s10s", nor, eas, elv, des, id))
+    return encode_header(header) + records.tobytes()
 
-    else:  # Numerisk fil
-        nor = header.get("nor", 0.0)
-        eas = header.get("eas", 0.0)
-        elv = header.get("elv", 0.0)
-        des = header.get("des", "").encode("utf-8").ljust(32, b"\x00")
-        crd_content.extend(struct.pack("<ddd32s", nor, eas, elv, des))
 
-        # Packa punkterna
-        for point in data.get("points", []):
-            nor = point.get("nor", 0.0)
-            eas = point.get("eas", 0.0)
-            elv = point.get("elv", 0.0)
-            des = point.get("des", "").encode("utf-8").ljust(32, b"\x00")
-            crd_content.extend(struct.pack("<ddd32s", nor, eas, elv, des))
+def append_points(file_content, points: list) -> bytes:
+    """Lägg till punkter sist i en CRD-fil utan att avkoda befintliga poster.
 
-    return bytes(crd_content)
+    De nya punkternas id räknas upp med antalet punkter som redan fanns.
+    """
+    count = get_point_count(file_content)
+    records = points_to_records(points)
+    records["id"] = [
+        str(int(point["id"]) + count).encode("utf-8") for point in points
+    ]
+    end = HEADER_SIZE + count * RECORD_SIZE
+    return bytes(file_content[:end]) + records.tobytes()
 
 
 def change_point_id(json_data, amount: int, old_point_id: int = None):
@@ -117,3 +256,8 @@ def change_point_id(json_data, amount: int, old_point_id: int = None):
 def get_point_len(json_data):
     """Räknar antalet punkter i filen."""
     return len(json_data.get("points", []))
+
+
+def get_point_count(file_content) -> int:
+    """Räknar antalet punkter direkt ur CRD-filens längd."""
+    return len(CrdFile(file_content))
@@ -5,10 +5,15 @@ db = SQLAlchemy()
 
 
 class TaskTracker(db.Model):
+    __table_args__ = (
+        # Användarens trackers som inte har gått ut
+        db.Index("ix_task_tracker_user_email_expires_at", "user_email", "expires_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     # Användarens ID eller email.
     user_email = db.Column(db.String, nullable=False)
-    task_id = db.Column(db.String, nullable=False)
+    task_id = db.Column(db.String, nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
     rate_limit_remaining = db.Column(db.Integer)
     rate_limit_total = db.Column(db.Integer)
@@ -16,6 +21,9 @@ class TaskTracker(db.Model):
     # JSON-serialiserad sträng, t.ex. "[x1, y1, x2, y2]"
     bbox = db.Column(db.Text)
     file_path = db.Column(db.String, nullable=True)
-    # Rå GeoJSON-data (kan vara lång, därför Text)
-    geojson = db.Column(db.Text, nullable=True)
-    expires_at = db.Column(db.DateTime, nullable=True)
\ No newline at end of file
+    # GeoJSON-artefaktens sökväg i artefaktlagret, hämtas via egen endpoint
+    geojson_id = db.Column(db.String, nullable=True)
+    # Pyramid med förenklade geometrier för kartans rutor, se tiles.py
+    tiles_id = db.Column(db.String, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+
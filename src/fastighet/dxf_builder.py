@@ -0,0 +1,219 @@
+import math
+
+import ezdxf
+import numpy as np
+from ezdxf.document import Drawing
+from ezdxf.enums import TextEntityAlignment
+
+# Lager i ritningen
+LAYER_BOUNDARY = "FASTIGHETSGRANS"
+LAYER_HOLE = "FASTIGHETSGRANS_HAL"
+LAYER_LABEL = "FASTIGHETSBETECKNING"
+LAYERS = {LAYER_BOUNDARY: 1, LAYER_HOLE: 5, LAYER_LABEL: 7}  # lager: färg
+# Applikationsnamn för XDATA med fastighetens attribut
+XDATA_APPID = "REPO_BROWSER"
+# Texthöjd i meter för fastighetsbeteckningen
+DEFAULT_TEXT_HEIGHT = 2.0
+
+
+class Rings:
+    """
+    Alla ringar i en feature-samling som en sammanhängande koordinatarray.
+
+    coords är (n, 2) med (E, N) i SWEREF 99 TM, dvs. redan omkastade från
+    Lantmäteriets (N, E). Ring i går från starts[i] till starts[i + 1]
+    (sista ringen till slutet), feature[i] är index till featuren den
+    kommer från och hole[i] anger om den är ett hål i en polygon.
+    """
+
+    def __init__(self, coords, starts, feature, hole):
+        self.coords = coords
+        self.starts = starts
+        self.feature = feature
+        self.hole = hole
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def ends(self) -> np.ndarray:
+        return np.append(self.starts[1:], len(self.coords))
+
+    def vertices(self) -> list:
+        """
+        Ringarnas hörn i LWPOLYLINE:s format (x, y, startbredd, slutbredd, bulge).
+
+        Byggs som en enda array, varje ring är en vy in i den.
+        """
+        vertices = np.zeros((len(self.coords), 5))
+        vertices[:, :2] = self.coords
+        return np.split(vertices, self.starts[1:])
+
+    def area_centroids(self) -> tuple[np.ndarray, np.ndarray]:
+        """Area och tyngdpunkt för varje ring, beräknade för alla på en gång."""
+        if not len(self):
+            return np.zeros(0), np.zeros((0, 2))
+        # Nästa punkt i samma ring, sista punkten kopplas till den första
+        following = np.roll(self.coords, -1, axis=0)
+        following[self.ends - 1] = self.coords[self.starts]
+        x, y = self.coords[:, 0], self.coords[:, 1]
+        x1, y1 = following[:, 0], following[:, 1]
+        cross = x * y1 - x1 * y
+        area = np.add.reduceat(cross, self.starts) / 2
+        cx = np.add.reduceat((x + x1) * cross, self.starts)
+        cy = np.add.reduceat((y + y1) * cross, self.starts)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centroids = np.column_stack((cx, cy)) / (6 * area)[:, None]
+        # Degenererade ringar får medelvärdet av sina punkter
+        degenerate = ~np.isfinite(centroids).all(axis=1)
+        if degenerate.any():
+            sums = np.add.reduceat(self.coords, self.starts)
+            counts = (self.ends - self.starts)[:, None]
+            centroids[degenerate] = (sums / counts)[degenerate]
+        return np.abs(area), centroids
+
+
+def _polygons(geometry: dict) -> list:
+    geom_type = geometry.get("type") if geometry else None
+    coords = geometry.get("coordinates") if geometry else None
+    if not coords:
+        return []
+    if geom_type == "Polygon":
+        return [coords]
+    if geom_type == "MultiPolygon":
+        return coords
+    return []
+
+
+def _ring_array(ring) -> np.ndarray | None:
+    try:
+        points = np.asarray(ring, dtype=float)
+    except (TypeError, ValueError):
+        # Punkter med olika antal dimensioner
+        try:
+            points = np.asarray([point[:2] for point in ring], dtype=float)
+        except (TypeError, ValueError, IndexError):
+            return None
+    if points.ndim != 2 or points.shape[1] < 2:
+        return None
+    return points[:, :2]
+
+
+def flatten_rings(features: list) -> Rings:
+    """
+    Platta ut alla ringar i Polygon och MultiPolygon till en Rings.
+
+    Ringar med färre än tre unika punkter eller ogiltiga koordinater
+    hoppas över. En avslutande punkt som upprepar den första tas bort,
+    ezdxf stänger polylinjen själv.
+    """
+    chunks, lengths, feature_index, holes = [], [], [], []
+    for index, feature in enumerate(features):
+        for polygon in _polygons(feature.get("geometry")):
+            for ring_number, ring in enumerate(polygon):
+                points = _ring_array(ring)
+                if points is None or not np.isfinite(points).all():
+                    continue
+                if len(points) > 1 and (points[0] == points[-1]).all():
+                    points = points[:-1]
+                if len(points) < 3:
+                    continue
+                chunks.append(points)
+                lengths.append(len(points))
+                feature_index.append(index)
+                holes.append(ring_number > 0)
+
+    if not chunks:
+        return Rings(np.zeros((0, 2)), np.zeros(0, dtype=np.intp),
+                     np.zeros(0, dtype=np.intp), np.zeros(0, dtype=bool))
+    # (N, E) -> (E, N) för hela samlingen på en gång
+    coords = np.concatenate(chunks)[:, ::-1]
+    starts = np.concatenate(([0], np.cumsum(lengths[:-1]))).astype(np.intp)
+    return Rings(np.ascontiguousarray(coords), starts,
+                 np.asarray(feature_index, dtype=np.intp), np.asarray(holes))
+
+
+def designation(properties: dict) -> str:
+    """Fastighetsbeteckning, t.ex. "ATTLERED 1:7", eller etiketten om trakt saknas."""
+    label = properties.get("etikett") or ""
+    trakt = properties.get("trakt")
+    if not label and properties.get("block") is not None and properties.get("enhet") is not None:
+        label = f"{properties['block']}:{properties['enhet']}"
+    return f"{trakt} {label}".strip() if trakt else label
+
+
+def _xdata(properties: dict) -> list:
+    values = [
+        designation(properties),
+        properties.get("objektidentitet"),
+        properties.get("registerenhetsreferens"),
+    ]
+    # Strängar i XDATA får vara högst 255 tecken
+    return [(1000, str(value)[:255]) for value in values if value]
+
+
+def new_document() -> Drawing:
+    doc = ezdxf.new()
+    for name, color in LAYERS.items():
+        doc.layers.add(name, color=color)
+    doc.appids.add(XDATA_APPID)
+    return doc
+
+
+def build_dxf(features: list, labels: bool = True,
+              text_height: float = DEFAULT_TEXT_HEIGHT) -> Drawing:
+    """
+    Bygg en DXF-ritning med fastighetsgränser från Lantmäteriets features.
+
+    Ytterringar hamnar på LAYER_BOUNDARY och hål på LAYER_HOLE, med
+    fastighetsbeteckning och id:n som XDATA. Med labels skrivs beteckningen
+    som text i tyngdpunkten av fastighetens största yta.
+    """
+    doc = new_document()
+    msp = doc.modelspace()
+    rings = flatten_rings(features)
+
+    boundary = {"layer": LAYER_BOUNDARY}
+    hole = {"layer": LAYER_HOLE}
+    xdata = {}
+    for vertices, feature_index, is_hole in zip(
+        rings.vertices(), rings.feature.tolist(), rings.hole.tolist()
+    ):
+        polyline = msp.add_lwpolyline([], close=True,
+                                      dxfattribs=hole if is_hole else boundary)
+        # Hörnen lagras som en (n, 5)-array av float64 i ezdxf, sätt den direkt
+        # i stället för att lägga till punkterna en och en. Det är inte en del
+        # av ezdxf:s publika API, därför är versionen låst i requirements.txt.
+        assert vertices.ndim == 2 and vertices.shape[1] == 5 and vertices.dtype == np.float64
+        polyline.lwpoints.values = vertices
+        if feature_index not in xdata:
+            xdata[feature_index] = _xdata(features[feature_index].get("properties") or {})
+        if xdata[feature_index]:
+            polyline.set_xdata(XDATA_APPID, xdata[feature_index])
+
+    if labels and len(rings):
+        _add_labels(msp, features, rings, text_height)
+    return doc
+
+
+def _add_labels(msp, features: list, rings: Rings, text_height: float):
+    area, centroids = rings.area_centroids()
+    # Största ytterringen per feature
+    area = np.where(rings.hole, -1.0, area)
+    order = np.lexsort((-area, rings.feature))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = rings.feature[order][1:] != rings.feature[order][:-1]
+    largest = order[first & (area[order] >= 0)]
+
+    attribs = {"layer": LAYER_LABEL, "height": text_height}
+    for ring_index in largest.tolist():
+        properties = features[rings.feature[ring_index]].get("properties") or {}
+        text = designation(properties)
+        if not text:
+            continue
+        x, y = centroids[ring_index].tolist()
+        if not (math.isfinite(x) and math.isfinite(y)):
+            continue
+        msp.add_text(text, dxfattribs=attribs).set_placement(
+            (x, y), align=TextEntityAlignment.MIDDLE_CENTER
+        )
@@ -0,0 +1,126 @@
+import json
+import math
+
+from bbox import transform_bounds
+from cache import Cache
+from config import fastighet_tile_ttl
+
+from .lm import fetch_property_data
+
+# Rutnät i SWEREF99 TM (EPSG:3006), rutans sida i meter.
+TILE_SIZE = 500
+
+# Fastighetsytor per ruta, delas mellan workers via Redis.
+_tile_cache = Cache(
+    "fastighet_tile",
+    max_items=4096,
+    max_bytes=64 * 1024 * 1024,
+    ttl=fastighet_tile_ttl,
+)
+
+
+def sweref_bounds(bbox: str) -> tuple:
+    """Omsluter en bbox "minx,miny,maxx,maxy" i EPSG:4326 i SWEREF99 TM.
+
+    Returnerar (min E, min N, max E, max N).
+    """
+    bounds = tuple(map(float, bbox.split(",")))
+    return transform_bounds(bounds, "EPSG:4326", "EPSG:3006")
+
+
+def wgs84_bbox(bounds: tuple) -> str:
+    """Omsluter (min E, min N, max E, max N) som en bbox-sträng i EPSG:4326."""
+    west, south, east, north = transform_bounds(bounds, "EPSG:3006", "EPSG:4326")
+    return f"{west},{south},{east},{north}"
+
+
+def tiles_for(bounds: tuple) -> list:
+    """Rutorna (kolumn, rad) som täcker bounds."""
+    minx, miny, maxx, maxy = bounds
+    return [
+        (ix, iy)
+        for ix in range(math.floor(minx / TILE_SIZE), math.floor(maxx / TILE_SIZE) + 1)
+        for iy in range(math.floor(miny / TILE_SIZE), math.floor(maxy / TILE_SIZE) + 1)
+    ]
+
+
+def tile_bounds(tile: tuple) -> tuple:
+    ix, iy = tile
+    return (
+        ix * TILE_SIZE,
+        iy * TILE_SIZE,
+        (ix + 1) * TILE_SIZE,
+        (iy + 1) * TILE_SIZE,
+    )
+
+
+def feature_bounds(feature: dict) -> tuple | None:
+    """Omslutande rektangel för en Polygon/MultiPolygon med koordinater [N, E]."""
+    geometry = feature.get("geometry") or {}
+    coords = geometry.get("coordinates")
+    if not coords:
+        return None
+    polygons = [coords] if geometry.get("type") == "Polygon" else coords
+    points = [point for polygon in polygons for ring in polygon for point in ring]
+    if not points:
+        return None
+    northings = [point[0] for point in points]
+    eastings = [point[1] for point in points]
+    return min(eastings), min(northings), max(eastings), max(northings)
+
+
+def _intersects(a: tuple, b: tuple) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _feature_id(feature: dict):
+    return (
+        feature.get("id")
+        or (feature.get("properties") or {}).get("objektidentitet")
+        or json.dumps(feature.get("geometry"), sort_keys=True)
+    )
+
+
+def fetch_features(bbox: str) -> list:
+    """
+    Hämtar fastighetsytor inom bbox via en cache per ruta i SWEREF99 TM.
+
+    Bara rutor som saknas i cachen hämtas från Lantmäteriet, med ett anrop
+    som omsluter dem. Ytor som ligger i flera rutor tas med en gång och
+    resultatet begränsas till ytor som överlappar bbox.
+    """
+    bounds = sweref_bounds(bbox)
+    tiles = tiles_for(bounds)
+    tile_features = {tile: _tile_cache.get(tile) for tile in tiles}
+
+    missing = [tile for tile, features in tile_features.items() if features is None]
+    if missing:
+        envelopes = [tile_bounds(tile) for tile in missing]
+        envelope = (
+            min(e[0] for e in envelopes),
+            min(e[1] for e in envelopes),
+            max(e[2] for e in envelopes),
+            max(e[3] for e in envelopes),
+        )
+        fetched = [
+            (feature, feature_bounds(feature))
+            for feature in fetch_property_data(wgs84_bbox(envelope))
+        ]
+        for tile, tile_envelope in zip(missing, envelopes):
+            tile_features[tile] = [
+                feature
+                for feature, extent in fetched
+                if extent is not None and _intersects(extent, tile_envelope)
+            ]
+            _tile_cache.set(tile, tile_features[tile])
+
+    features = {}
+    for tile in tiles:
+        for feature in tile_features[tile]:
+            feature_id = _feature_id(feature)
+            if feature_id in features:
+                continue
+            extent = feature_bounds(feature)
+            if extent is not None and _intersects(extent, bounds):
+                features[feature_id] = feature
+    return list(features.values())
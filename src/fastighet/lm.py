@@ -1,67 +1,147 @@
 
-import base64
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
+from requests import HTTPError
 
-# from tasks import celery
-from config import (
-    LM_consumer_key,
-    LM_consumer_secret,
-)
+from lantmateriet import get_token, lm_request
+from progress import report
 
-LANTMATERIET_TOKEN_URL = "https://apimanager.lantmateriet.se/oauth2/token"
 LANTMATERIET_API_URL = "https://api.lantmateriet.se/ogc-features/v1/fastighetsindelning/collections/registerenhetsomradesytor/items"
+FASTIGHET_SCOPE = "ogc-features:fastighetsindelning.read"
 
+# Sidstorlekar att pröva, störst först. Servern kan begränsa till mindre.
+PAGE_LIMITS = (1000, 100)
+# Antal sidor som hämtas samtidigt, rate limitern styr takten.
+PAGE_WORKERS = 4
+# Antal sidor som får vara beställda eller hämtade men inte lämnade vidare
+PAGE_WINDOW = PAGE_WORKERS * 2
 
-def get_access_token():
-    """ Hämtar OAuth2 access token från Lantmäteriets API """
-    client_id = LM_consumer_key
-    client_secret = LM_consumer_secret
-    credentials = f"{client_id}:{client_secret}"
-    encoded_credentials = base64.b64encode(credentials.encode()).decode()
-
-    headers = {
-        "Authorization": f"Basic {encoded_credentials}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    data = "grant_type=client_credentials&scope=ogc-features:fastighetsindelning.read"
-
-    response = requests.post(LANTMATERIET_TOKEN_URL,
-                             headers=headers, data=data)
-    response.raise_for_status()
-    return response.json().get('access_token')
 
+def get_access_token():
+    """ Hämtar OAuth2 access token från Lantmäteriets API, cachad per scope """
+    return get_token(FASTIGHET_SCOPE)
 
-def fetch_property_data(bbox):
-    """ Hämtar registerenhetsomradesytor från Lantmäteriets API baserat på bbox """
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
-    all_features = []  # För att lagra alla objekt
-
-    offset = 0  # Börja från första sidan
-    limit = 100  # Antal objekt per begäran (kan justeras om det behövs)
 
-    while True:
-        params = {
-            "bbox": bbox,
-            "crs": "http://www.opengis.net/def/crs/EPSG/0/3006",
-            "offset": offset,
-            "limit": limit
-        }
+def _report_page(pages: int, total: int | None = None):
+    message = f"Hämtat {pages} av {total} sidor" if total else f"Hämtat {pages} sidor"
+    report("pages", pages=pages, total=total, message=f"{message} från fastighetsregistret")
 
-        response = requests.get(LANTMATERIET_API_URL,
-                                headers=headers, params=params)
-        response.raise_for_status()
 
-        data = response.json()
-        features = data.get("features", [])
+def _fetch_page(bbox, offset: int, limit: int) -> dict:
+    """Hämtar en sida registerenhetsomradesytor."""
+    params = {
+        "bbox": bbox,
+        "crs": "http://www.opengis.net/def/crs/EPSG/0/3006",
+        "offset": offset,
+        "limit": limit
+    }
+    response = lm_request("GET", LANTMATERIET_API_URL,
+                          scope=FASTIGHET_SCOPE, params=params, timeout=60)
+    response.raise_for_status()
+    return response.json()
 
-        all_features.extend(features)
 
-        # Om antalet returnerade objekt är mindre än 'limit', har vi hämtat alla objekt
-        if len(features) < limit:
-            break
+def _fetch_next(url: str) -> dict:
+    response = lm_request("GET", url, scope=FASTIGHET_SCOPE, timeout=60)
+    response.raise_for_status()
+    return response.json()
+
+
+def _next_link(page: dict) -> str | None:
+    return next(
+        (link.get("href") for link in page.get("links", []) if link.get("rel") == "next"),
+        None,
+    )
+
+
+def _fetch_first_page(bbox) -> dict:
+    """Hämtar första sidan med största sidstorlek som servern accepterar."""
+    for limit in PAGE_LIMITS[:-1]:
+        try:
+            return _fetch_page(bbox, 0, limit)
+        except HTTPError as err:
+            # Servern kan neka en för stor limit i stället för att begränsa den
+            if err.response is None or err.response.status_code != 400:
+                raise
+    return _fetch_page(bbox, 0, PAGE_LIMITS[-1])
+
+
+def iter_property_features(bbox):
+    """
+    Hämtar registerenhetsomradesytor inom bbox som en ström, i ordning.
+
+    Med numberMatched i första svaret hämtas resterande sidor parallellt,
+    annars följs next-länkarna en i taget. Alla anrop går genom den
+    gemensamma rate limitern mot Lantmäteriet.
+    """
+    page = _fetch_first_page(bbox)
+    features = page.get("features", [])
+    pages = 1
+
+    matched = page.get("numberMatched")
+    if matched is not None:
+        # Servern kan ha gett färre än vi bad om, det är då dess maxgräns
+        page_size = len(features)
+        if not page_size or page_size >= matched:
+            _report_page(pages, pages)
+            yield from features
+            return
+        offsets = range(page_size, matched, page_size)
+        _report_page(pages, len(offsets) + 1)
+        yield from features
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as pool:
+            pending = iter(offsets)
+            futures = deque()
+
+            def submit_next():
+                offset = next(pending, None)
+                if offset is not None:
+                    # Kopiera context så att trådarna räknas in i taskens statistik
+                    futures.append(pool.submit(contextvars.copy_context().run,
+                                               _fetch_page, bbox, offset, page_size))
+
+            # Bara ett fåtal sidor i förväg, så att inte hela bboxen hamnar i minnet
+            for _ in range(PAGE_WINDOW):
+                submit_next()
+            try:
+                while futures:
+                    page_features = futures.popleft().result().get("features", [])
+                    submit_next()
+                    pages += 1
+                    _report_page(pages, len(offsets) + 1)
+                    yield from page_features
+            finally:
+                for future in futures:
+                    future.cancel()
+        return
+
+    _report_page(pages)
+    yield from features
+
+    url = _next_link(page)
+    if url:
+        while url:
+            page = _fetch_next(url)
+            pages += 1
+            _report_page(pages)
+            yield from page.get("features", [])
+            url = _next_link(page)
+        return
+
+    # Varken antal eller länkar, bläddra tills en sida är kortare än den
+    # första. Servern kan ha gett färre än vi bad om, det är då dess maxgräns.
+    page_size = len(features)
+    offset = 0
+    while page_size and len(features) >= page_size:
+        offset += page_size
+        features = _fetch_page(bbox, offset, page_size).get("features", [])
+        pages += 1
+        _report_page(pages)
+        yield from features
 
-        offset += limit
 
-    return all_features
+def fetch_property_data(bbox):
+    """ Hämtar registerenhetsomradesytor från Lantmäteriets API baserat på bbox """
+    return list(iter_property_features(bbox))
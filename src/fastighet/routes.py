@@ -1,6 +1,4 @@
-import json
 import os
-import tempfile
 from datetime import datetime, timedelta
 
 from flask import (
@@ -15,14 +13,17 @@ from flask import (
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from artifacts import artifact_path, as_manifest
+from bbox import validate_bbox
 from config import (
     login_required,
 )
+from coalesce import submit
 from db import TaskTracker, db
 from jocoding import validate_license_and_email
 from tasks import celery
+import tracker_views
 
-from .bbox import degrees_to_meters
 
 fastighetsindelning_bp = Blueprint(
     'fastighet',
@@ -65,7 +66,6 @@ limiter = Limiter(
 @fastighetsindelning_bp.route('/')
 @login_required
 def index():
-    cleanup_temp_files()
     repo_name = request.args.get('repo_name')
     owner = request.args.get('owner')
     path = request.args.get('path', '/')
@@ -75,7 +75,6 @@ def index():
 @fastighetsindelning_bp.route('/api/trackers', methods=['GET'])
 @login_required
 def get_trackers():
-    cleanup_temp_files()
     trackers = TaskTracker.query.filter(
         TaskTracker.user_email == session["user"]['email'],
         TaskTracker.expires_at >= datetime.now()
@@ -98,9 +97,10 @@ def get_trackers():
             "created_at": t.created_at.isoformat() + 'Z',
             "reset": int(t.rate_limit_reset.timestamp()),
             "bbox": t.bbox,
-            "geojson": t.geojson,
             "file_path": t.file_path,
-            "download_url": url_for("fastighet.download_file", task_id=t.task_id)
+            "download_url": url_for("fastighet.download_file", task_id=t.task_id),
+            "geojson_url": url_for("fastighet.tracker_geojson", task_id=t.task_id),
+            "tiles_url": url_for("fastighet.tracker_tilejson", task_id=t.task_id) if t.tiles_id else None,
         }
         for t in trackers if t.file_path and os.path.exists(t.file_path)
     ]
@@ -116,7 +116,7 @@ def get_working_tasks():
     trackers = TaskTracker.query.filter(
         TaskTracker.user_email == session["user"]['email'],
         TaskTracker.expires_at > now,
-        TaskTracker.file_path is None,
+        TaskTracker.file_path.is_(None),
     ).all()
 
     if not trackers:
@@ -134,12 +134,10 @@ def download_dxf():
     bbox = request.json.get("bbox")
     if not bbox:
         return jsonify({"error": "Bounding box (bbox) parameter is required"}), 400
-
-    # Rensa upp gamla temporära filer
     try:
-        cleanup_temp_files()
-    except Exception as e:
-        print("Unable to clean temp files", e)
+        validate_bbox(bbox)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
     repo_name = request.json.get("repo_name", None)
     owner = request.json.get("owner", None)
@@ -152,10 +150,14 @@ def download_dxf():
         path = "/"
         oauth_token = None
 
-
-    # Starta Celery-task
-    task = celery.send_task(
-        "fastighet.routes.download_and_create_dxf", args=[bbox, repo_name, owner, path, oauth_token])
+    args = [bbox, repo_name, owner, path, oauth_token]
+    if repo_name and owner and oauth_token:
+        # En commit till ett repo görs alltid, den samordnas inte med andra
+        task_id = celery.send_task("fastighet.routes.download_and_create_dxf", args=args).id
+    else:
+        # Samma bbox som ett pågående eller nyss klart jobb kopplas till det
+        task_id, _ = submit("fastighet", bbox, lambda task_id: celery.send_task(
+            "fastighet.routes.download_and_create_dxf", args=args, task_id=task_id))
 
     # Hämta rate-limit-information från Flask-Limiter
     limit = limiter.current_limit
@@ -165,7 +167,7 @@ def download_dxf():
     # Spara task info i DB
     tracker = TaskTracker(
         user_email=session["user"]['email'],
-        task_id=task.id,
+        task_id=task_id,
         rate_limit_remaining=remaining,
         rate_limit_total=limit.limit.amount,
         rate_limit_reset=datetime.fromtimestamp(reset_at),
@@ -176,7 +178,7 @@ def download_dxf():
     db.session.commit()
 
     return jsonify({
-        "task_id": task.id,
+        "task_id": task_id,
         "rate_limit": {
             "remaining": remaining,
             "limit": limit.limit.amount,
@@ -213,21 +215,12 @@ def api_download_dxf():
         return jsonify({"error": "Bounding box (bbox) parameter is required"}), 400
 
     try:
-        minx, miny, maxx, maxy = map(float, bbox_str.split(","))
-    except ValueError:
-        return jsonify({"error": "Invalid bbox format"}), 400
-
-    width_m, height_m = degrees_to_meters(minx, miny, maxx, maxy)
-    if width_m > MAX_METERS or height_m > MAX_METERS:
-        return jsonify({"error": f"Bounding box with {width_m}x{height_m} exceeds 1000x1000 meter limit"}), 400
-
-    try:
-        cleanup_temp_files()
-    except Exception as e:
-        print("Unable to clean temp files: " + str(e))
+        validate_bbox(bbox_str, max_meters=MAX_METERS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    task = celery.send_task(
-        "fastighet.routes.download_and_create_dxf", args=[bbox_str])
+    task_id, _ = submit("fastighet", bbox_str, lambda task_id: celery.send_task(
+        "fastighet.routes.download_and_create_dxf", args=[bbox_str], task_id=task_id))
 
     limit = limiter.current_limit
     remaining = limit.remaining
@@ -236,7 +229,7 @@ def api_download_dxf():
     # Spara task info i DB
     tracker = TaskTracker(
         user_email=email,
-        task_id=task.id,
+        task_id=task_id,
         rate_limit_remaining=remaining,
         rate_limit_total=limit.limit.amount,
         rate_limit_reset=reset_at,
@@ -247,7 +240,7 @@ def api_download_dxf():
     db.session.commit()
 
     return jsonify({
-        "task_id": task.id,
+        "task_id": task_id,
         "rate_limit": {
             "remaining": remaining,
             "limit": limit.limit.amount,
@@ -256,25 +249,6 @@ def api_download_dxf():
     }), 202
 
 
-def cleanup_temp_files():
-    """Tömmer file_path, geojson och expires_at för trackers vars expires_at har passerats."""
-    now = datetime.now()
-    expired_trackers = TaskTracker.query.filter(
-        TaskTracker.expires_at < now,
-        TaskTracker.file_path is not None,
-        TaskTracker.geojson is not None
-    ).all()
-
-    tracker: TaskTracker
-    for tracker in expired_trackers:
-        if tracker.file_path and os.path.exists(tracker.file_path):
-            os.remove(tracker.file_path)
-        tracker.file_path = None
-        tracker.geojson = None
-
-    db.session.commit()
-
-
 @fastighetsindelning_bp.route('/task_status/<task_id>', methods=['GET'])
 def task_status(task_id):
     """Kontrollerar status för en Celery-task och hanterar temporära filer"""
@@ -283,28 +257,25 @@ def task_status(task_id):
     if task.state == 'PENDING':
         response = {"state": task.state, "status": "Task is pending..."}
     elif task.state == 'SUCCESS':
-        # Hämta task info från databasen
-        tracker: TaskTracker = TaskTracker.query.filter_by(
-            task_id=task_id).first()
-        if tracker:
-            tracker.geojson = json.dumps(task.info["geojson"])
-            db.session.commit()
-
-        # Skapa temp-fil om inte finns
-        if tracker and not tracker.file_path:
-            # Skapa en temporär fil med mkstemp
-            fd, temp_file_path = tempfile.mkstemp(
-                prefix="fastighet_",
-                suffix=".dxf",
-                dir="/tmp"
-            )
-            # Skapa en temporär fil för DXF-innehållet
-            with os.fdopen(fd, 'wb') as temp_file:
-                temp_file.write(task.info["dxf"])
-
-            # Uppdatera TaskTracker med filens sökväg
-            tracker.file_path = temp_file_path
+        # Hämta task info från databasen. Flera trackers kan dela samma
+        # task om identiska beställningar har samordnats.
+        trackers = TaskTracker.query.filter(
+            TaskTracker.task_id == task_id,
+            TaskTracker.file_path.is_(None),
+        ).all()
+
+        # Peka på artefakterna som workern redan har skrivit. Äldre
+        # resultat har DXF-filen som bytes och GeoJSON som dict.
+        if trackers:
+            geojson = as_manifest(task.info["geojson"], "application/geo+json", ".geojson")
+            file_path = artifact_path(as_manifest(task.info["dxf"], "application/dxf", ".dxf"))
+        for tracker in trackers:
+            tracker.geojson_id = geojson["path"]
+            # Saknas för resultat från före rutorna
+            tracker.tiles_id = task.info.get("tiles", {}).get("path")
+            tracker.file_path = file_path
             tracker.expires_at = datetime.now() + timedelta(hours=24)
+        if trackers:
             db.session.commit()
 
         # Returnera filens URL
@@ -329,7 +300,8 @@ def task_status(task_id):
                 "state": task.state,
                 "status": "Task completed!",
                 "file_url": file_url,
-                "geojson": task.info["geojson"]
+                "geojson_url": url_for("fastighet.tracker_geojson", task_id=task_id),
+                "tiles_url": url_for("fastighet.tracker_tilejson", task_id=task_id) if "tiles" in task.info else None,
             }
     elif task.state == 'FAILURE':
         response = {"state": task.state, "status": str(task.info)}
@@ -343,16 +315,39 @@ def task_status(task_id):
 def download_file(task_id):
     """Returnerar filen för nedladdning baserat på task_id"""
 
-    cleanup_temp_files()
-
     # Hämta task från databasen
     tracker = TaskTracker.query.filter_by(task_id=task_id).first()
 
     if not tracker:
         return jsonify({"error": "Task not found"}), 404
 
-    if not tracker.file_path or not os.path.exists(tracker.file_path):
+    # Utgångna filer tas bort av städningen i Celery beat, som kan ligga efter
+    if (not tracker.file_path or tracker.expires_at < datetime.now()
+            or not os.path.exists(tracker.file_path)):
         return jsonify({"error": "File not found or expired"}), 404
 
-    # Returnera filen som en nedladdning
-    return send_file(tracker.file_path, as_attachment=True)
+    # Returnera filen som en nedladdning, med stöd för Range-anrop
+    return send_file(
+        tracker.file_path,
+        as_attachment=True,
+        download_name=f"fastighet_{tracker.created_at:%Y%m%d_%H%M%S}.dxf",
+        conditional=True,
+    )
+
+
+@fastighetsindelning_bp.route('/api/trackers/<task_id>/geojson', methods=['GET'])
+def tracker_geojson(task_id):
+    """GeoJSON för en tracker, se tracker_views.tracker_geojson."""
+    return tracker_views.tracker_geojson(task_id)
+
+
+@fastighetsindelning_bp.route('/tiles/<task_id>', methods=['GET'])
+def tracker_tilejson(task_id):
+    """TileJSON för en tracker, se tracker_views.tracker_tilejson."""
+    return tracker_views.tracker_tilejson(task_id)
+
+
+@fastighetsindelning_bp.route('/tiles/<task_id>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def tracker_tile(task_id, z, x, y):
+    """En ruta för en tracker, se tracker_views.tracker_tile."""
+    return tracker_views.tracker_tile(task_id, z, x, y)
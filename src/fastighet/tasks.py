@@ -1,108 +1,92 @@
 
-import base64
-import io
+import os
 
-import ezdxf
+from artifacts import artifact_path, store_file, store_gzip, temp_path
+from config import dxf_binary, geojson_precision
+from geojson_writer import iter_feature_collection
+from lantmateriet import track_requests
+from progress import report
+from tiles import build_pyramid, store_pyramid
 
-from .lm import fetch_property_data
+from .dxf_builder import build_dxf
+from .feature_cache import fetch_features
 
-from config import api_base_url
 
-
-def create_dxf(data):
-    """ Skapar en DXF-fil från geojson data """
-    doc = ezdxf.new()
-    msp = doc.modelspace()
-
-    for feature in data:
-        if "geometry" in feature and feature["geometry"].get("type") == "Polygon":
-            for coords in feature["geometry"]["coordinates"]:
-                if isinstance(coords, list) and all(isinstance(point, list) and len(point) == 2 for point in coords):
-                    points = [(float(y), float(x)) for x, y in coords]
-                    msp.add_lwpolyline(
-                        points, close=True)
-
-    dxf_stream = io.StringIO()
-    doc.write(dxf_stream)
-    dxf_stream.seek(0)
-    return dxf_stream.getvalue()
-
-def flip_coordinates(geojson_features):
-    def flip_coords(coords):
-        # Hantera olika typer av koordinatstrukturer
-        return [[ [x, y] for y, x in ring ] for ring in coords]
-
-    flipped_features = []
-    for feature in geojson_features:
-        geom_type = feature.get('geometry', {}).get('type')
-        coords = feature.get('geometry', {}).get('coordinates')
-
-        if geom_type == 'Polygon' and coords:
-            feature['geometry']['coordinates'] = flip_coords(coords)
-        elif geom_type == 'MultiPolygon' and coords:
-            feature['geometry']['coordinates'] = [
-                flip_coords(polygon) for polygon in coords
-            ]
-        # Lägg till fler typer om det behövs
-
-        flipped_features.append(feature)
-
-    return flipped_features
+def create_dxf(data, path, binary=False):
+    """ Skriver en DXF-fil från geojson data direkt till path, binär DXF om binary """
+    doc = build_dxf(data)
+    doc.saveas(path, fmt="bin" if binary else "asc")
+    return path
 
 
 # @celery.task(bind=True, name="fastighet.routes.download_and_create_dxf")
 def download_and_create_dxf(self, bbox, repo_name=None, owner=None, path="/", oauth_token=None):
     """Celery task to download data and create DXF"""
 
-    data = fetch_property_data(bbox)
-    dxf_str = create_dxf(data)
-
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": flip_coordinates(data)
+    with track_requests() as lm_stats:
+        data = fetch_features(bbox)
+    print(f"Lantmäteriet: {lm_stats}")
+    report("features", features=len(data), message=f"Skapar DXF av {len(data)} fastigheter")
+    dxf_path = temp_path(prefix="fastighet_", suffix=".dxf")
+    try:
+        create_dxf(data, dxf_path, binary=dxf_binary)
+        dxf = store_file(dxf_path, "application/dxf")
+    except Exception:
+        if os.path.exists(dxf_path):
+            os.remove(dxf_path)
+        raise
+
+    # Kartan vill ha (E, N), axlarna kastas om när GeoJSON skrivs
+    geojson = iter_feature_collection(data, swap_axes=True, precision=geojson_precision)
+
+    # Bara manifesten går via result backend, filerna ligger i artefaktlagret
+    result = {
+        "geojson": store_gzip(geojson, "application/geo+json", ".geojson"),
+        # Förenklade geometrier per zoomnivå för kartans rutor
+        "tiles": store_pyramid(build_pyramid(data, "EPSG:3006", swap_axes=True)),
+        "dxf": dxf,
+        "lantmateriet": lm_stats,
     }
+    report("stored", bytes=result["dxf"]["size"],
+           message=f"DXF-fil sparad ({result['dxf']['size'] // 1024} kB)")
 
     if repo_name and owner and oauth_token:
         # Commit the DXF to the repo
-        from requests_oauthlib import OAuth2Session
-        from config import client_id
-        gitea = OAuth2Session(client_id, token=oauth_token)
+        from gitea import get_gitea, invalidate_repo, post_contents
+        gitea = get_gitea(oauth_token)
 
         # Generate filename, e.g., fastighet_20240328.dxf
         from datetime import datetime
         filename = f"fastighet_{datetime.now().strftime('%Y%m%d_%H%M%S')}.dxf"
         file_path = f"{path.rstrip('/')}/{filename}" if path != "/" else filename
 
-        commit_data = {
-            "branch": "main",
-            "message": f"Added {filename}",
-            "files": [{
-                "operation": "create",
-                "path": file_path,
-                "content": base64.b64encode(dxf_str.encode("utf-8")).decode("utf-8")
-            }],
-        }
-
         try:
-            commit_response = gitea.post(
-                f"{api_base_url}/repos/{owner}/{repo_name}/contents", json=commit_data)
+            # Filen base64-kodas i bitar när begäran skickas, den läses aldrig in hel
+            with open(artifact_path(dxf), "rb") as dxf_file:
+                commit_data = {
+                    "branch": "main",
+                    "message": f"Added {filename}",
+                    "files": [{
+                        "operation": "create",
+                        "path": file_path,
+                        "content": dxf_file,
+                    }],
+                }
+                commit_response = post_contents(gitea, owner, repo_name, commit_data)
             commit_response.raise_for_status()
+            invalidate_repo(owner, repo_name, commit_data["branch"])
+            report("commit", path=file_path, message=f"DXF-fil committad till {file_path}")
             return {
-                "geojson": geojson_data,
+                **result,
                 "status": "committed",
-                "dxf": dxf_str.encode('utf-8'),
                 "file_path": file_path,
-                "repo_url": {"owner": owner, "repo_name": repo_name, "path": path}
+                "repo_url": {"owner": owner, "repo_name": repo_name, "path": path},
             }
         except Exception as e:
             return {
-                "geojson": geojson_data,
+                **result,
                 "status": "failed",
-                "dxf": dxf_str.encode('utf-8'),
-                "error": str(e)
+                "error": str(e),
             }
     else:
-        return {
-            "geojson": geojson_data,
-            "dxf": dxf_str.encode('utf-8')
-        }
+        return result
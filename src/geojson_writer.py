@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+
+# Antal listnivåer ovanför punktlistan i respektive geometrityp
+_LEVELS = {
+    "LineString": 0,
+    "MultiPoint": 0,
+    "Polygon": 1,
+    "MultiLineString": 1,
+    "MultiPolygon": 2,
+}
+
+
+def _flatten(coords, levels: int) -> tuple[list, int | list]:
+    """Alla punkter i en koordinatstruktur och hur strukturen byggs upp igen."""
+    if levels == 0:
+        return list(coords), len(coords)
+    points, shape = [], []
+    for part in coords:
+        part_points, part_shape = _flatten(part, levels - 1)
+        points.extend(part_points)
+        shape.append(part_shape)
+    return points, shape
+
+
+def _rebuild(points: list, shape, start: int = 0) -> tuple[list, int]:
+    if isinstance(shape, int):
+        return points[start:start + shape], start + shape
+    parts = []
+    for part_shape in shape:
+        part, start = _rebuild(points, part_shape, start)
+        parts.append(part)
+    return parts, start
+
+
+def transform_points(points: list, swap_axes: bool = False, precision: int | None = None,
+                     project=None) -> list:
+    """
+    Kasta om axlarna, projicera och avrunda en lista med punkter i ett enda numpy-anrop.
+
+    project tar och returnerar arrayer (x, y), t.ex. pyprojs Transformer.transform,
+    och anropas efter att axlarna kastats om. Indata ändras inte. Punkter med
+    olika antal dimensioner hanteras en och en.
+    """
+    try:
+        array = np.array(points, dtype=float)
+    except ValueError:
+        return [transform_points([point], swap_axes, precision, project)[0] for point in points]
+    if array.ndim != 2 or array.shape[1] < 2:
+        return [list(point) for point in points]
+    if swap_axes:
+        array[:, [0, 1]] = array[:, [1, 0]]
+    if project is not None:
+        array[:, 0], array[:, 1] = project(array[:, 0], array[:, 1])
+    if precision is not None:
+        array = array.round(precision)
+    return array.tolist()
+
+
+def transform_geometry(geometry: dict | None, swap_axes: bool = False,
+                       precision: int | None = None, project=None) -> dict | None:
+    """En kopia av geometrin med omkastade axlar och projicerade, avrundade koordinater."""
+    if not geometry:
+        return geometry
+    geom_type = geometry.get("type")
+    if geom_type == "GeometryCollection":
+        return {**geometry, "geometries": [
+            transform_geometry(part, swap_axes, precision, project)
+            for part in geometry.get("geometries") or []
+        ]}
+    coords = geometry.get("coordinates")
+    if not coords:
+        return geometry
+    if geom_type == "Point":
+        return {**geometry, "coordinates": transform_points([coords], swap_axes, precision, project)[0]}
+    levels = _LEVELS.get(geom_type)
+    if levels is None:
+        return geometry
+    points, shape = _flatten(coords, levels)
+    transformed, _ = _rebuild(transform_points(points, swap_axes, precision, project), shape)
+    return {**geometry, "coordinates": transformed}
+
+
+def iter_feature_collection(features, swap_axes: bool = False, precision: int | None = None):
+    """
+    Serialisera features som en GeoJSON FeatureCollection, en feature i taget.
+
+    Ger bytes i bitar så att hela dokumentet aldrig behöver finnas i minnet.
+    Med swap_axes kastas de två första koordinaterna om, t.ex. från
+    Lantmäteriets (N, E) till (E, N), och precision avrundar till så många
+    decimaler. Features ändras inte, och samma indata ger alltid samma bytes.
+    """
+    yield b'{"type":"FeatureCollection","features":['
+    separator = b""
+    for feature in features:
+        feature = {
+            **feature,
+            "geometry": transform_geometry(feature.get("geometry"), swap_axes, precision),
+        }
+        yield separator + json.dumps(feature, separators=(",", ":")).encode("utf-8")
+        separator = b","
+    yield b"]}"
@@ -0,0 +1,165 @@
+import numpy as np
+
+
+def parse_bbox(value: str) -> tuple:
+    """Tolka "minx,miny,maxx,maxy". Ger ValueError om den inte går att använda."""
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox ska ha fyra koordinater")
+    minx, miny, maxx, maxy = parts
+    if not (np.isfinite(parts).all() and minx < maxx and miny < maxy):
+        raise ValueError("bbox måste ha min mindre än max")
+    return minx, miny, maxx, maxy
+
+
+def _positions(geometry: dict) -> np.ndarray | None:
+    coords = geometry.get("coordinates") if geometry else None
+    if not coords:
+        return None
+    geom_type = geometry.get("type")
+    if geom_type == "Point":
+        return np.asarray([coords], dtype=float)[:, :2]
+    if geom_type in ("LineString", "MultiPoint"):
+        points = coords
+    elif geom_type in ("Polygon", "MultiLineString"):
+        points = [point for ring in coords for point in ring]
+    elif geom_type == "MultiPolygon":
+        points = [point for polygon in coords for ring in polygon for point in ring]
+    else:
+        return None
+    return np.asarray(points, dtype=float)[:, :2] if points else None
+
+
+def geometry_bounds(geometry: dict) -> tuple | None:
+    """(minx, miny, maxx, maxy) för en GeoJSON-geometri, None om den är tom."""
+    points = _positions(geometry)
+    if points is None:
+        return None
+    return (*points.min(axis=0).tolist(), *points.max(axis=0).tolist())
+
+
+def intersects(a: tuple, b: tuple) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker, returnerar en mask över punkterna som behålls.
+
+    Iterativ med en stack i stället för rekursion, så långa linjer inte
+    slår i rekursionsgränsen. Första och sista punkten behålls alltid.
+    """
+    count = len(points)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        segment = points[start + 1:end] - points[start]
+        direction = points[end] - points[start]
+        length = np.hypot(*direction)
+        if length == 0:
+            # Sluten ring, mät avståndet till startpunkten
+            distances = np.hypot(segment[:, 0], segment[:, 1])
+        else:
+            distances = np.abs(
+                direction[0] * segment[:, 1] - direction[1] * segment[:, 0]
+            ) / length
+        index = int(distances.argmax())
+        if distances[index] > tolerance:
+            index += start + 1
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+
+def douglas_peucker_ranks(points: np.ndarray) -> np.ndarray:
+    """
+    Största tolerans för vilken varje punkt behålls av Douglas-Peucker.
+
+    douglas_peucker(points, t) behåller samma punkter som ranks > t, så en
+    linje kan förenklas för många toleranser efter en enda genomräkning.
+    En punkt får aldrig högre rang än punkten den delades av, annars
+    skulle den finnas kvar utan den.
+    """
+    count = len(points)
+    ranks = np.zeros(count)
+    ranks[0] = ranks[-1] = np.inf
+    stack = [(0, count - 1, np.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end <= start + 1:
+            continue
+        segment = points[start + 1:end] - points[start]
+        direction = points[end] - points[start]
+        length = np.hypot(*direction)
+        if length == 0:
+            distances = np.hypot(segment[:, 0], segment[:, 1])
+        else:
+            distances = np.abs(
+                direction[0] * segment[:, 1] - direction[1] * segment[:, 0]
+            ) / length
+        index = int(distances.argmax())
+        rank = min(float(distances[index]), parent)
+        index += start + 1
+        ranks[index] = rank
+        stack.append((start, index, rank))
+        stack.append((index, end, rank))
+    return ranks
+
+
+def simplify_line(coords: list, tolerance: float, min_points: int = 2) -> list:
+    """Förenkla en linje eller ring. Blir den för kort behålls originalet."""
+    if len(coords) <= min_points:
+        return coords
+    keep = douglas_peucker(np.asarray(coords, dtype=float)[:, :2], tolerance)
+    if keep.sum() < min_points:
+        return coords
+    return [point for point, kept in zip(coords, keep.tolist()) if kept]
+
+
+def _simplify_polygon(rings: list, tolerance: float) -> list:
+    # En ring behöver minst fyra punkter, den sista lika med den första
+    return [simplify_line(ring, tolerance, min_points=4) for ring in rings]
+
+
+def simplify_geometry(geometry: dict, tolerance: float) -> dict:
+    """Ny geometri förenklad med tolerance, i geometrins egna enheter."""
+    geom_type = geometry.get("type")
+    coords = geometry.get("coordinates")
+    if not coords or not tolerance:
+        return geometry
+    if geom_type == "LineString":
+        coords = simplify_line(coords, tolerance)
+    elif geom_type == "MultiLineString":
+        coords = [simplify_line(line, tolerance) for line in coords]
+    elif geom_type == "Polygon":
+        coords = _simplify_polygon(coords, tolerance)
+    elif geom_type == "MultiPolygon":
+        coords = [_simplify_polygon(polygon, tolerance) for polygon in coords]
+    else:
+        return geometry
+    return {**geometry, "coordinates": coords}
+
+
+def select_features(geojson: dict, bbox: tuple | None = None,
+                    tolerance: float | None = None) -> dict:
+    """
+    Ny FeatureCollection med de features som skär bbox, förenklade med tolerance.
+
+    Indata ändras inte.
+    """
+    features = []
+    for feature in geojson.get("features", []):
+        geometry = feature.get("geometry")
+        if bbox is not None:
+            bounds = geometry_bounds(geometry)
+            if bounds is None or not intersects(bounds, bbox):
+                continue
+        if tolerance and geometry:
+            feature = {**feature, "geometry": simplify_geometry(geometry, tolerance)}
+        features.append(feature)
+    return {**geojson, "features": features}
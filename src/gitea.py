@@ -1,56 +1,561 @@
 import base64
 import json
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
 
 from requests import HTTPError
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth2Session
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
-from config import api_base_url
-from crd_reader import change_point_id, crd_to_json, get_point_len, json_to_crd
+from cache import Cache
+from config import (
+    api_base_url,
+    client_id,
+    content_cache_max_bytes,
+    gitea_pool_block,
+    gitea_pool_connections,
+    gitea_pool_maxsize,
+    repo_head_ttl,
+)
+from crd_reader import append_points as append_crd_points
+from crd_reader import get_point_count, json_to_crd
 from rw5_reader import change_jobb_name as rw5changeJobbName
-from rw5_reader import change_point_id as rw5changeID
-from rw5_reader import get_point as rw5get_point
 from rw5_reader import (
-    get_rw5_header,
+    Rw5Document,
     read_rw5_data,
 )
 
+# Statistik för anslutningspoolen, gäller den aktuella processen.
+_stats_lock = threading.Lock()
+_pool_stats = {}
+
+
+def _reset_pool_stats():
+    _pool_stats.update(
+        checkouts=0,
+        new_connections=0,
+        wait_time=0.0,
+        max_wait_time=0.0,
+    )
+
+
+_reset_pool_stats()
+
+
+def _record_checkout(wait_time: float):
+    with _stats_lock:
+        _pool_stats["checkouts"] += 1
+        _pool_stats["wait_time"] += wait_time
+        _pool_stats["max_wait_time"] = max(_pool_stats["max_wait_time"], wait_time)
+
+
+def _record_new_connection():
+    with _stats_lock:
+        _pool_stats["new_connections"] += 1
+
+
+class _MeteredPoolMixin:
+    """Mäter väntetid och nya anslutningar i en urllib3-pool."""
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        conn = super()._get_conn(timeout=timeout)
+        _record_checkout(time.perf_counter() - start)
+        return conn
+
+    def _new_conn(self):
+        _record_new_connection()
+        return super()._new_conn()
+
+
+class _MeteredHTTPConnectionPool(_MeteredPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _MeteredHTTPSConnectionPool(_MeteredPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter vars keep-alive-pool delas av alla Gitea-sessioner."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _MeteredHTTPConnectionPool,
+            "https": _MeteredHTTPSConnectionPool,
+        }
+
+
+_adapter = None
+_adapter_lock = threading.Lock()
+
+
+def _get_adapter() -> PooledAdapter:
+    """Returnera processens gemensamma adapter, skapas vid första anropet."""
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                _adapter = PooledAdapter(
+                    pool_connections=gitea_pool_connections,
+                    pool_maxsize=gitea_pool_maxsize,
+                    pool_block=gitea_pool_block,
+                )
+    return _adapter
+
+
+def _reset_after_fork():
+    """Anslutningar får inte delas mellan gunicorn- eller Celery-processer."""
+    global _adapter, _adapter_lock, _stats_lock
+    _adapter = None
+    _adapter_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    _reset_pool_stats()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 
 class Gitea(OAuth2Session):
+    """OAuth2-session mot Gitea.
+
+    Varje användare får en egen lätt session med sin token, men alla
+    sessioner i processen delar samma anslutningspool.
+    """
+
     def __init__(self, client_id, token):
         super().__init__(client_id=client_id, token=token)
+        adapter = _get_adapter()
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
 
+    def close(self):
+        # Den delade poolen ska leva vidare, stäng bara sessionens egna adaptrar.
+        shared = _get_adapter()
+        for prefix, adapter in list(self.adapters.items()):
+            if adapter is shared:
+                del self.adapters[prefix]
+        super().close()
 
-def fetch_file_content(gitea: OAuth2Session, owner, repo_name, path):
+
+def get_gitea(token) -> Gitea:
+    """Skapa en Gitea-session för användarens token på den delade poolen."""
+    return Gitea(client_id, token)
+
+
+def pool_stats() -> dict:
+    """Returnera statistik för processens anslutningspool mot Gitea."""
+    with _stats_lock:
+        stats = dict(_pool_stats)
+    stats["hits"] = stats["checkouts"] - stats["new_connections"]
+    stats["pid"] = os.getpid()
+    stats["pool_connections"] = gitea_pool_connections
+    stats["pool_maxsize"] = gitea_pool_maxsize
+    stats["pool_block"] = gitea_pool_block
+    return stats
+
+
+# Repon som en session redan har fått läsa. Sessionen skapas per förfrågan,
+# så behörigheten kontrolleras en gång per förfrågan och användare.
+_authorized = weakref.WeakKeyDictionary()
+_authorized_lock = threading.Lock()
+# Senaste commit per gren, kort TTL och delad så att våra egna commits syns direkt.
+_head_cache = Cache("head", ttl=repo_head_ttl, local=False)
+# Mappinnehåll per commit-SHA ändras aldrig, TTL bara för att begränsa minnet.
+_listing_cache = Cache("listing", max_items=4096, ttl=24 * 3600)
+
+
+def authorize_repo(gitea: OAuth2Session, owner, repo_name) -> dict:
     """
-    Hämtar och avkodar innehållet i en fil från Gitea API.
+    Hämta repot med användarens token och returnera Giteas svar.
 
-    :param owner: Ägaren av repot (repository)
-    :param repo_name: Namnet på repot
-    :param path: Sökvägen till filen i repot
-    :return: Avkodat innehåll av filen
-    :raises HTTPError: Om det uppstår fel vid API-anropet
+    Cacharna nedan delas mellan alla användare och nycklas inte per token,
+    så allt som svarar ur dem börjar här. Gitea svarar 404 för ett repo
+    som användaren inte får läsa.
+
+    :raises HTTPError: Om repot inte finns eller inte får läsas
+    """
+    with _authorized_lock:
+        repo = _authorized.get(gitea, {}).get((owner, repo_name))
+    if repo is None:
+        response = gitea.get(f"{api_base_url}/repos/{owner}/{repo_name}")
+        response.raise_for_status()
+        repo = response.json()
+        with _authorized_lock:
+            _authorized.setdefault(gitea, {})[(owner, repo_name)] = repo
+    return repo
+
+
+def get_default_branch(gitea: OAuth2Session, owner, repo_name) -> str:
+    """Returnera repots standardgren."""
+    return authorize_repo(gitea, owner, repo_name)["default_branch"]
+
+
+def get_head_sha(gitea: OAuth2Session, owner, repo_name, branch=None) -> str:
+    """Returnera SHA för senaste commit på grenen (standardgrenen om None)."""
+    repo = authorize_repo(gitea, owner, repo_name)
+    if branch is None:
+        branch = repo["default_branch"]
+    sha = _head_cache.get((owner, repo_name, branch))
+    if sha is None:
+        response = gitea.get(
+            f"{api_base_url}/repos/{owner}/{repo_name}/branches/{branch}"
+        )
+        response.raise_for_status()
+        sha = response.json()["commit"]["id"]
+        _head_cache.set((owner, repo_name, branch), sha)
+    return sha
+
+
+def fetch_dir_listing(gitea: OAuth2Session, owner, repo_name, path) -> list:
+    """
+    Hämtar innehållet i en mapp, cachat per commit-SHA.
+
+    Cachen valideras mot grenens senaste commit, så ett nytt innehåll
+    hämtas bara när repot faktiskt har ändrats. Behörigheten kontrolleras
+    med användarens token även när svaret kommer ur cachen.
+    """
+    authorize_repo(gitea, owner, repo_name)
+    try:
+        sha = get_head_sha(gitea, owner, repo_name)
+    except HTTPError:
+        # T.ex. ett tomt repo utan grenar, hämta utan cache.
+        sha = None
+
+    key = (owner, repo_name, sha, path)
+    contents = _listing_cache.get(key) if sha else None
+    if contents is None:
+        response = gitea.get(
+            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}",
+            params={"ref": sha} if sha else None,
+        )
+        response.raise_for_status()
+        contents = response.json()
+        if sha:
+            _listing_cache.set(key, contents)
+    return contents
+
+
+# Ett träd för en given commit ändras aldrig.
+_tree_cache = Cache("tree", max_items=64, ttl=24 * 3600)
+# settings.ini per mapp, per commit.
+_settings_index_cache = Cache("settings_index", max_items=256, ttl=24 * 3600)
+# Tolkade inställningar per blob-SHA.
+_setting_cache = Cache("setting", max_items=4096, ttl=24 * 3600)
+
+SETTINGS_FILE = "settings.ini"
+
+
+def fetch_tree(gitea: OAuth2Session, owner, repo_name, sha) -> list:
+    """
+    Hämtar hela fil-trädet för en commit, alla sidor om svaret är trunkerat.
+
+    Varje post innehåller path, type ("blob" eller "tree"), sha och size.
+    """
+    authorize_repo(gitea, owner, repo_name)
+    tree = _tree_cache.get((owner, repo_name, sha))
+    if tree is not None:
+        return tree
+
+    tree = []
+    page = 1
+    while True:
+        response = gitea.get(
+            f"{api_base_url}/repos/{owner}/{repo_name}/git/trees/{sha}",
+            params={"recursive": "true", "page": page},
+        )
+        response.raise_for_status()
+        tree_data = response.json()
+        tree += [
+            {
+                "path": item["path"],
+                "type": item["type"],
+                "sha": item["sha"],
+                "size": item.get("size", 0),
+            }
+            for item in tree_data.get("tree") or []
+        ]
+        if not tree_data.get("truncated") or not tree_data.get("tree"):
+            break
+        page += 1
+
+    _tree_cache.set((owner, repo_name, sha), tree)
+    return tree
+
+
+def fetch_settings_index(gitea: OAuth2Session, owner, repo_name, sha) -> dict:
+    """Returnera {mapp: blob-SHA} för alla settings.ini i repot vid given commit."""
+    authorize_repo(gitea, owner, repo_name)
+    index = _settings_index_cache.get((owner, repo_name, sha))
+    if index is None:
+        index = {
+            os.path.dirname(item["path"]): item["sha"]
+            for item in fetch_tree(gitea, owner, repo_name, sha)
+            if item["type"] == "blob"
+            and os.path.basename(item["path"]) == SETTINGS_FILE
+        }
+        _settings_index_cache.set((owner, repo_name, sha), index)
+    return index
+
+
+def parse_setting(file_content: str, setting) -> str | None:
+    """Returnera värdet för setting= i en settings.ini, eller None."""
+    match = re.search(rf"{setting}=([^\s]+)", file_content)
+    return match.group(1) if match else None
+
+
+def read_setting(gitea: OAuth2Session, owner, repo_name, blob_sha, setting) -> str | None:
+    """Läs en inställning ur en settings.ini-blob, cachat per repo och blob-SHA."""
+    authorize_repo(gitea, owner, repo_name)
+    key = (owner, repo_name, blob_sha, setting)
+    value = _setting_cache.get(key)
+    if value is None:
+        response = gitea.get(
+            f"{api_base_url}/repos/{owner}/{repo_name}/git/blobs/{blob_sha}"
+        )
+        response.raise_for_status()
+        file_content = base64.b64decode(response.json()["content"]).decode(
+            "utf-8", errors="ignore"
+        )
+        # Tom sträng betyder att inställningen saknas, så att även det cachas.
+        value = parse_setting(file_content, setting) or ""
+        _setting_cache.set(key, value)
+    return value or None
+
+
+def invalidate_repo(owner, repo_name, branch):
+    """Glöm grenens senaste commit efter att vi själva har skrivit till repot."""
+    _head_cache.delete((owner, repo_name, branch))
+
+
+# Filer läses och base64-kodas i bitar av den här storleken. Delbar med 3
+# så att varje bit kan kodas för sig utan utfyllnad mitt i strömmen.
+STREAM_CHUNK_SIZE = 3 * 64 * 1024
+# Större filer än så här mellanlagras på disk i stället för i minnet.
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def open_raw_file(gitea: OAuth2Session, owner, repo_name, path, ref=None):
+    """
+    Öppnar en fil i repot som en strömmande response.
+
+    /raw ger filens bytes direkt i stället för base64 inbäddat i JSON som
+    contents-API:t. Anroparen stänger svaret.
+
+    :raises HTTPError: Om filen inte finns eller anropet misslyckas
     """
+    response = gitea.get(
+        f"{api_base_url}/repos/{owner}/{repo_name}/raw/{path}",
+        params={"ref": ref} if ref else None,
+        stream=True,
+    )
     try:
+        response.raise_for_status()
+    except HTTPError:
+        response.close()
+        raise
+    return response
+
+
+def fetch_file_stream(gitea: OAuth2Session, owner, repo_name, path, ref=None):
+    """
+    Hämtar en fil till en SpooledTemporaryFile, bit för bit.
+
+    Små filer stannar i minnet, stora skrivs till disk. Filen är
+    tillbakaspolad till början.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with open_raw_file(gitea, owner, repo_name, path, ref) as response:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def file_exists(gitea: OAuth2Session, owner, repo_name, path, ref=None) -> bool:
+    """
+    Kontrollerar om en fil eller mapp finns utan att ladda ner innehållet.
 
-        # Gör GET-förfrågan till Gitea API för att hämta filen
+    /raw svarar 404 för mappar, så då frågas contents-API:et också, som
+    svarar för både filer och mappar.
+    """
+    params = {"ref": ref} if ref else None
+    for endpoint in ("raw", "contents"):
         response = gitea.get(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}"
+            f"{api_base_url}/repos/{owner}/{repo_name}/{endpoint}/{path}",
+            params=params,
+            stream=True,
         )
-        response.raise_for_status()  # Om svaret indikerar ett HTTP-fel kastas ett undantag
+        response.close()
+        if response.status_code != 404:
+            response.raise_for_status()
+            return True
+    return False
+
+
+# Filinnehåll per blob-SHA ändras aldrig. Delas mellan app och workers via Redis.
+_content_cache = Cache(
+    "content", max_items=1024, max_bytes=content_cache_max_bytes, ttl=24 * 3600
+)
+# Senast sedda blob-SHA per sökväg, används för If-None-Match.
+_etag_cache = Cache("etag", max_items=8192, ttl=24 * 3600)
+# Större filer än så här cachas inte alls.
+CONTENT_CACHE_MAX_FILE_SIZE = 16 * 1024 * 1024
+
+
+def _etag_sha(response) -> str | None:
+    """Gitea sätter ETag till blobens SHA inom citattecken."""
+    etag = response.headers.get("ETag", "")
+    return etag.removeprefix("W/").strip('"') or None
+
+
+def fetch_file(gitea: OAuth2Session, owner, repo_name, path, ref=None) -> tuple[bytes, str | None]:
+    """
+    Hämtar en fils innehåll och blob-SHA, cachat per blob-SHA.
 
-        # Hämta och avkoda filens innehåll
-        file_data = response.json()
-        file_content = base64.b64decode(file_data["content"])
-        return file_content
+    Om innehållet för den senast sedda SHA:n finns i cachen skickas
+    If-None-Match, och ett 304-svar betyder att filen inte laddas ner igen.
 
-    except HTTPError as http_err:
-        # Om det uppstår ett HTTP-fel, kan vi logga eller hantera det
+    :raises HTTPError: Om filen inte finns eller anropet misslyckas
+    """
+    path_key = (owner, repo_name, ref or "", path)
+    known_sha = _etag_cache.get(path_key)
+    content = _content_cache.get(known_sha) if known_sha else None
+
+    response = gitea.get(
+        f"{api_base_url}/repos/{owner}/{repo_name}/raw/{path}",
+        params={"ref": ref} if ref else None,
+        headers={"If-None-Match": f'"{known_sha}"'} if content is not None else None,
+        stream=True,
+    )
+    with response:
+        if response.status_code == 304 and content is not None:
+            return content, known_sha
+        response.raise_for_status()
+        content = response.content
+        sha = _etag_sha(response)
+
+    if sha:
+        _etag_cache.set(path_key, sha)
+        if len(content) <= CONTENT_CACHE_MAX_FILE_SIZE:
+            _content_cache.set(sha, content)
+    return content, sha
+
+
+def fetch_file_content(gitea: OAuth2Session, owner, repo_name, path):
+    """
+    Hämtar innehållet i en fil från Gitea API.
+
+    :param owner: Ägaren av repot (repository)
+    :param repo_name: Namnet på repot
+    :param path: Sökvägen till filen i repot
+    :return: Filens innehåll som bytes, tomt om filen inte finns
+    """
+    try:
+        return fetch_file(gitea, owner, repo_name, path)[0]
+
+    except HTTPError:
         # Returnera en tom sträng även om filen inte finns.
         return b""
-        raise http_err
-    except Exception as e:
-        # Andra potentiella fel, t.ex. avkodningsfel
-        raise e
+
+
+def fetch_file_info(gitea: OAuth2Session, owner, repo_name, path) -> dict:
+    """
+    Hämtar en fil som {"path", "sha", "content"} med innehållet som bytes.
+
+    :raises HTTPError: Om filen inte finns eller anropet misslyckas
+    """
+    content, sha = fetch_file(gitea, owner, repo_name, path)
+    if sha is None:
+        # Utan ETag får SHA:n hämtas från contents-API:t
+        response = gitea.get(f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}")
+        response.raise_for_status()
+        sha = response.json()["sha"]
+    return {"path": path, "sha": sha, "content": content}
+
+
+def b64encode_stream(content):
+    """Base64-koda bytes, en binär fil eller en iterator av bytes i bitar."""
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        view = memoryview(content)
+        for start in range(0, len(view), STREAM_CHUNK_SIZE):
+            yield base64.b64encode(view[start:start + STREAM_CHUNK_SIZE])
+        return
+
+    chunks = content
+    if hasattr(content, "read"):
+        chunks = iter(lambda: content.read(STREAM_CHUNK_SIZE), b"")
+    rest = b""
+    for chunk in chunks:
+        chunk = rest + chunk
+        cut = len(chunk) - len(chunk) % 3
+        rest = chunk[cut:]
+        if cut:
+            yield base64.b64encode(chunk[:cut])
+    if rest:
+        yield base64.b64encode(rest)
+
+
+def _is_raw_content(content) -> bool:
+    return isinstance(content, (bytes, bytearray, memoryview)) or hasattr(
+        content, "read"
+    )
+
+
+_PLACEHOLDER = re.compile(r'"\\u0000(\d+)\\u0000"')
+
+
+def iter_json_body(data: dict):
+    """
+    Serialiserar en begäran till contents-API:t som en ström av bytes.
+
+    "content" (på toppnivå eller per fil i "files") som är bytes eller en
+    binär fil base64-kodas i bitar medan kroppen skickas, så att den kodade
+    filen aldrig behöver finnas i minnet i sin helhet. Strängar antas redan
+    vara base64-kodade och skickas som de är.
+    """
+    streams = []
+
+    def placeholder(item: dict) -> dict:
+        if not _is_raw_content(item.get("content")):
+            return item
+        streams.append(item["content"])
+        return {**item, "content": f"\x00{len(streams) - 1}\x00"}
+
+    payload = placeholder(data)
+    if "files" in payload:
+        payload = {**payload, "files": [placeholder(f) for f in payload["files"]]}
+
+    parts = _PLACEHOLDER.split(json.dumps(payload))
+    for i, part in enumerate(parts):
+        if i % 2:
+            yield b'"'
+            yield from b64encode_stream(streams[int(part)])
+            yield b'"'
+        else:
+            yield part.encode("utf-8")
+
+
+def post_contents(gitea: OAuth2Session, owner, repo_name, data: dict, path=None):
+    """
+    Skickar en commit till Gitea:s contents-API med strömmad kropp.
+
+    Utan path används /contents för flera filer, annars /contents/{path}.
+    """
+    url = f"{api_base_url}/repos/{owner}/{repo_name}/contents"
+    if path:
+        url += f"/{path}"
+    return gitea.post(
+        url,
+        data=iter_json_body(data),
+        headers={"Content-Type": "application/json"},
+    )
 
 
 def create_file(newPath, newContent, fromRw5Content) -> list:
@@ -58,14 +563,15 @@ def create_file(newPath, newContent, fromRw5Content) -> list:
 
     # Skapa nytt RW5 innehåll.
     newRw5Path = newPath.replace(".crd", ".rw5")
-    newRw5Content = get_rw5_header(fromRw5Content)
+    fromRw5 = Rw5Document(fromRw5Content)
     newJobbname = newPath.split("/")[-1].split(".")[0]
-    newRw5Content = rw5changeJobbName(newRw5Content, newJobbname)
+    newRw5Content = rw5changeJobbName(fromRw5.header, newJobbname)
 
-    # Loopa över punkterna i innehållet från blivande crd filen och lägg till dem i rw5
+    # Hämta punkterna i den blivande crd filen ur rw5 med ett uppslag per punkt
     newCrdJson = json.loads(newContent)
-    for point in newCrdJson["points"]:
-        newRw5Content += rw5get_point(fromRw5Content, point["id"])
+    newRw5Content += fromRw5.get_points(
+        point["id"] for point in newCrdJson["points"]
+    )
 
     return [
         {
@@ -82,16 +588,19 @@ def create_file(newPath, newContent, fromRw5Content) -> list:
 
 
 def _prepare_content(path: str, content: str) -> bytes:
-    """Preparera innehållet för att skrivas till repot"""
+    """Preparera innehållet för att skrivas till repot.
+
+    Returnerar filens bytes, base64-kodningen görs först när commiten
+    skickas med post_contents.
+    """
 
     # Kontrollera om filen är en .crd-fil och konvertera om nödvändigt
     if path.endswith(".crd"):
         # Konvertera JSON-innehåll tillbaka till CRD-format
-        file_content = json_to_crd(content)
-        return base64.b64encode(file_content).decode("utf-8")
+        return json_to_crd(content)
     else:
         # För vanliga textfiler, behandla innehållet som vanlig text
-        return base64.b64encode(content.encode("utf-8")).decode("utf-8")
+        return content.encode("utf-8")
 
 
 class CRSMISSMATCH(Exception):
@@ -99,46 +608,44 @@ class CRSMISSMATCH(Exception):
 
 
 def append_file(newContent, fromRw5Content, projCRS: str, toCRDfile, toRw5file) -> list:
-    """Lägg till nytt innehåll i slutet av en fil"""
+    """Lägg till nytt innehåll i slutet av en fil.
 
-    toRw5Content = base64.b64decode(toRw5file["content"]).decode(
+    toCRDfile och toRw5file är filer från fetch_file_info.
+    """
+
+    toRw5Content = toRw5file["content"].decode(
         "utf-8", errors="ignore"
     )
 
     # Kontrollera CRS.
     current_rw5_info = read_rw5_data(toRw5Content)
     if current_rw5_info["CRS"].lower() != projCRS.lower():
-        raise CRSMISSMATCH(f"Filen {toCRDfile} har ett annat koordinatsystem.")
-        # flash(f"Filen {toCRDfile} har ett annat koordinatsystem.", "warning")
+        raise CRSMISSMATCH(f"Filen {toCRDfile['path']} har ett annat koordinatsystem.")
+        # flash(f"Filen {toCRDfile['path']} har ett annat koordinatsystem.", "warning")
         # return []
 
     # Hämta punkter från rw5-filen.
     newCrdJson = json.loads(newContent)
-    rw5Points = ""
-    for point in newCrdJson["points"]:
-        rw5Points += rw5get_point(fromRw5Content, point["id"])
-
-    # Räkna hur många punkter som redan fanns.
-    toCRDContent = crd_to_json(base64.b64decode(toCRDfile["content"]))
-    toCRDContent = json.loads(toCRDContent)
-    toCRDPointCount = get_point_len(toCRDContent)
+    rw5Points = Rw5Document(fromRw5Content).extract(
+        point["id"] for point in newCrdJson["points"]
+    )
 
-    # Ändra punktid på både crd och rw5
-    rw5Points = rw5changeID(rw5Points, toCRDPointCount)
-    change_point_id(newCrdJson, toCRDPointCount)
+    # Räkna hur många punkter som redan fanns, direkt ur filens längd.
+    toCRDBytes = toCRDfile["content"]
+    toCRDPointCount = get_point_count(toCRDBytes)
 
-    # Lägg på nya rw5 punkter och crd punkter till befintliga filer.
-    toRw5Content += rw5Points
-    toCRDContent["points"] += newCrdJson["points"]
+    # Ändra punktid på rw5 och lägg på nya rw5 punkter till befintlig fil.
+    rw5Points.change_point_id(toCRDPointCount)
+    toRw5Content += str(rw5Points)
 
-    # Convertera CRD till sträng
-    toCRDStr = json.dumps(toCRDContent)
+    # Packa bara de nya crd punkterna, med nya id, och lägg dem sist i filen.
+    toCRDBytes = append_crd_points(toCRDBytes, newCrdJson["points"])
 
     return [
         {
             "operation": "update",
             "path": toCRDfile["path"],
-            "content": _prepare_content(toCRDfile["path"], toCRDStr),
+            "content": toCRDBytes,
             "sha": toCRDfile["sha"],
         },
         {
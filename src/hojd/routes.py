@@ -1,6 +1,4 @@
-import json
 import os
-import tempfile
 from datetime import datetime, timedelta
 
 from flask import (
@@ -15,10 +13,14 @@ from flask import (
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from artifacts import artifact_path, as_manifest
+from bbox import validate_bbox
 from config import login_required
+from coalesce import submit
 from db import TaskTracker, db
 from jocoding import validate_license_and_email
 from tasks import celery
+import tracker_views
 
 # from .tasks import download_and_create_hojd
 
@@ -59,14 +61,12 @@ limiter = Limiter(
 @hojd_bp.route("/")
 @login_required
 def index():
-    cleanup_temp_files()
     return render_template("hojd.html")
 
 
 @hojd_bp.route("/api/trackers", methods=["GET"])
 @login_required
 def get_trackers():
-    cleanup_temp_files()
     trackers = TaskTracker.query.filter(
         TaskTracker.user_email == session["user"]["email"],
         TaskTracker.rate_limit_reset >= datetime.now(),
@@ -89,9 +89,10 @@ def get_trackers():
             "created_at": t.created_at.strftime("%Y-%m-%d %H:%M:%S"),
             "reset": int(t.rate_limit_reset.timestamp()),
             "bbox": t.bbox,
-            "geojson": t.geojson,
             "file_path": t.file_path,
             "download_url": url_for("hojd.download_file", task_id=t.task_id),
+            "geojson_url": url_for("hojd.tracker_geojson", task_id=t.task_id),
+            "tiles_url": url_for("hojd.tracker_tilejson", task_id=t.task_id) if t.tiles_id else None,
         }
         for t in trackers
     ]
@@ -104,8 +105,8 @@ def get_trackers():
 def get_working_tasks():
     trackers = TaskTracker.query.filter(
         TaskTracker.user_email == session["user"]["email"],
-        TaskTracker.expires_at == None,
-        TaskTracker.file_path == None,
+        TaskTracker.expires_at.is_(None),
+        TaskTracker.file_path.is_(None),
     ).all()
 
     if not trackers:
@@ -122,13 +123,14 @@ def download_hojd():
     bbox = request.json.get("bbox")
     if not bbox:
         return jsonify({"error": "Bounding box (bbox) parameter is required"}), 400
-
     try:
-        cleanup_temp_files()
-    except Exception as e:
-        print("Unable to clean temp files", e)
+        validate_bbox(bbox)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    task = celery.send_task("hojd.routes.download_and_create_hojd", args=[bbox])
+    # Samma bbox som ett pågående eller nyss klart jobb kopplas till det
+    task_id, _ = submit("hojd", bbox, lambda task_id: celery.send_task(
+        "hojd.routes.download_and_create_hojd", args=[bbox], task_id=task_id))
 
     limit = limiter.current_limit
     if limit is None:
@@ -142,7 +144,7 @@ def download_hojd():
 
     tracker = TaskTracker(
         user_email=session["user"]["email"],
-        task_id=task.id,
+        task_id=task_id,
         rate_limit_remaining=remaining,
         rate_limit_total=limit_amount,
         rate_limit_reset=datetime.fromtimestamp(reset_at),
@@ -152,7 +154,7 @@ def download_hojd():
     db.session.commit()
 
     return jsonify({
-        "task_id": task.id,
+        "task_id": task_id,
         "rate_limit": {
             "remaining": remaining,
             "limit": limit_amount,
@@ -188,23 +190,14 @@ def api_download_hojd():
     if not bbox_str:
         return jsonify({"error": "Bounding box (bbox) parameter is required"}), 400
 
+    # Storleksgränsen är avstängd för höjddata, slå på den med max_meters=MAX_METERS
     try:
-        minx, miny, maxx, maxy = map(float, bbox_str.split(","))
-    except ValueError:
-        return jsonify({"error": "Invalid bbox format"}), 400
-
-    # from .bbox import degrees_to_meters
-
-    # width_m, height_m = degrees_to_meters(minx, miny, maxx, maxy)
-    # if width_m > MAX_METERS or height_m > MAX_METERS:
-    #     return jsonify({"error": f"Bounding box with {width_m}x{height_m} exceeds 1000x1000 meter limit"}), 400
-
-    try:
-        cleanup_temp_files()
-    except Exception as e:
-        print("Unable to clean temp files: " + str(e))
+        validate_bbox(bbox_str)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    task = celery.send_task("hojd.routes.download_and_create_hojd", args=[bbox_str])
+    task_id, _ = submit("hojd", bbox_str, lambda task_id: celery.send_task(
+        "hojd.routes.download_and_create_hojd", args=[bbox_str], task_id=task_id))
 
     limit = limiter.current_limit
     if limit is None:
@@ -218,7 +211,7 @@ def api_download_hojd():
 
     tracker = TaskTracker(
         user_email=email,
-        task_id=task.id,
+        task_id=task_id,
         rate_limit_remaining=remaining,
         rate_limit_total=limit_amount,
         rate_limit_reset=reset_datetime,
@@ -228,7 +221,7 @@ def api_download_hojd():
     db.session.commit()
 
     return jsonify({
-        "task_id": task.id,
+        "task_id": task_id,
         "rate_limit": {
             "remaining": remaining,
             "limit": limit_amount,
@@ -237,20 +230,6 @@ def api_download_hojd():
     }), 202
 
 
-def cleanup_temp_files():
-    now = datetime.now()
-    expired_trackers = TaskTracker.query.filter(TaskTracker.expires_at < now).all()
-
-    for tracker in expired_trackers:
-        if tracker.file_path and os.path.exists(tracker.file_path):
-            os.remove(tracker.file_path)
-        tracker.file_path = None
-        tracker.geojson = None
-        tracker.expires_at = None
-
-    db.session.commit()
-
-
 @hojd_bp.route("/task_status/<task_id>", methods=["GET"])
 def task_status(task_id):
     task = celery.AsyncResult(task_id)
@@ -258,15 +237,26 @@ def task_status(task_id):
     if task.state == "PENDING":
         response = {"state": task.state, "status": "Task is pending..."}
     elif task.state == "SUCCESS":
-        tracker = TaskTracker.query.filter_by(task_id=task_id).first()
-        if tracker and not tracker.file_path:
-            fd, temp_file_path = tempfile.mkstemp(prefix="hojd_", suffix=".zip", dir="/tmp")
-            with os.fdopen(fd, "wb") as temp_file:
-                temp_file.write(task.info["zip"])
-
-            tracker.file_path = temp_file_path
+        # Flera trackers kan dela samma task om beställningar har samordnats
+        trackers = TaskTracker.query.filter(
+            TaskTracker.task_id == task_id,
+            TaskTracker.file_path.is_(None),
+        ).all()
+        if trackers:
+            # Peka på artefakterna som workern redan har skrivit. Äldre
+            # resultat har ZIP-filen som bytes eller som en sökväg på disk.
+            if "zip_path" in task.info:
+                file_path = task.info["zip_path"]
+            else:
+                file_path = artifact_path(as_manifest(task.info["zip"], "application/zip", ".zip"))
+            geojson = as_manifest(task.info["geojson"], "application/geo+json", ".geojson")
+        for tracker in trackers:
+            tracker.file_path = file_path
             tracker.expires_at = datetime.now() + timedelta(hours=24)
-            tracker.geojson = json.dumps(task.info["geojson"])
+            tracker.geojson_id = geojson["path"]
+            # Saknas för resultat från före rutorna
+            tracker.tiles_id = task.info.get("tiles", {}).get("path")
+        if trackers:
             db.session.commit()
 
         file_url = url_for("hojd.download_file", task_id=task_id)
@@ -274,7 +264,8 @@ def task_status(task_id):
             "state": task.state,
             "status": "Task completed!",
             "file_url": file_url,
-            "geojson": task.info["geojson"],
+            "geojson_url": url_for("hojd.tracker_geojson", task_id=task_id),
+            "tiles_url": url_for("hojd.tracker_tilejson", task_id=task_id) if "tiles" in task.info else None,
         }
     elif task.state == "FAILURE":
         response = {"state": task.state, "status": str(task.info)}
@@ -286,13 +277,36 @@ def task_status(task_id):
 
 @hojd_bp.route("/download_file/<task_id>", methods=["GET"])
 def download_file(task_id):
-    cleanup_temp_files()
-
     tracker = TaskTracker.query.filter_by(task_id=task_id).first()
     if not tracker:
         return jsonify({"error": "Task not found"}), 404
 
-    if not tracker.file_path or not os.path.exists(tracker.file_path):
+    # Utgångna filer tas bort av städningen i Celery beat, som kan ligga efter
+    if (not tracker.file_path or tracker.expires_at < datetime.now()
+            or not os.path.exists(tracker.file_path)):
         return jsonify({"error": "File not found or expired"}), 404
 
-    return send_file(tracker.file_path, as_attachment=True)
+    return send_file(
+        tracker.file_path,
+        as_attachment=True,
+        download_name=f"hojd_{tracker.created_at:%Y%m%d_%H%M%S}.zip",
+        conditional=True,
+    )
+
+
+@hojd_bp.route("/api/trackers/<task_id>/geojson", methods=["GET"])
+def tracker_geojson(task_id):
+    """GeoJSON för en tracker, se tracker_views.tracker_geojson."""
+    return tracker_views.tracker_geojson(task_id)
+
+
+@hojd_bp.route("/tiles/<task_id>", methods=["GET"])
+def tracker_tilejson(task_id):
+    """TileJSON för en tracker, se tracker_views.tracker_tilejson."""
+    return tracker_views.tracker_tilejson(task_id)
+
+
+@hojd_bp.route("/tiles/<task_id>/<int:z>/<int:x>/<int:y>", methods=["GET"])
+def tracker_tile(task_id, z, x, y):
+    """En ruta för en tracker, se tracker_views.tracker_tile."""
+    return tracker_views.tracker_tile(task_id, z, x, y)
@@ -1,54 +1,33 @@
-import base64
+import contextvars
 import json
-import time
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlsplit
 
-import requests
-
-from config import LM_consumer_key, LM_consumer_secret, LM_stac_scope
+from artifacts import temp_dir, temp_path
+from config import LM_stac_scope
+from lantmateriet import get_token, lm_request
+from progress import report
 
 STAC_API_BASE = "https://api.lantmateriet.se/stac-hojd/v1"
-STAC_TOKEN_URL = "https://apimanager.lantmateriet.se/oauth2/token"
-
-# Rate limiting: 240 requests/min = 4 requests/sec = min 0.25 sec mellan requests
-MIN_REQUEST_INTERVAL = 0.25  # sekunder
-_last_request_time = 0
-
-
-def _rate_limit_sleep():
-    """Säkerställ att vi inte överskrider 240 requests/min till Lantmäteriet."""
-    global _last_request_time
-    now = time.time()
-    time_since_last = now - _last_request_time
-    if time_since_last < MIN_REQUEST_INTERVAL:
-        time.sleep(MIN_REQUEST_INTERVAL - time_since_last)
-    _last_request_time = time.time()
 
+# Max antal assets per nedladdning, begränsar antalet anrop.
+MAX_ASSETS = 20
+# Antal assets som hämtas samtidigt, rate limitern styr takten.
+ASSET_WORKERS = 4
+ASSET_CHUNK_SIZE = 1024 * 1024
+# Redan komprimerade format, deflate sparar inget men kostar tid.
+STORED_SUFFIXES = (".tif", ".tiff", ".laz", ".zip", ".png", ".jpg", ".jpeg")
 
 def get_stac_access_token():
-    """Hämtar OAuth2 access token för STAC-höjdmodell från Lantmäteriet."""
-    if not (LM_consumer_key and LM_consumer_secret):
-        raise RuntimeError("LM_consumer_key or LM_consumer_secret is not configured")
-
-    credentials = f"{LM_consumer_key}:{LM_consumer_secret}"
-    encoded_credentials = base64.b64encode(credentials.encode()).decode()
-
-    headers = {
-        "Authorization": f"Basic {encoded_credentials}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
-    scope = LM_stac_scope or ""
-    data = f"grant_type=client_credentials&scope={scope}"
-
-    _rate_limit_sleep()
-    resp = requests.post(STAC_TOKEN_URL, headers=headers, data=data, timeout=30)
-    resp.raise_for_status()
+    """Hämtar OAuth2 access token för STAC-höjdmodell från Lantmäteriet.
 
-    token = resp.json().get("access_token")
-    if not token:
-        raise RuntimeError("Ingen access_token i STAC oauth-respons")
-
-    return token
+    Token cachas per scope och delas mellan workers, så samma token används
+    för sökningen och nedladdningen av assets.
+    """
+    return get_token(LM_stac_scope or "")
 
 
 def fetch_stac_items(bbox, collections=None, max_items=10):
@@ -59,9 +38,7 @@ def fetch_stac_items(bbox, collections=None, max_items=10):
         collections: lista med collection-namn att filtrera på
         max_items: max antal items att returnera (begränsar antal requests/assets)
     """
-    token = get_stac_access_token()
     headers = {
-        "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
     }
 
@@ -73,15 +50,15 @@ def fetch_stac_items(bbox, collections=None, max_items=10):
     if collections:
         body["collections"] = collections
 
-    _rate_limit_sleep()
-    resp = requests.post(f"{STAC_API_BASE}/search", headers=headers, json=body, timeout=60)
-
-    if resp.status_code == 429:
-        retry_after = int(resp.headers.get("Retry-After", 60))
-        print(f"Rate limited. Väntar {retry_after}s...")
-        time.sleep(retry_after)
-        _rate_limit_sleep()
-        resp = requests.post(f"{STAC_API_BASE}/search", headers=headers, json=body, timeout=60)
+    # Rate limit och omförsök vid 429 sköts gemensamt för alla workers
+    resp = lm_request(
+        "POST",
+        f"{STAC_API_BASE}/search",
+        scope=LM_stac_scope or "",
+        headers=headers,
+        json=body,
+        timeout=60,
+    )
 
     resp.raise_for_status()
 
@@ -93,31 +70,86 @@ def fetch_stac_items(bbox, collections=None, max_items=10):
     return items[:max_items]
 
 
-def save_stac_assets_to_zip(items, bbox, asset_keys=None):
-    """Hämtar betecknade asset-filer och paketerar i ett ZIP-objekt.
+def _download_asset(href, directory) -> str:
+    """Strömmar en asset till en temporär fil och returnerar sökvägen."""
+    fd, path = tempfile.mkstemp(prefix="asset_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f, lm_request(
+            "GET",
+            href,
+            scope=LM_stac_scope or "",
+            stream=True,
+            timeout=120,
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(ASSET_CHUNK_SIZE):
+                f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _compress_type(name: str) -> int:
+    """TIFF och andra redan komprimerade format lagras utan deflate."""
+    if name.lower().endswith(STORED_SUFFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def save_stac_assets_to_zip(items, bbox, asset_keys=None, zip_path=None) -> str:
+    """Hämtar betecknade asset-filer och paketerar dem i en ZIP-fil på disk.
+
+    Assets hämtas parallellt, under den gemensamma rate limitern, till
+    temporära filer som skrivs in i ZIP-filen i ordning, så minnet inte
+    växer med antalet eller storleken på filerna.
 
     Args:
         items: STAC-items
         bbox: bounding box sträng
         asset_keys: vilka asset-typer att hämta (t.ex. ["data"] eller ["thumbnail"])
                     None = hämta bara vanliga typer
-    """
-    from io import BytesIO
-    import zipfile
+        zip_path: var ZIP-filen ska skrivas, None = ny temporär fil i artefaktlagret
 
+    Returns:
+        Sökvägen till ZIP-filen
+    """
     if asset_keys is None:
         asset_keys = ["data", "thumbnail", "overview"]
 
-    token = get_stac_access_token()
-    headers = {
-        "Authorization": f"Bearer {token}",
-    }
+    if zip_path is None:
+        zip_path = temp_path(prefix="hojd_", suffix=".zip")
+
+    # Välj ut vilka assets som ska hämtas innan något laddas ner
+    downloads = []
+    truncated = False
+    for i, item in enumerate(items):
+        item_id = item.get("id", f"item_{i}")
+        for asset_key, asset_info in item.get("assets", {}).items():
+            if asset_keys and asset_key not in asset_keys:
+                continue
+            href = asset_info.get("href")
+            if not href:
+                continue
+            if len(downloads) >= MAX_ASSETS:
+                truncated = True
+                break
 
-    mem_zip = BytesIO()
-    total_assets = 0
-    max_assets = 20
+            candidate_name = urlsplit(href).path.split("/")[-1]
+            if not candidate_name:
+                candidate_name = f"item_{i}_{asset_key}"
+            downloads.append((f"{item_id}_{asset_key}", candidate_name, href))
+        if truncated:
+            break
+
+    with zipfile.ZipFile(zip_path, mode="w", compression=zipfile.ZIP_DEFLATED) as zf, \
+            ThreadPoolExecutor(max_workers=ASSET_WORKERS) as pool:
+        futures = [
+            # Kopiera context så att trådarna räknas in i taskens statistik
+            pool.submit(contextvars.copy_context().run, _download_asset, href, temp_dir())
+            for _, _, href in downloads
+        ]
 
-    with zipfile.ZipFile(mem_zip, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
         zf.writestr("metadata.json", f"{{\"bbox\": \"{bbox}\", \"count\": {len(items)} }}")
 
         for i, item in enumerate(items):
@@ -127,43 +159,26 @@ def save_stac_assets_to_zip(items, bbox, asset_keys=None):
             if geometry:
                 zf.writestr(f"item_{i}_geometry.geojson", json.dumps({"type": "Feature", "id": item_id, "geometry": geometry, "properties": item.get("properties", {})}))
 
-            assets = item.get("assets", {})
-            for asset_key, asset_info in assets.items():
-                if asset_keys and asset_key not in asset_keys:
-                    continue
-
-                if total_assets >= max_assets:
-                    zf.writestr("_WARNING.txt", f"Begränsat till {max_assets} assets för att respektera API-limitering")
-                    break
-
-                href = asset_info.get("href")
-                if not href:
-                    continue
-
-                candidate_name = urlsplit(href).path.split("/")[-1]
-                if not candidate_name:
-                    candidate_name = f"item_{i}_{asset_key}"
-
-                try:
-                    _rate_limit_sleep()
-                    response = requests.get(href, headers=headers, stream=True, timeout=120)
-
-                    if response.status_code == 429:
-                        retry_after = int(response.headers.get("Retry-After", 60))
-                        print(f"Rate limited vid asset-download. Väntar {retry_after}s...")
-                        time.sleep(retry_after)
-                        _rate_limit_sleep()
-                        response = requests.get(href, headers=headers, stream=True, timeout=120)
-
-                    response.raise_for_status()
-                    file_data = response.content
-                    zf.writestr(f"{item_id}_{asset_key}_{candidate_name}", file_data)
-                    total_assets += 1
-                except Exception as exc:
-                    zf.writestr(f"{item_id}_{asset_key}_ERROR.txt", str(exc))
-
-            if total_assets >= max_assets:
-                break
-
-    mem_zip.seek(0)
-    return mem_zip.getvalue()
+        for done, ((prefix, candidate_name, _), future) in enumerate(zip(downloads, futures), 1):
+            try:
+                asset_path = future.result()
+            except Exception as exc:
+                zf.writestr(f"{prefix}_ERROR.txt", str(exc))
+                continue
+            report("assets", done=done, total=len(downloads),
+                   message=f"Hämtat {done} av {len(downloads)} filer")
+            try:
+                zf.write(
+                    asset_path,
+                    f"{prefix}_{candidate_name}",
+                    compress_type=_compress_type(candidate_name),
+                )
+            finally:
+                os.remove(asset_path)
+
+        if truncated:
+            zf.writestr("_WARNING.txt", f"Begränsat till {MAX_ASSETS} assets för att respektera API-limitering")
+
+    size = os.path.getsize(zip_path)
+    report("stored", bytes=size, message=f"ZIP-fil skriven ({size // 1024} kB)")
+    return zip_path
@@ -1,3 +1,7 @@
+from artifacts import store_file, store_json
+from lantmateriet import track_requests
+from tiles import build_pyramid, store_pyramid
+
 from .stac import fetch_stac_items, save_stac_assets_to_zip
 
 
@@ -6,15 +10,20 @@ def download_and_create_hojd(self, bbox):
     """Celery task to hämta markhöjdmodell via STAC och skapa zip/geojson.
 
     Rate limiting:
-    - Max 240 requests/min till Lantmäteriet (4 req/sec, 0.25s mellan requests)
+    - Max 240 requests/min till Lantmäteriet, gemensamt för alla workers
     - Max 10 items per bbox search
     - Max 20 asset-filer per nedladdning (begränsar total requests)
     - Bara hämtar data/thumbnail/overview assets
     """
-    items = fetch_stac_items(bbox, collections=[], max_items=10)
+    with track_requests() as lm_stats:
+        items = fetch_stac_items(bbox, collections=[], max_items=10)
+
+        if not items:
+            raise RuntimeError("Ingen markhöjddata hittades för den angivna bboxen")
 
-    if not items:
-        raise RuntimeError("Ingen markhöjddata hittades för den angivna bboxen")
+        # Hämta bara vanliga asset-typer för att begränsa requests
+        zip_path = save_stac_assets_to_zip(items, bbox, asset_keys=["data"])
+    print(f"Lantmäteriet: {lm_stats}")
 
     geojson = {
         "type": "FeatureCollection",
@@ -30,10 +39,11 @@ def download_and_create_hojd(self, bbox):
         }
         geojson["features"].append(feature)
 
-    # Hämta bara vanliga asset-typer för att begränsa requests
-    zip_bytes = save_stac_assets_to_zip(items, bbox, asset_keys=["data"])
-
+    # Bara manifesten går via result backend, filerna ligger i artefaktlagret
     return {
-        "geojson": geojson,
-        "zip": zip_bytes,
+        "geojson": store_json(geojson, "application/geo+json", ".geojson"),
+        # STAC-geometrier är alltid i WGS84
+        "tiles": store_pyramid(build_pyramid(geojson["features"], "EPSG:4326")),
+        "zip": store_file(zip_path, "application/zip"),
+        "lantmateriet": lm_stats,
     }
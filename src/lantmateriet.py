@@ -0,0 +1,352 @@
+import base64
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import get_redis, redis_failed
+from config import LM_consumer_key, LM_consumer_secret, LM_rate_limit
+
+LANTMATERIET_TOKEN_URL = "https://apimanager.lantmateriet.se/oauth2/token"
+
+# Så många anrop kan gå direkt efter varandra innan takten begränsas.
+RATE_LIMIT_BURST = 4
+# Omförsök vid 429 och överbelastning, med jitter runt en exponentiellt växande väntan.
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_STATUS = (429, 502, 503, 504)
+# Keep-alive-anslutningar per värd, räcker för parallell sidhämtning.
+POOL_MAXSIZE = 8
+
+# Token bucket i Redis. Varje anrop reserverar en token och får tillbaka hur
+# länge det ska vänta, så anropen köas i tur och ordning mellan processerna.
+# KEYS[1] = hinken, KEYS[2] = paus efter Retry-After (unix-tid)
+# ARGV[1] = tokens per sekund, ARGV[2] = hinkens storlek
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+local start = math.max(now, tonumber(redis.call('GET', KEYS[2]) or '0'))
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+local wait = start - now
+if tokens < 0 then
+    wait = wait + (-tokens / rate)
+end
+return tostring(wait)
+"""
+
+
+class RateLimiter:
+    """Token bucket som delas mellan alla processer via Redis.
+
+    Utan Redis (t.ex. i tester) begränsas bara den egna processen.
+    """
+
+    def __init__(self, name: str, per_minute: int, burst: int = RATE_LIMIT_BURST):
+        self.rate = per_minute / 60
+        self.capacity = burst
+        self._bucket_key = f"repo_browser:rate_limit:{name}"
+        self._blocked_key = f"{self._bucket_key}:blocked_until"
+        self._script = None
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._blocked_until = 0.0
+
+    def _reserve_local(self) -> float:
+        with self._lock:
+            now = time.time()
+            elapsed = max(0.0, now - self._updated)
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate) - 1
+            self._updated = now
+            wait = max(0.0, self._blocked_until - now)
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+            return wait
+
+    def _reserve(self) -> float:
+        client = get_redis()
+        if client is None:
+            return self._reserve_local()
+        try:
+            if self._script is None:
+                self._script = client.register_script(_TOKEN_BUCKET_LUA)
+            wait = self._script(
+                keys=[self._bucket_key, self._blocked_key],
+                args=[self.rate, self.capacity],
+            )
+            return max(0.0, float(wait))
+        except redis.RedisError as exc:
+            redis_failed(exc)
+            return self._reserve_local()
+
+    def acquire(self) -> float:
+        """Vänta på en plats i kön. Returnerar väntetiden i sekunder."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def block(self, seconds: float):
+        """Pausa alla processer, t.ex. efter ett 429 med Retry-After."""
+        until = time.time() + seconds
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, until)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            current = float(client.get(self._blocked_key) or 0)
+            if until > current:
+                client.set(self._blocked_key, until, ex=int(seconds) + 1)
+        except redis.RedisError as exc:
+            redis_failed(exc)
+
+
+rate_limiter = RateLimiter("lantmateriet", LM_rate_limit)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Processens keep-alive-session mot Lantmäteriet."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_maxsize=POOL_MAXSIZE))
+                _session = session
+    return _session
+
+
+def _reset_after_fork():
+    """Anslutningar får inte delas mellan Celery-processer."""
+    global _session, _session_lock
+    _session = None
+    _session_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Statistik för anropen i den pågående tasken, se track_requests.
+_request_stats = contextvars.ContextVar("lantmateriet_request_stats", default=None)
+_stats_lock = threading.Lock()
+
+
+@contextmanager
+def track_requests():
+    """Samla antal anrop, omförsök och väntetid för en task.
+
+    wait_time är tiden i rate limit-kön, backoff_time tiden i omförsök.
+    """
+    stats = {"requests": 0, "retries": 0, "wait_time": 0.0, "backoff_time": 0.0}
+    reset = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(reset)
+        stats["wait_time"] = round(stats["wait_time"], 3)
+        stats["backoff_time"] = round(stats["backoff_time"], 3)
+
+
+def _record(**counts):
+    stats = _request_stats.get()
+    if stats is not None:
+        # Sidor kan hämtas parallellt i trådar som delar samma statistik
+        with _stats_lock:
+            for key, value in counts.items():
+                stats[key] += value
+
+
+def _retry_after(response) -> float | None:
+    """Tolka Retry-After, antingen sekunder eller ett HTTP-datum."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int, retry_after: float | None) -> float:
+    """Exponentiell väntan med jitter, minst så länge som Retry-After anger."""
+    backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return (retry_after or 0.0) + random.uniform(backoff / 2, backoff)
+
+
+def lm_request(method: str, url: str, scope: str | None = None, **kwargs):
+    """
+    Gör ett anrop till Lantmäteriet genom den gemensamma rate limitern.
+
+    Med scope läggs en cachad Bearer-token till, och vid 401 hämtas en ny.
+    Vid 429 och 5xx-överbelastning görs omförsök med jitter enligt
+    Retry-After, och alla workers pausas lika länge. Svaret efter sista
+    försöket returneras, anroparen kontrollerar status.
+    """
+    headers = dict(kwargs.pop("headers", None) or {})
+    token_refreshed = False
+    attempt = 0
+    while True:
+        if scope:
+            headers["Authorization"] = f"Bearer {get_token(scope)}"
+        _record(wait_time=rate_limiter.acquire(), requests=1)
+        response = get_session().request(method, url, headers=headers, **kwargs)
+
+        if response.status_code == 401 and scope and not token_refreshed:
+            response.close()
+            invalidate_token(scope)
+            token_refreshed = True
+            continue
+
+        if response.status_code not in RETRY_STATUS or attempt >= MAX_RETRIES:
+            return response
+
+        retry_after = _retry_after(response)
+        delay = _backoff(attempt, retry_after)
+        print(f"Lantmäteriet svarade {response.status_code}. Väntar {delay:.1f}s...")
+        response.close()
+        if retry_after is not None:
+            rate_limiter.block(retry_after)
+        _record(retries=1, backoff_time=delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+# En token förnyas så här många sekunder innan den går ut.
+TOKEN_REFRESH_MARGIN = 120
+# Om token-svaret saknar expires_in.
+DEFAULT_EXPIRES_IN = 3600
+
+
+class TokenManager:
+    """Cachar client credentials-tokens från Lantmäteriet per scope.
+
+    En token används tills strax före expires_in och delas mellan
+    workerprocesserna via Redis. Förnyelsen skyddas av ett Redis-lås så
+    att bara en process i taget hämtar en ny token.
+    """
+
+    def __init__(self, token_url: str = LANTMATERIET_TOKEN_URL):
+        self.token_url = token_url
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def _redis_key(self, scope: str) -> str:
+        return f"repo_browser:lm_token:{scope}"
+
+    def _valid(self, entry) -> str | None:
+        if entry and entry["expires_at"] - TOKEN_REFRESH_MARGIN > time.time():
+            return entry["access_token"]
+        return None
+
+    def get_token(self, scope: str) -> str:
+        """Returnera en giltig token för scope, hämta en ny bara vid behov."""
+        token = self._valid(self._tokens.get(scope))
+        if token:
+            return token
+        with self._lock:
+            token = self._valid(self._tokens.get(scope))
+            if token:
+                return token
+            entry = self._shared_or_fetch(scope)
+            self._tokens[scope] = entry
+            return entry["access_token"]
+
+    def invalidate(self, scope: str):
+        """Glöm en token som Lantmäteriet inte längre accepterar."""
+        with self._lock:
+            self._tokens.pop(scope, None)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            client.delete(self._redis_key(scope))
+        except redis.RedisError as exc:
+            redis_failed(exc)
+
+    def _read_shared(self, client, scope: str):
+        raw = client.get(self._redis_key(scope))
+        entry = json.loads(raw) if raw else None
+        return entry if self._valid(entry) else None
+
+    def _shared_or_fetch(self, scope: str) -> dict:
+        client = get_redis()
+        if client is None:
+            return self._fetch(scope)
+        key = self._redis_key(scope)
+        try:
+            entry = self._read_shared(client, scope)
+            if entry:
+                return entry
+            with client.lock(f"{key}:lock", timeout=30, blocking_timeout=35):
+                # En annan process kan ha förnyat medan vi väntade på låset
+                entry = self._read_shared(client, scope)
+                if entry:
+                    return entry
+                entry = self._fetch(scope)
+                client.set(key, json.dumps(entry), exat=int(entry["expires_at"]))
+                return entry
+        except redis.exceptions.LockError:
+            return self._fetch(scope)
+        except redis.RedisError as exc:
+            redis_failed(exc)
+            return self._fetch(scope)
+
+    def _fetch(self, scope: str) -> dict:
+        """Hämta en ny token från Lantmäteriets token-endpoint."""
+        if not (LM_consumer_key and LM_consumer_secret):
+            raise RuntimeError("LM_consumer_key or LM_consumer_secret is not configured")
+
+        credentials = f"{LM_consumer_key}:{LM_consumer_secret}"
+        encoded_credentials = base64.b64encode(credentials.encode()).decode()
+        headers = {
+            "Authorization": f"Basic {encoded_credentials}",
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+        data = f"grant_type=client_credentials&scope={scope}"
+
+        response = lm_request("POST", self.token_url, headers=headers, data=data, timeout=30)
+        response.raise_for_status()
+        token_data = response.json()
+        if not token_data.get("access_token"):
+            raise RuntimeError("Ingen access_token i oauth-respons från Lantmäteriet")
+
+        expires_in = int(token_data.get("expires_in") or DEFAULT_EXPIRES_IN)
+        return {
+            "access_token": token_data["access_token"],
+            "expires_at": time.time() + expires_in,
+        }
+
+
+token_manager = TokenManager()
+
+
+def get_token(scope: str) -> str:
+    """Returnera en cachad token för scope från processens token-hanterare."""
+    return token_manager.get_token(scope)
+
+
+def invalidate_token(scope: str):
+    token_manager.invalidate(scope)
@@ -0,0 +1,51 @@
+"""Index för TaskTracker
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tabellen skapas av db.create_all() i appen, med index om den är ny
+    op.create_table(
+        'task_tracker',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_email', sa.String(), nullable=False),
+        sa.Column('task_id', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('rate_limit_remaining', sa.Integer(), nullable=True),
+        sa.Column('rate_limit_total', sa.Integer(), nullable=True),
+        sa.Column('rate_limit_reset', sa.DateTime(), nullable=True),
+        sa.Column('bbox', sa.Text(), nullable=True),
+        sa.Column('file_path', sa.String(), nullable=True),
+        sa.Column('geojson', sa.Text(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_task_tracker_task_id', 'task_tracker', ['task_id'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_task_tracker_expires_at', 'task_tracker', ['expires_at'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_task_tracker_user_email_expires_at', 'task_tracker',
+                    ['user_email', 'expires_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    # Tabellen lämnas kvar. I befintliga installationer fanns den redan före
+    # migreringarna, skapad av db.create_all(), och upgrade vet inte om den
+    # skapade tabellen eller inte. Att ta bort den skulle radera trackers.
+    op.drop_index('ix_task_tracker_user_email_expires_at', table_name='task_tracker')
+    op.drop_index('ix_task_tracker_expires_at', table_name='task_tracker')
+    op.drop_index('ix_task_tracker_task_id', table_name='task_tracker')
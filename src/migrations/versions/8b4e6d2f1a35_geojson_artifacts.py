@@ -0,0 +1,79 @@
+"""GeoJSON som artefakt i stället för i TaskTracker
+
+Revision ID: 8b4e6d2f1a35
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+import json
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+from artifacts import artifact_path, read_bytes, store_json
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d2f1a35'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def _columns():
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns('task_tracker')}
+
+
+task_tracker = sa.table(
+    'task_tracker',
+    sa.column('id', sa.Integer),
+    sa.column('geojson', sa.Text),
+    sa.column('geojson_id', sa.String),
+)
+
+
+def upgrade():
+    # En ny databas skapas redan med rätt kolumner av db.create_all()
+    columns = _columns()
+    if 'geojson_id' not in columns:
+        with op.batch_alter_table('task_tracker') as batch_op:
+            batch_op.add_column(sa.Column('geojson_id', sa.String(), nullable=True))
+    if 'geojson' in columns:
+        # Flytta befintlig GeoJSON till artefaktlagret innan kolumnen tas bort
+        bind = op.get_bind()
+        rows = bind.execute(
+            sa.select(task_tracker.c.id, task_tracker.c.geojson)
+            .where(task_tracker.c.geojson.isnot(None))
+        ).all()
+        for tracker_id, geojson in rows:
+            manifest = store_json(json.loads(geojson), 'application/geo+json', '.geojson')
+            bind.execute(
+                task_tracker.update()
+                .where(task_tracker.c.id == tracker_id)
+                .values(geojson_id=manifest['path'])
+            )
+        with op.batch_alter_table('task_tracker') as batch_op:
+            batch_op.drop_column('geojson')
+
+
+def downgrade():
+    with op.batch_alter_table('task_tracker') as batch_op:
+        batch_op.add_column(sa.Column('geojson', sa.Text(), nullable=True))
+    # Läs tillbaka GeoJSON som inte har städats bort ur artefaktlagret
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(task_tracker.c.id, task_tracker.c.geojson_id)
+        .where(task_tracker.c.geojson_id.isnot(None))
+    ).all()
+    for tracker_id, geojson_id in rows:
+        manifest = {'path': geojson_id}
+        if not os.path.exists(artifact_path(manifest)):
+            continue
+        bind.execute(
+            task_tracker.update()
+            .where(task_tracker.c.id == tracker_id)
+            .values(geojson=read_bytes(manifest).decode('utf-8'))
+        )
+    with op.batch_alter_table('task_tracker') as batch_op:
+        batch_op.drop_column('geojson_id')
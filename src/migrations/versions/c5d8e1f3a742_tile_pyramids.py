@@ -0,0 +1,32 @@
+"""Pyramid med förenklade geometrier för kartans rutor
+
+Revision ID: c5d8e1f3a742
+Revises: 8b4e6d2f1a35
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8e1f3a742'
+down_revision = '8b4e6d2f1a35'
+branch_labels = None
+depends_on = None
+
+
+def _columns():
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns('task_tracker')}
+
+
+def upgrade():
+    # En ny databas skapas redan med rätt kolumner av db.create_all()
+    if 'tiles_id' not in _columns():
+        with op.batch_alter_table('task_tracker') as batch_op:
+            batch_op.add_column(sa.Column('tiles_id', sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('task_tracker') as batch_op:
+        batch_op.drop_column('tiles_id')
@@ -0,0 +1,108 @@
+import contextvars
+import json
+import time
+
+import redis
+
+from cache import get_redis, redis_failed
+
+# Senaste händelsen sparas så länge, så att en sen lyssnare får aktuellt läge.
+LAST_EVENT_TTL = 3600
+# Kommentarrad som håller anslutningen vid liv genom proxies.
+HEARTBEAT_INTERVAL = 15
+# En ström stängs efter så här många sekunder, EventSource ansluter då igen.
+STREAM_MAX_DURATION = 300
+# Väntan i millisekunder innan webbläsaren ansluter igen.
+RECONNECT_DELAY = 2000
+# Händelser som betyder att tasken är klar och strömmen kan avslutas.
+FINAL_EVENTS = ("done", "failed")
+
+# Tasken som körs i den här contexten, sätts av Celery-signalerna i tasks.py.
+_current_task = contextvars.ContextVar("progress_task_id", default=None)
+
+
+def _channel(task_id: str) -> str:
+    return f"repo_browser:progress:{task_id}"
+
+
+def _last_key(task_id: str) -> str:
+    return f"{_channel(task_id)}:last"
+
+
+def publish(task_id: str, event: str, **data):
+    """Skicka en händelse till alla som följer tasken. Utan Redis händer inget."""
+    client = get_redis()
+    if client is None or not task_id:
+        return
+    message = json.dumps({"event": event, **data})
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.set(_last_key(task_id), message, ex=LAST_EVENT_TTL)
+        pipe.publish(_channel(task_id), message)
+        pipe.execute()
+    except redis.RedisError as exc:
+        redis_failed(exc)
+
+
+def start(task_id: str):
+    """Låt report publicera för tasken som körs i den här contexten."""
+    _current_task.set(task_id)
+
+
+def finish(task_id: str, state: str):
+    """Publicera sista händelsen när resultatet finns i result backend."""
+    _current_task.set(None)
+    publish(task_id, "done" if state == "SUCCESS" else "failed", state=state)
+
+
+def report(event: str, **data):
+    """Publicera en händelse för den pågående tasken, om det finns någon."""
+    task_id = _current_task.get()
+    if task_id:
+        publish(task_id, event, **data)
+
+
+def format_event(message: dict) -> str:
+    """Formatera en händelse som Server-Sent Events.
+
+    Slutliga händelser skickas som "done", övriga som "progress".
+    """
+    name = "done" if message.get("event") in FINAL_EVENTS else "progress"
+    return f"event: {name}\ndata: {json.dumps(message)}\n\n"
+
+
+def event_stream(client: redis.Redis, task_id: str):
+    """
+    Generator med SSE-text för en task tills den är klar.
+
+    Kanalen prenumereras innan senaste händelsen läses, så att inget tappas
+    mellan dem. Mellan händelserna väntar generatorn i Redis utan att göra
+    något, bortsett från en kommentarrad var HEARTBEAT_INTERVAL sekund.
+    """
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(_channel(task_id))
+        yield f"retry: {RECONNECT_DELAY}\n\n"
+
+        last = client.get(_last_key(task_id))
+        if last:
+            message = json.loads(last)
+            yield format_event(message)
+            if message.get("event") in FINAL_EVENTS:
+                return
+
+        deadline = time.monotonic() + STREAM_MAX_DURATION
+        while time.monotonic() < deadline:
+            received = pubsub.get_message(timeout=HEARTBEAT_INTERVAL)
+            if received is None:
+                yield ": keepalive\n\n"
+                continue
+            message = json.loads(received["data"])
+            yield format_event(message)
+            if message.get("event") in FINAL_EVENTS:
+                return
+    except redis.RedisError as exc:
+        # Webbläsaren ansluter igen och faller tillbaka på polling vid 503
+        redis_failed(exc)
+    finally:
+        pubsub.close()
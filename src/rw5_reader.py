@@ -156,3 +156,111 @@ def json_to_rw5(json_data: dict):
     rw5_content += "\n".join(data["points"])
 
     return rw5_content
+
+
+def _is_header_line(line: str) -> bool:
+    return len(line) > 2 and line.startswith(("--", "MO", "BP", "LS"))
+
+
+def _is_point_line(line: str) -> bool:
+    return len(line) > 2 and (
+        line.startswith("--") or (line[0] == "G" and line[1].isdecimal())
+    )
+
+
+class Rw5Document:
+    """RW5-fil uppdelad i poster en gång.
+
+    Filen delas i segment som tillsammans återskapar originalet: headern
+    (JB med MO/BP/LS-rader), ett block per GPS-punkt (GPS med --/Gn-rader)
+    och övriga rader. Ett index från punktnummer till punktens block gör
+    att punkter kan hämtas och ändras utan att hela filen söks igenom.
+    """
+
+    def __init__(self, file_content: str):
+        self.segments = []
+        self._header = None
+        self._points = {}
+
+        lines = file_content.split("\n")
+        last = len(lines) - 1
+        i = 0
+        while i <= last:
+            line = lines[i]
+            point_id = None
+            if line.startswith("GPS,PN") and "," in line[6:]:
+                point_id = line[6:line.index(",", 6)]
+                end = self._block_end(lines, i, _is_point_line)
+            elif self._header is None and line.startswith("JB,") and len(line) > 3:
+                self._header = len(self.segments)
+                end = self._block_end(lines, i, _is_header_line)
+            else:
+                end = i + 1
+
+            if point_id:
+                self._points.setdefault(point_id, []).append(len(self.segments))
+            # Sista raden i filen har ingen radbrytning
+            self.segments.append(
+                "\n".join(lines[i:end]) + ("\n" if end <= last else "")
+            )
+            i = end
+
+    @staticmethod
+    def _block_end(lines: list, start: int, is_block_line) -> int:
+        end = start + 1
+        while end < len(lines) and is_block_line(lines[end]):
+            end += 1
+        return end
+
+    def __str__(self):
+        return "".join(self.segments)
+
+    @property
+    def header(self) -> str:
+        """Samma som get_rw5_header."""
+        return self.segments[self._header] if self._header is not None else ""
+
+    @property
+    def point_ids(self) -> list[str]:
+        return list(self._points)
+
+    def get_point(self, point_number) -> str:
+        """Sista blocket för punkten, samma som get_point."""
+        indexes = self._points.get(str(point_number))
+        return self.segments[indexes[-1]] if indexes else ""
+
+    def extract(self, point_numbers) -> "Rw5Document":
+        """Nytt dokument med sista blocket för varje punkt, i given ordning."""
+        document = Rw5Document("")
+        document.segments = []
+        for point_number in point_numbers:
+            segment = self.get_point(point_number)
+            if segment:
+                document._points.setdefault(str(point_number), []).append(len(document.segments))
+                document.segments.append(segment)
+        return document
+
+    def get_points(self, point_numbers) -> str:
+        """Sista blocket för varje punkt, i given ordning."""
+        return str(self.extract(point_numbers))
+
+    def change_point_id(self, amount: int, old_point_id: int = None):
+        """Ändrar ID på alla punkter, eller given punkt, med angiven summa."""
+        if old_point_id:
+            indexes = self._points.pop(str(old_point_id), [])
+            for index in indexes:
+                self.segments[index] = change_point_id(
+                    self.segments[index], amount, old_point_id
+                )
+            if indexes:
+                new_id = str(old_point_id + amount)
+                self._points[new_id] = sorted(self._points.get(new_id, []) + indexes)
+            return
+
+        self.segments = [
+            change_point_id(segment, amount) for segment in self.segments
+        ]
+        self._points = {
+            str(int(point_id) + amount) if point_id.isdecimal() else point_id: indexes
+            for point_id, indexes in self._points.items()
+        }
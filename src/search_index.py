@@ -0,0 +1,159 @@
+import heapq
+
+from cache import LRUCache
+from gitea import authorize_repo, fetch_tree
+
+# Senaste index per repo, hålls i processen eftersom det är stort att serialisera.
+_indexes = LRUCache(max_items=32)
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _is_hidden(path: str) -> bool:
+    return path.startswith(".")
+
+
+class TreeIndex:
+    """Trigramindex över fil- och mappnamn i ett repo-träd vid en viss commit.
+
+    Ändras inte efter att det byggts, så det kan delas mellan trådar.
+    """
+
+    def __init__(self, sha: str, tree: list):
+        self.sha = sha
+        self.entries = {}
+        self.names = {}
+        self.postings = {}
+        # Postningar som bara det här indexet använder och får ändra i
+        self._owned = set()
+        for item in tree:
+            if not _is_hidden(item["path"]):
+                self._add(item)
+        self._owned = None
+
+    def _posting(self, trigram: str) -> set:
+        """Postningen för trigram, kopierad först om den delas med ett annat index."""
+        paths = self.postings.get(trigram)
+        if paths is None:
+            paths = self.postings[trigram] = set()
+            self._owned.add(trigram)
+        elif trigram not in self._owned:
+            paths = self.postings[trigram] = set(paths)
+            self._owned.add(trigram)
+        return paths
+
+    def _add(self, item: dict):
+        path = item["path"]
+        name = path.rsplit("/", 1)[-1].lower()
+        self.entries[path] = item
+        self.names[path] = name
+        for trigram in _trigrams(name):
+            self._posting(trigram).add(path)
+
+    def _remove(self, path: str):
+        name = self.names.pop(path)
+        del self.entries[path]
+        for trigram in _trigrams(name):
+            paths = self._posting(trigram)
+            paths.discard(path)
+            if not paths:
+                del self.postings[trigram]
+
+    def updated(self, sha: str, tree: list) -> tuple["TreeIndex", int]:
+        """Nytt index för ett nytt träd, byggt utifrån skillnaden mot det här.
+
+        Det här indexet lämnas orört. Det nya delar alla postningar som
+        skillnaden inte rör och kopierar bara de som ändras. Returnerar (nytt
+        index, antalet poster som lagts till, tagits bort eller ändrats).
+        """
+        new_entries = {
+            item["path"]: item for item in tree if not _is_hidden(item["path"])
+        }
+        index = TreeIndex(sha, [])
+        index.entries = dict(self.entries)
+        index.names = dict(self.names)
+        index.postings = dict(self.postings)
+        index._owned = set()
+
+        removed = [path for path in index.entries if path not in new_entries]
+        for path in removed:
+            index._remove(path)
+
+        changed = 0
+        for path, item in new_entries.items():
+            old = index.entries.get(path)
+            if old is None:
+                index._add(item)
+                changed += 1
+            elif old["sha"] != item["sha"] or old["type"] != item["type"]:
+                # Samma namn, trigrammen behöver inte röras
+                index.entries[path] = item
+                changed += 1
+        index._owned = None
+        return index, len(removed) + changed
+
+    def _candidates(self, term: str):
+        if len(term) < 3:
+            return (path for path, name in self.names.items() if term in name)
+
+        postings = sorted(
+            (self.postings.get(trigram, set()) for trigram in _trigrams(term)),
+            key=len,
+        )
+        candidates = set(postings[0])
+        for paths in postings[1:]:
+            candidates &= paths
+            if not candidates:
+                break
+        return (path for path in candidates if term in self.names[path])
+
+    def search(self, term: str, page: int = 1, per_page: int = 100) -> tuple[list, int]:
+        """Sök i fil- och mappnamn.
+
+        Exakta träffar rankas före prefix-träffar och grunda sökvägar före djupa.
+        Returnerar (träffar på sidan, totalt antal träffar).
+        """
+        term = term.lower()
+        page = max(page, 1)
+
+        def rank(path):
+            name = self.names[path]
+            return (
+                0 if name == term else 1 if name.startswith(term) else 2,
+                path.count("/"),
+                len(name),
+                path,
+            )
+
+        matches = list(self._candidates(term))
+        # Sortera bara fram till den begärda sidan
+        ranked = heapq.nsmallest(page * per_page, matches, key=rank)
+        items = [
+            dict(self.entries[path])
+            for path in ranked[(page - 1) * per_page:]
+        ]
+        return items, len(matches)
+
+
+def get_tree_index(gitea, owner, repo_name, sha) -> TreeIndex:
+    """Returnera sökindexet för repot vid given commit.
+
+    Indexet delas mellan användare, så läsrätten kontrolleras med
+    användarens token varje gång. Om ett index för en äldre commit finns
+    byggs det nya utifrån skillnaden mot det nya trädet i stället för från
+    början, och ersätter det gamla i cachen.
+    """
+    authorize_repo(gitea, owner, repo_name)
+    index = _indexes.get((owner, repo_name))
+    if index is not None and index.sha == sha:
+        return index
+
+    tree = fetch_tree(gitea, owner, repo_name, sha)
+    if index is None:
+        index = TreeIndex(sha, tree)
+    else:
+        index, _ = index.updated(sha, tree)
+    _indexes.set((owner, repo_name), index)
+    return index
@@ -0,0 +1,130 @@
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, or_, select, update
+from sqlalchemy.orm import Session
+
+from config import artifact_dir, database_url
+from db import TaskTracker
+
+# Antal utgångna trackers som hanteras per transaktion.
+BATCH_SIZE = 200
+# Artefakter som ingen aktiv tracker pekar på tas bort efter så här många
+# sekunder, t.ex. GeoJSON-filer och resultat som aldrig hämtades.
+ORPHAN_MAX_AGE = 48 * 3600
+
+_engine = None
+
+
+def get_engine():
+    """Egen engine, Celery-workern har ingen Flask-app att låna från."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(database_url)
+    return _engine
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# Kolumner med artefakter som refereras relativt artefaktlagret
+RELATIVE_COLUMNS = (TaskTracker.geojson_id, TaskTracker.tiles_id)
+
+
+def _relative_path(artifact_id: str) -> str:
+    return os.path.join(artifact_dir, artifact_id)
+
+
+def _paths_in_use(session: Session, paths, now: datetime) -> set:
+    """Filer som en tracker som inte gått ut fortfarande pekar på."""
+    paths = set(paths)
+    in_use = set(session.scalars(
+        select(TaskTracker.file_path).where(
+            TaskTracker.file_path.in_(paths),
+            TaskTracker.expires_at >= now,
+        )
+    ))
+    relative = {os.path.relpath(path, artifact_dir): path for path in paths}
+    for column in RELATIVE_COLUMNS:
+        in_use.update(relative[artifact_id] for artifact_id in session.scalars(
+            select(column).where(column.in_(relative), TaskTracker.expires_at >= now)
+        ))
+    return in_use
+
+
+def sweep_expired_trackers(engine=None, now: datetime | None = None) -> dict:
+    """
+    Töm file_path, geojson_id och tiles_id för trackers som har gått ut och ta bort filerna.
+
+    Görs i omgångar om BATCH_SIZE så att databasen inte låses länge.
+    Artefakter delas mellan identiska resultat, så en fil tas bara bort
+    när ingen aktiv tracker använder den.
+    """
+    now = now or datetime.now()
+    stats = {"trackers": 0, "files": 0}
+    with Session(engine or get_engine()) as session:
+        while True:
+            expired = session.execute(
+                select(TaskTracker.id, TaskTracker.file_path, *RELATIVE_COLUMNS).where(
+                    TaskTracker.expires_at < now,
+                    or_(TaskTracker.file_path.isnot(None),
+                        *(column.isnot(None) for column in RELATIVE_COLUMNS)),
+                ).limit(BATCH_SIZE)
+            ).all()
+            if not expired:
+                break
+
+            paths = set()
+            for _, path, *artifact_ids in expired:
+                if path:
+                    paths.add(path)
+                paths.update(_relative_path(artifact_id) for artifact_id in artifact_ids if artifact_id)
+            for path in paths - _paths_in_use(session, paths, now):
+                stats["files"] += _remove(path)
+
+            session.execute(
+                update(TaskTracker)
+                .where(TaskTracker.id.in_([tracker_id for tracker_id, *_ in expired]))
+                .values(file_path=None, **{column.key: None for column in RELATIVE_COLUMNS})
+            )
+            session.commit()
+            stats["trackers"] += len(expired)
+            if len(expired) < BATCH_SIZE:
+                break
+    return stats
+
+
+def sweep_orphan_artifacts(engine=None, max_age: float = ORPHAN_MAX_AGE) -> int:
+    """Ta bort gamla artefakter och temporära filer som ingen tracker använder."""
+    cutoff = time.time() - max_age
+    candidates = []
+    for root, _, files in os.walk(artifact_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    candidates.append(path)
+            except FileNotFoundError:
+                continue
+    if not candidates:
+        return 0
+
+    removed = 0
+    with Session(engine or get_engine()) as session:
+        for start in range(0, len(candidates), BATCH_SIZE):
+            batch = candidates[start:start + BATCH_SIZE]
+            in_use = _paths_in_use(session, batch, datetime.now())
+            removed += sum(_remove(path) for path in batch if path not in in_use)
+    return removed
+
+
+def sweep(engine=None) -> dict:
+    stats = sweep_expired_trackers(engine)
+    stats["orphans"] = sweep_orphan_artifacts(engine)
+    return stats
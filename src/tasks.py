@@ -1,9 +1,10 @@
 import time
 
 from celery import Celery
-from requests_oauthlib import OAuth2Session
+from celery.signals import task_postrun, task_prerun
 
-from config import api_base_url, celery_broker_url, celery_result_backend, client_id
+from coalesce import forget
+from config import api_base_url, celery_broker_url, celery_result_backend, sweep_interval
 from fastighet.tasks import download_and_create_dxf
 from hojd.tasks import download_and_create_hojd
 from gitea import (
@@ -12,7 +13,14 @@ from gitea import (
     append_file,
     create_file,
     fetch_file_content,
+    fetch_file_info,
+    get_gitea,
+    invalidate_repo,
+    pool_stats,
+    post_contents,
 )
+from progress import finish, report, start
+from sweeper import sweep
 
 celery = Celery(
     "tasks",
@@ -20,6 +28,29 @@ celery = Celery(
     backend=celery_result_backend,
     broker_connection_retry_on_startup=True,
 )
+# Städningen körs av Celery beat, inte i anropen från webbläsaren
+celery.conf.beat_schedule = {
+    "sweep-expired-files": {
+        "task": "tasks.sweep_expired_files",
+        "schedule": sweep_interval,
+    },
+}
+
+
+@task_prerun.connect
+def _start_progress(task_id=None, **kwargs):
+    start(task_id)
+
+
+@task_postrun.connect
+def _finish_progress(task_id=None, state=None, **kwargs):
+    # Skickas efter att resultatet sparats, så klienten kan hämta det direkt
+    finish(task_id, state)
+    if state in ("FAILURE", "REVOKED"):
+        # Nästa identiska beställning ska försöka igen, inte få felet. Vid
+        # RETRY körs jobbet fortfarande och ska inte startas en gång till.
+        forget(task_id)
+
 
 celery.task(bind=True, name="fastighet.routes.download_and_create_dxf")(download_and_create_dxf)
 celery.task(bind=True, name="hojd.routes.download_and_create_hojd")(download_and_create_hojd)
@@ -33,12 +64,24 @@ def add(self, x, y):
     return result
 
 
+@celery.task(name="tasks.gitea_pool_stats")
+def gitea_pool_stats():
+    """Statistik för anslutningspoolen mot Gitea i workerprocessen som kör jobbet."""
+    return pool_stats()
+
+
+@celery.task(name="tasks.sweep_expired_files")
+def sweep_expired_files():
+    """Ta bort utgångna filer och töm deras trackers."""
+    stats = sweep()
+    print(f"Städning: {stats}")
+    return stats
+
+
 @celery.task
 def fetch_repo_contents(self, owner, repo_name, path, token):
-    from requests_oauthlib import OAuth2Session
-
     # Initiera en session med OAuth
-    gitea = OAuth2Session(client_id=client_id, token=token)
+    gitea = get_gitea(token)
     api_url = f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}"
 
     response = gitea.get(api_url)
@@ -52,17 +95,13 @@ def fetch_repo_contents(self, owner, repo_name, path, token):
 @celery.task(bind=True, name="tasks.edit_file_task")
 def edit_file_task(self, repo_name, path, newPath, owner, newContent, action, projCRS, oauth_token):
     updated_files = []
-    gitea = OAuth2Session(client_id, token=oauth_token)
+    gitea = get_gitea(oauth_token)
 
     returnMSG = "Ett fel har uppstått."
 
     try:
-        # Fetch the current file content and SHA
-        response = gitea.get(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}")
-        response.raise_for_status()
-        file_data = response.json()
-        sha = file_data["sha"]
+        # Fetch the current file SHA, the content is cached for the later steps
+        sha = fetch_file_info(gitea, owner, repo_name, path)["sha"]
     except Exception as e:
         return {"status": "failed", "message": str(e)}
 
@@ -105,14 +144,8 @@ def edit_file_task(self, repo_name, path, newPath, owner, newContent, action, pr
         fromRw5Content = fromRw5Content.decode("utf-8", errors="ignore")
         toRw5Path = newPath.replace(".crd", ".rw5")
         try:
-            response = gitea.get(
-                f"{api_base_url}/repos/{owner}/{repo_name}/contents/{newPath}")
-            response.raise_for_status()
-            toCRDfile = response.json()
-            response = gitea.get(
-                f"{api_base_url}/repos/{owner}/{repo_name}/contents/{toRw5Path}")
-            response.raise_for_status()
-            toRw5file = response.json()
+            toCRDfile = fetch_file_info(gitea, owner, repo_name, newPath)
+            toRw5file = fetch_file_info(gitea, owner, repo_name, toRw5Path)
         except Exception as e:
             return {"status": "failed", "message": str(e)}
 
@@ -136,10 +169,11 @@ def edit_file_task(self, repo_name, path, newPath, owner, newContent, action, pr
     }
 
     try:
-        commit_response = gitea.post(
-            f"{api_base_url}/repos/{owner}/{repo_name}/contents", json=commit_data)
+        commit_response = post_contents(gitea, owner, repo_name, commit_data)
         commit_response.raise_for_status()
+        invalidate_repo(owner, repo_name, commit_data["branch"])
     except Exception as e:
         return {"status": "failed", "message": str(e)}
 
+    report("commit", message=returnMSG)
     return {"status": "success", "message": returnMSG}
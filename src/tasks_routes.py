@@ -1,12 +1,43 @@
-from flask import Blueprint, jsonify, request, url_for
+from flask import (
+    Blueprint,
+    Response,
+    jsonify,
+    request,
+    session,
+    stream_with_context,
+    url_for,
+)
 
+from cache import get_redis
+from config import login_required
+from db import TaskTracker
+from progress import event_stream, format_event
 from tasks import (
     add,
+    celery,
     edit_file_task,
 )
 
 tasks_routes = Blueprint("tasks", __name__)
 
+# Antal taskar utan TaskTracker, t.ex. filredigeringar, som sparas i sessionen
+SESSION_TASKS = 20
+
+
+def remember_task(task_id: str):
+    """Koppla en task som saknar TaskTracker till den inloggade användaren."""
+    session["tasks"] = (session.get("tasks", []) + [task_id])[-SESSION_TASKS:]
+
+
+def _owns_task(task_id: str) -> bool:
+    """Tasken startades av den inloggade användaren."""
+    if task_id in session.get("tasks", []):
+        return True
+    tracker = TaskTracker.query.filter_by(
+        user_email=session["user"]["email"], task_id=task_id
+    ).first()
+    return tracker is not None
+
 
 @tasks_routes.route("/start-task", methods=["GET"])
 def start_task():
@@ -76,3 +107,37 @@ def task_status(task_id):
             'message': task.info.get('message', ''),
         }
     return jsonify(response)
+
+
+@tasks_routes.route('/events/<task_id>')
+@login_required
+def task_events(task_id):
+    """
+    Förlopp för en task som Server-Sent Events.
+
+    Händelserna kommer från tasken via Redis pub/sub. Klienten hämtar
+    resultatet från sin status-endpoint först när "done" har kommit.
+    Utan Redis svarar vi 503 så att klienten faller tillbaka på polling.
+    Varje ström håller en tråd, så bara användarens egna taskar kan följas
+    och okända id:n får 404.
+    """
+    if not _owns_task(task_id):
+        return jsonify({"error": "Okänd task"}), 404
+
+    client = get_redis()
+    if client is None:
+        return jsonify({"error": "Förlopp är inte tillgängligt"}), 503
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    # Kontrollera en gång om tasken redan var klar innan förloppet sparades
+    state = celery.AsyncResult(task_id).state
+    if state in ("SUCCESS", "FAILURE", "REVOKED"):
+        message = {"event": "done" if state == "SUCCESS" else "failed", "state": state}
+        return Response(format_event(message),
+                        mimetype="text/event-stream", headers=headers)
+
+    return Response(
+        stream_with_context(event_stream(client, task_id)),
+        mimetype="text/event-stream",
+        headers=headers,
+    )
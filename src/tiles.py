@@ -0,0 +1,239 @@
+import gzip
+import json
+import math
+import struct
+
+import numpy as np
+
+from artifacts import artifact_path, store_file, temp_path
+from bbox import get_transformer, transform_bounds
+from cache import LRUCache
+from geojson_writer import transform_geometry
+from geometry import douglas_peucker_ranks, geometry_bounds
+
+# Zoomnivåer i pyramiden. Rutor med lägre zoom får den grövsta nivån och
+# med högre zoom den mest detaljerade, som OpenLayers då förstorar.
+TILE_MIN_ZOOM = 8
+TILE_MAX_ZOOM = 18
+TILE_SIZE = 256
+# Hur långt en förenklad linje får avvika, i pixlar på skärmen
+PIXEL_TOLERANCE = 0.5
+# Halva jordens omkrets i EPSG:3857, rutnätet går från -HALF till HALF
+HALF_WORLD = math.pi * 6378137
+# Nivåer som hålls i minnet i webbprocessen
+PYRAMID_CACHE_BYTES = 64 * 1024 * 1024
+# Längden på indexet sist i pyramidfilen
+_INDEX_LENGTH = struct.Struct("<Q")
+
+_pyramids = LRUCache(max_items=256)
+_levels = LRUCache(max_items=256, max_bytes=PYRAMID_CACHE_BYTES)
+
+
+def resolution(zoom: int) -> float:
+    """Meter per pixel i EPSG:3857 på en zoomnivå."""
+    return 2 * HALF_WORLD / TILE_SIZE / 2 ** zoom
+
+
+def _precision(zoom: int) -> int:
+    """Decimaler som behövs för en tiondels pixel."""
+    return max(0, math.ceil(-math.log10(resolution(zoom) / 10)))
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """(minx, miny, maxx, maxy) i EPSG:3857 för en XYZ-ruta."""
+    span = 2 * HALF_WORLD / 2 ** z
+    minx = -HALF_WORLD + x * span
+    maxy = HALF_WORLD - y * span
+    return minx, maxy - span, minx + span, maxy
+
+
+class _Line:
+    """En linje eller ring med Douglas-Peucker-rang för varje punkt."""
+
+    def __init__(self, coords: list, min_points: int):
+        self.points = np.asarray(coords, dtype=float)
+        if len(self.points) > min_points:
+            ranks = douglas_peucker_ranks(self.points[:, :2])
+        else:
+            ranks = np.full(len(self.points), np.inf)
+        self.ranks = ranks
+        # Punkterna med högst rang behålls alltid, så att en ring förblir en ring
+        self.always = np.argsort(-ranks, kind="stable")[:min_points]
+
+    def simplify(self, tolerance: float, precision: int) -> list:
+        keep = self.ranks > tolerance
+        keep[self.always] = True
+        return self.points[keep].round(precision).tolist()
+
+
+def _prepare(geom_type: str, coords: list):
+    """Linjerna i en geometri, med samma nästling som koordinaterna."""
+    if geom_type == "LineString":
+        return _Line(coords, 2)
+    if geom_type == "MultiLineString":
+        return [_Line(line, 2) for line in coords]
+    if geom_type == "Polygon":
+        return [_Line(ring, 4) for ring in coords]
+    if geom_type == "MultiPolygon":
+        return [[_Line(ring, 4) for ring in polygon] for polygon in coords]
+    # Punkter förenklas inte
+    return np.asarray(coords, dtype=float)
+
+
+def _simplify(lines, tolerance: float, precision: int):
+    if isinstance(lines, _Line):
+        return lines.simplify(tolerance, precision)
+    if isinstance(lines, np.ndarray):
+        return lines.round(precision).tolist()
+    return [_simplify(part, tolerance, precision) for part in lines]
+
+
+def build_pyramid(features: list, source_crs: str, swap_axes: bool = False) -> dict:
+    """
+    Förenklade geometrier i EPSG:3857 för varje zoomnivå, till kartans förhandsvisning.
+
+    Varje linje rangordnas med Douglas-Peucker en gång och skärs sedan till
+    en halv pixels avvikelse på varje nivå. Features behåller bara id och
+    geometri, och får en bbox så att en ruta kan väljas ut utan att titta på
+    koordinaterna. Med swap_axes
+    kastas axlarna om före projiceringen, t.ex. för Lantmäteriets (N, E).
+    """
+    transformer = get_transformer(source_crs, "EPSG:3857")
+    prepared = []
+    for feature in features:
+        geometry = transform_geometry(
+            feature.get("geometry"), swap_axes, project=transformer.transform
+        )
+        bounds = geometry_bounds(geometry) if geometry else None
+        if bounds is None or not all(map(math.isfinite, bounds)):
+            continue
+        try:
+            lines = _prepare(geometry["type"], geometry["coordinates"])
+        except ValueError:
+            # Punkter med olika antal dimensioner i samma linje
+            continue
+        # Kartan ritar bara geometrierna, attributen finns i GeoJSON-filen
+        base = {"type": "Feature", "properties": {}}
+        if feature.get("id") is not None:
+            base["id"] = feature["id"]
+        base["bbox"] = [round(value, _precision(TILE_MAX_ZOOM)) for value in bounds]
+        prepared.append((base, geometry["type"], lines))
+
+    bounds = None
+    if prepared:
+        boxes = np.array([base["bbox"] for base, _, _ in prepared])
+        bounds = [*boxes[:, :2].min(axis=0).tolist(), *boxes[:, 2:].max(axis=0).tolist()]
+
+    levels = []
+    for zoom in range(TILE_MIN_ZOOM, TILE_MAX_ZOOM + 1):
+        tolerance = resolution(zoom) * PIXEL_TOLERANCE
+        precision = _precision(zoom)
+        levels.append([
+            {**base, "geometry": {
+                "type": geom_type,
+                "coordinates": _simplify(lines, tolerance, precision),
+            }}
+            for base, geom_type, lines in prepared
+        ])
+    return {
+        "min_zoom": TILE_MIN_ZOOM,
+        "max_zoom": TILE_MAX_ZOOM,
+        "bounds": bounds,
+        "levels": levels,
+    }
+
+
+def store_pyramid(pyramid: dict) -> dict:
+    """
+    Spara en pyramid från build_pyramid som en artefakt.
+
+    Varje nivå skrivs som en egen gzip-komprimerad JSON-lista, följd av ett
+    index med var nivåerna ligger och sist indexets längd. En ruta behöver
+    då bara läsa och tolka sin egen nivå.
+    """
+    path = temp_path(suffix=".tiles")
+    with open(path, "wb") as f:
+        levels = []
+        for features in pyramid["levels"]:
+            start = f.tell()
+            f.write(gzip.compress(
+                json.dumps(features, separators=(",", ":")).encode("utf-8"), mtime=0
+            ))
+            levels.append([start, f.tell() - start])
+        index = json.dumps({
+            "min_zoom": pyramid["min_zoom"],
+            "max_zoom": pyramid["max_zoom"],
+            "bounds": pyramid["bounds"],
+            "levels": levels,
+        }, separators=(",", ":")).encode("utf-8")
+        f.write(index)
+        f.write(_INDEX_LENGTH.pack(len(index)))
+    return store_file(path, "application/octet-stream")
+
+
+def load_pyramid(tiles_id: str) -> dict:
+    """Indexet för en pyramid i artefaktlagret, cachat i processen."""
+    pyramid = _pyramids.get(tiles_id)
+    if pyramid is None:
+        with open(artifact_path({"path": tiles_id}), "rb") as f:
+            f.seek(-_INDEX_LENGTH.size, 2)
+            (length,) = _INDEX_LENGTH.unpack(f.read(_INDEX_LENGTH.size))
+            f.seek(-_INDEX_LENGTH.size - length, 2)
+            pyramid = json.loads(f.read(length))
+        pyramid["id"] = tiles_id
+        _pyramids.set(tiles_id, pyramid)
+    return pyramid
+
+
+def load_level(pyramid: dict, level: int) -> tuple[list, np.ndarray]:
+    """Features på en nivå och deras bbox som array, cachade i processen."""
+    key = (pyramid["id"], level)
+    cached = _levels.get(key)
+    if cached is None:
+        start, length = pyramid["levels"][level]
+        with open(artifact_path({"path": pyramid["id"]}), "rb") as f:
+            f.seek(start)
+            raw = gzip.decompress(f.read(length))
+        features = json.loads(raw)
+        cached = (features, np.array([f["bbox"] for f in features], dtype=float).reshape(-1, 4))
+        # Uppskattning, tolkad JSON tar några gånger mer plats än texten
+        _levels.set(key, cached, size=len(raw) * 4)
+    return cached
+
+
+def select_tile(pyramid: dict, z: int, x: int, y: int) -> dict:
+    """FeatureCollection med de features som skär rutan. ValueError för ogiltig ruta."""
+    if not (0 <= z <= 30 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError("Ogiltig ruta")
+    level = min(max(z, pyramid["min_zoom"]), pyramid["max_zoom"]) - pyramid["min_zoom"]
+    features, bounds = load_level(pyramid, level)
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    hits = (
+        (bounds[:, 0] <= maxx) & (bounds[:, 2] >= minx)
+        & (bounds[:, 1] <= maxy) & (bounds[:, 3] >= miny)
+    )
+    return {
+        "type": "FeatureCollection",
+        "features": [features[index] for index in np.flatnonzero(hits).tolist()],
+    }
+
+
+def tilejson(tiles_id: str, url: str) -> dict:
+    """
+    Beskrivning av pyramiden enligt TileJSON, med rutorna under url/{z}/{x}/{y}.
+
+    bounds är i WGS84 som standarden kräver, så att kartan bara hämtar rutor
+    där det finns något.
+
+    :raises FileNotFoundError: Om pyramiden har städats bort
+    """
+    pyramid = load_pyramid(tiles_id)
+    info = {
+        "tilejson": "3.0.0",
+        "tiles": [url.rstrip("/") + "/{z}/{x}/{y}"],
+        "minzoom": 0,
+        "maxzoom": pyramid["max_zoom"],
+    }
+    if pyramid["bounds"]:
+        info["bounds"] = list(transform_bounds(pyramid["bounds"], "EPSG:3857", "EPSG:4326"))
+    return info
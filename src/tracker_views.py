@@ -0,0 +1,102 @@
+"""Svar med resultaten för en TaskTracker, gemensamma för fastighet och hojd."""
+from datetime import datetime
+
+from flask import Response, jsonify, request, send_file
+
+from artifacts import artifact_path, is_gzipped, read_artifact_json, read_bytes
+from db import TaskTracker
+from geometry import parse_bbox, select_features
+from tiles import load_pyramid, select_tile, tilejson
+
+
+def send_artifact(manifest: dict, mimetype: str | None = None):
+    """Svara med en artefakt.
+
+    En gzip-komprimerad artefakt skickas som den ligger, med
+    Content-Encoding, till klienter som accepterar gzip. Övriga får den
+    uppackad.
+    """
+    mimetype = mimetype or manifest.get("content_type")
+    if not is_gzipped(manifest):
+        return send_file(artifact_path(manifest), mimetype=mimetype, conditional=True)
+    if "gzip" not in request.accept_encodings:
+        response = Response(read_bytes(manifest), mimetype=mimetype)
+    else:
+        response = send_file(artifact_path(manifest), mimetype=mimetype, conditional=True)
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def active_tracker(task_id: str, column: str) -> TaskTracker | None:
+    """Trackern för task_id om den inte har gått ut och column är satt."""
+    tracker = TaskTracker.query.filter_by(task_id=task_id).first()
+    if (not tracker or not getattr(tracker, column)
+            or tracker.expires_at < datetime.now()):
+        return None
+    return tracker
+
+
+def tracker_geojson(task_id: str):
+    """
+    GeoJSON för en tracker, hämtas bara när kartan behöver den.
+
+    Med bbox (minx,miny,maxx,maxy i GeoJSON-filens koordinater) returneras
+    bara de features som skär den, och med tolerance förenklas de med
+    Douglas-Peucker. Utan parametrar skickas den komprimerade filen som den är.
+    """
+    tracker = active_tracker(task_id, "geojson_id")
+    if not tracker:
+        return jsonify({"error": "GeoJSON not found or expired"}), 404
+
+    try:
+        bbox = parse_bbox(request.args["bbox"]) if request.args.get("bbox") else None
+        tolerance = float(request.args.get("tolerance", 0))
+        if tolerance < 0:
+            raise ValueError("tolerance får inte vara negativ")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    manifest = {"path": tracker.geojson_id}
+    if bbox is None and not tolerance:
+        return send_artifact(manifest, "application/geo+json")
+
+    geojson = select_features(read_artifact_json(manifest), bbox, tolerance)
+    return jsonify(geojson)
+
+
+def tracker_tilejson(task_id: str):
+    """TileJSON för rutorna med en trackers förenklade geometrier."""
+    tracker = active_tracker(task_id, "tiles_id")
+    if not tracker:
+        return jsonify({"error": "Tiles not found or expired"}), 404
+
+    try:
+        return jsonify(tilejson(tracker.tiles_id, request.path))
+    except FileNotFoundError:
+        return jsonify({"error": "Tiles not found or expired"}), 404
+
+
+def tracker_tile(task_id: str, z: int, x: int, y: int):
+    """
+    En XYZ-ruta med de features som skär den, som GeoJSON i EPSG:3857.
+
+    Innehållet ändras aldrig för en pyramid, så webbläsaren får cacha rutan
+    och fråga med ETag.
+    """
+    tracker = active_tracker(task_id, "tiles_id")
+    if not tracker:
+        return jsonify({"error": "Tiles not found or expired"}), 404
+
+    try:
+        tile = select_tile(load_pyramid(tracker.tiles_id), z, x, y)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({"error": "Tiles not found or expired"}), 404
+
+    response = jsonify(tile)
+    response.set_etag(f"{tracker.tiles_id}/{z}/{x}/{y}")
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response.make_conditional(request)
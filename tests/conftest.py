@@ -3,6 +3,16 @@ from unittest.mock import Mock, patch
 import pytest
 
 from src.app import app
+from src.cache import LRUCache
+
+
+@pytest.fixture(autouse=True)
+def isolated_coalesce():
+    """Samordnade jobb får inte följa med mellan testerna, och inte heller
+    komma från en Redis med jobb från en tidigare körning."""
+    with patch("coalesce.get_redis", return_value=None), \
+            patch("coalesce._local", LRUCache(max_items=1024)):
+        yield
 
 
 @pytest.fixture
@@ -20,5 +30,5 @@ def oauth_token(test_app):
 
 @pytest.fixture
 def oauth2session(test_app, oauth_token):
-    with patch("src.app.OAuth2Session", new=Mock()) as mock:
+    with patch("src.app.get_gitea", new=Mock()) as mock:
         yield mock
@@ -22,7 +22,6 @@ def client():
 def test_api_download_success(mock_send_task, mock_validate, client):
     # Setup mockar
     mock_validate.return_value = True
-    mock_send_task.return_value.id = "mock-task-id"
 
     # Setup testdata
     bbox = "12.0,55.0,12.01,55.001"
@@ -36,11 +35,12 @@ def test_api_download_success(mock_send_task, mock_validate, client):
     assert_successful_response(response, 202)
     data = response.get_json()
     assert "task_id" in data
-    assert data["task_id"] == "mock-task-id"
+    # Task-id skapas i förväg så att identiska beställningar kan samordnas
+    assert data["task_id"] == mock_send_task.call_args.kwargs["task_id"]
 
     # Kontrollera att celery-mocken anropades med rätt bbox
     mock_send_task.assert_called_once_with(
-        "fastighet.routes.download_and_create_dxf", args=[bbox])
+        "fastighet.routes.download_and_create_dxf", args=[bbox], task_id=data["task_id"])
 
 
 @patch("fastighet.routes.validate_license_and_email")
@@ -48,7 +48,6 @@ def test_api_download_success(mock_send_task, mock_validate, client):
 def test_api_download_success_get(mock_send_task, mock_validate, client):
     # Setup mockar
     mock_validate.return_value = True
-    mock_send_task.return_value.id = "mock-task-id"
 
     # Setup testdata
     bbox = "12.0,55.0,12.01,55.001"
@@ -62,9 +61,10 @@ def test_api_download_success_get(mock_send_task, mock_validate, client):
     assert_successful_response(response, 202)
     data = response.get_json()
     assert "task_id" in data
-    assert data["task_id"] == "mock-task-id"
+    # Task-id skapas i förväg så att identiska beställningar kan samordnas
+    assert data["task_id"] == mock_send_task.call_args.kwargs["task_id"]
 
     # Kontrollera att celery-mocken anropades med rätt bbox
     mock_send_task.assert_called_once_with(
-        "fastighet.routes.download_and_create_dxf", args=[bbox]
+        "fastighet.routes.download_and_create_dxf", args=[bbox], task_id=data["task_id"]
     )
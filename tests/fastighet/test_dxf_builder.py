@@ -0,0 +1,108 @@
+import io
+
+import ezdxf
+import numpy as np
+
+from src.fastighet.dxf_builder import (
+    LAYER_BOUNDARY,
+    LAYER_HOLE,
+    LAYER_LABEL,
+    XDATA_APPID,
+    build_dxf,
+    designation,
+    flatten_rings,
+)
+
+
+def _square(north, east, size):
+    return [
+        [north, east],
+        [north, east + size],
+        [north + size, east + size],
+        [north + size, east],
+        [north, east],
+    ]
+
+
+def _feature(geometry, **properties):
+    return {"type": "Feature", "geometry": geometry, "properties": properties}
+
+
+def _reload(doc):
+    stream = io.StringIO()
+    doc.write(stream)
+    return ezdxf.read(io.StringIO(stream.getvalue()))
+
+
+def test_flatten_rings_swaps_axes_and_skips_invalid():
+    features = [
+        _feature({"type": "Polygon", "coordinates": [_square(100, 200, 10)]}),
+        _feature({"type": "Polygon", "coordinates": [[[1, 2], [3, 4], [1, 2]]]}),
+        _feature({"type": "Point", "coordinates": [1, 2]}),
+        _feature(None),
+    ]
+
+    rings = flatten_rings(features)
+
+    assert len(rings) == 1
+    # (N, E) -> (E, N) och den avslutande punkten tas bort
+    assert rings.coords.tolist() == [[200, 100], [210, 100], [210, 110], [200, 110]]
+    assert rings.feature.tolist() == [0]
+
+
+def test_area_centroids():
+    rings = flatten_rings([
+        _feature({"type": "Polygon", "coordinates": [_square(0, 0, 10), _square(2, 2, 2)]}),
+    ])
+
+    area, centroids = rings.area_centroids()
+
+    assert rings.hole.tolist() == [False, True]
+    np.testing.assert_allclose(area, [100, 4])
+    np.testing.assert_allclose(centroids, [[5, 5], [3, 3]])
+
+
+def test_build_dxf_multipolygon_holes_and_attributes():
+    features = [
+        _feature(
+            {"type": "MultiPolygon", "coordinates": [
+                [_square(0, 0, 10), _square(2, 2, 2)],
+                [_square(50, 50, 2)],
+            ]},
+            trakt="ATTLERED", etikett="1:7", objektidentitet="abc-123",
+        ),
+    ]
+
+    doc = _reload(build_dxf(features))
+    msp = doc.modelspace()
+
+    polylines = msp.query("LWPOLYLINE")
+    assert [p.dxf.layer for p in polylines] == [LAYER_BOUNDARY, LAYER_HOLE, LAYER_BOUNDARY]
+    assert all(p.closed for p in polylines)
+    assert [tuple(v) for v in polylines[2].get_points("xy")] == [
+        (50, 50), (52, 50), (52, 52), (50, 52),
+    ]
+    assert polylines[0].get_xdata(XDATA_APPID) == [
+        (1000, "ATTLERED 1:7"), (1000, "abc-123"),
+    ]
+
+    # Beteckningen placeras i den största ytan
+    texts = msp.query("TEXT")
+    assert len(texts) == 1
+    assert texts[0].dxf.text == "ATTLERED 1:7"
+    assert texts[0].dxf.layer == LAYER_LABEL
+    assert tuple(texts[0].dxf.align_point)[:2] == (5, 5)
+
+
+def test_build_dxf_without_labels():
+    features = [_feature({"type": "Polygon", "coordinates": [_square(0, 0, 10)]}, etikett="1:1")]
+    msp = build_dxf(features, labels=False).modelspace()
+    assert len(msp.query("TEXT")) == 0
+    assert len(build_dxf([]).modelspace()) == 0
+
+
+def test_designation():
+    assert designation({"trakt": "ATTLERED", "etikett": "1:7"}) == "ATTLERED 1:7"
+    assert designation({"trakt": "ATTLERED", "block": "2", "enhet": 3}) == "ATTLERED 2:3"
+    assert designation({"etikett": "S:1"}) == "S:1"
+    assert designation({}) == ""
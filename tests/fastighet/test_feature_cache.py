@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+import pytest
+
+import src.fastighet.feature_cache as feature_cache
+from src.cache import LRUCache
+from src.fastighet.feature_cache import (
+    fetch_features,
+    sweref_bounds,
+    tiles_for,
+    wgs84_bbox,
+)
+
+BBOX = "14.1007251130,56.4312900880,14.1167298421,56.4403897576"
+
+
+def parcel(feature_id, east, north, size=20):
+    """Kvadratisk yta med koordinater [N, E] som från Lantmäteriet."""
+    ring = [
+        [north, east],
+        [north, east + size],
+        [north + size, east + size],
+        [north + size, east],
+        [north, east],
+    ]
+    return {"id": feature_id, "geometry": {"type": "Polygon", "coordinates": [ring]}}
+
+
+@pytest.fixture
+def tile_cache():
+    with patch.object(feature_cache, "_tile_cache", LRUCache()) as cache:
+        yield cache
+
+
+def test_tiles_cover_bbox():
+    bounds = sweref_bounds(BBOX)
+    tiles = tiles_for(bounds)
+    # Ungefär 1x1 km ger 2-3 rutor i varje led
+    assert 4 <= len(tiles) <= 9
+
+    minx, miny, maxx, maxy = map(float, wgs84_bbox(bounds).split(","))
+    assert minx <= 14.1007251130 and maxx >= 14.1167298421
+    assert miny <= 56.4312900880 and maxy >= 56.4403897576
+
+
+def test_cached_tiles_are_not_fetched_again(tile_cache):
+    minx, miny, maxx, maxy = sweref_bounds(BBOX)
+    inside = parcel("a", minx + 100, miny + 100)
+    # Ligger över en rutgräns och hamnar därför i flera rutor
+    on_edge = parcel("b", 500 * round(minx / 500 + 1) - 10, miny + 100)
+    outside = parcel("c", maxx + 2000, maxy + 2000)
+
+    with patch.object(
+        feature_cache, "fetch_property_data", return_value=[inside, on_edge, outside]
+    ) as fetch:
+        first = fetch_features(BBOX)
+        second = fetch_features(BBOX)
+
+    assert sorted(f["id"] for f in first) == ["a", "b"]
+    assert sorted(f["id"] for f in second) == ["a", "b"]
+    fetch.assert_called_once()
@@ -0,0 +1,101 @@
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from src.fastighet.lm import LANTMATERIET_API_URL, PAGE_WINDOW, iter_property_features
+
+
+@pytest.fixture(autouse=True)
+def no_token_or_redis():
+    with patch("lantmateriet.get_redis", return_value=None), patch(
+        "lantmateriet.get_token", return_value="token"
+    ):
+        yield
+
+
+def features(start, stop):
+    return [{"id": str(i), "type": "Feature"} for i in range(start, stop)]
+
+
+def test_pages_fetched_by_number_matched(requests_mock):
+    def page(request, context):
+        query = parse_qs(urlsplit(request.url).query)
+        offset = int(query["offset"][0])
+        # Servern begränsar sidstorleken till 100
+        limit = min(int(query["limit"][0]), 100)
+        return {
+            "features": features(offset, min(offset + limit, 250)),
+            "numberMatched": 250,
+        }
+
+    requests_mock.get(LANTMATERIET_API_URL, json=page)
+
+    result = list(iter_property_features("0,0,1,1"))
+
+    assert [f["id"] for f in result] == [str(i) for i in range(250)]
+    assert requests_mock.call_count == 3
+    offsets = sorted(
+        int(parse_qs(urlsplit(r.url).query)["offset"][0])
+        for r in requests_mock.request_history
+    )
+    assert offsets == [0, 100, 200]
+
+
+def test_pages_follow_next_links(requests_mock):
+    next_url = "https://api.lantmateriet.se/next-page"
+    requests_mock.get(
+        LANTMATERIET_API_URL,
+        json={"features": features(0, 2), "links": [{"rel": "next", "href": next_url}]},
+    )
+    requests_mock.get(next_url, json={"features": features(2, 3), "links": []})
+
+    result = list(iter_property_features("0,0,1,1"))
+    assert [f["id"] for f in result] == ["0", "1", "2"]
+
+
+def test_limit_falls_back_when_rejected(requests_mock):
+    def page(request, context):
+        query = parse_qs(urlsplit(request.url).query)
+        if int(query["limit"][0]) > 100:
+            context.status_code = 400
+            return {}
+        return {"features": features(0, 5), "numberMatched": 5}
+
+    requests_mock.get(LANTMATERIET_API_URL, json=page)
+
+    assert len(list(iter_property_features("0,0,1,1"))) == 5
+
+
+def test_pages_without_count_or_links_use_server_page_size(requests_mock):
+    def page(request, context):
+        query = parse_qs(urlsplit(request.url).query)
+        offset = int(query["offset"][0])
+        # limit=1000 accepteras men servern ger högst 100 per sida
+        limit = min(int(query["limit"][0]), 100)
+        return {"features": features(offset, min(offset + limit, 250))}
+
+    requests_mock.get(LANTMATERIET_API_URL, json=page)
+
+    result = list(iter_property_features("0,0,1,1"))
+    assert [f["id"] for f in result] == [str(i) for i in range(250)]
+    assert requests_mock.call_count == 3
+
+
+def test_pages_fetched_within_window(requests_mock):
+    requested = []
+
+    def page(request, context):
+        query = parse_qs(urlsplit(request.url).query)
+        offset = int(query["offset"][0])
+        requested.append(offset)
+        return {"features": features(offset, min(offset + 100, 5000)), "numberMatched": 5000}
+
+    requests_mock.get(LANTMATERIET_API_URL, json=page)
+
+    stream = iter_property_features("0,0,1,1")
+    assert [next(stream)["id"] for _ in range(101)][-1] == "100"
+    # Första sidan, och som mest PAGE_WINDOW sidor till i förväg
+    assert len(requested) <= 1 + PAGE_WINDOW + 1
+    stream.close()
+    assert len(requested) < 50
@@ -1,12 +1,19 @@
-import io
+import base64
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, Mock, patch
 
 import ezdxf
 
+from src.artifacts import store_json
 from src.fastighet.routes import validate_license_and_email
-from src.fastighet.tasks import create_dxf
+from src.fastighet.tasks import create_dxf, download_and_create_dxf
+from src.tiles import build_pyramid, store_pyramid
 
 
-def test_create_dxf():
+def test_create_dxf(tmp_path):
     # Testdata
     test_data = {
         "type": "FeatureCollection",
@@ -47,24 +54,24 @@ def test_create_dxf():
         ]
     }
 
-    # Kör funktionen
-    dxf_data = create_dxf(test_data.get("features", []))
-
-    # Kontrollera att resultatet är en bytes-ström
-    assert isinstance(dxf_data, str)
+    # Kör funktionen, DXF-filen sparas för manuell inspektion
+    output = "/workspace/tests/output/test_output.dxf"
+    assert create_dxf(test_data.get("features", []), output) == output
 
     # Kontrollera att DXF-filen kan öppnas och läsas av ezdxf
-    dxf_stream = io.StringIO(dxf_data)
-    doc = ezdxf.read(dxf_stream)
+    doc = ezdxf.readfile(output)
 
     # Kontrollera att filen innehåller minst en LWPOLYLINE
     msp = doc.modelspace()
     lwpolylines = list(msp.query("LWPOLYLINE"))
     assert len(lwpolylines) > 0
 
-    # Spara DXF-filen för manuell inspektion
-    with open("/workspace/tests/output/test_output.dxf", "w") as f:
-        f.write(dxf_data)
+    # Samma ritning som binär DXF
+    binary = tmp_path / "binary.dxf"
+    create_dxf(test_data.get("features", []), str(binary), binary=True)
+    assert binary.read_bytes().startswith(b"AutoCAD Binary DXF")
+    assert binary.stat().st_size < os.path.getsize(output)
+    assert len(ezdxf.readfile(binary).modelspace().query("LWPOLYLINE")) == len(lwpolylines)
 
 
 def test_validate_license_and_email_valid(requests_mock):
@@ -108,3 +115,128 @@ def test_validate_license_and_email_request_exception(requests_mock):
     result = validate_license_and_email(
         "VALID_API_KEY_12345", "test@example.com")
     assert result is False
+
+
+def test_tracker_geojson(test_app, tmp_path):
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [
+                [[0, 0], [10, 0], [10, 0.01], [10, 10], [0, 10], [0, 0]]
+            ]}},
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [
+                [[100, 100], [110, 100], [110, 110], [100, 100]]
+            ]}},
+        ],
+    }
+    with patch("src.artifacts.artifact_dir", str(tmp_path)), \
+            patch("artifacts.artifact_dir", str(tmp_path)):
+        manifest = store_json(geojson, "application/geo+json", ".geojson")
+
+        tracker = Mock(geojson_id=manifest["path"], expires_at=datetime.now() + timedelta(hours=1))
+        with patch("tracker_views.TaskTracker") as task_tracker:
+            task_tracker.query.filter_by.return_value.first.return_value = tracker
+
+            response = test_app.get("/fastighet/api/trackers/task-1/geojson",
+                                    headers={"Accept-Encoding": "gzip"})
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert response.mimetype == "application/geo+json"
+
+            response = test_app.get("/fastighet/api/trackers/task-1/geojson")
+            assert response.json == geojson
+
+            response = test_app.get("/fastighet/api/trackers/task-1/geojson?bbox=5,5,20,20&tolerance=0.5")
+            assert response.json["features"] == [
+                {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [
+                    [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]
+                ]}},
+            ]
+
+            response = test_app.get("/fastighet/api/trackers/task-1/geojson?bbox=1,2")
+            assert response.status_code == 400
+
+
+def test_tracker_tiles(test_app, tmp_path):
+    features = [{"type": "Feature", "id": "1", "geometry": {"type": "Polygon", "coordinates": [
+        [[6639000, 648000], [6639000, 648100], [6639100, 648100], [6639100, 648000], [6639000, 648000]]
+    ]}, "properties": {}}]
+    with patch("src.artifacts.artifact_dir", str(tmp_path)), \
+            patch("artifacts.artifact_dir", str(tmp_path)):
+        manifest = store_pyramid(build_pyramid(features, "EPSG:3006", swap_axes=True))
+
+        tracker = Mock(tiles_id=manifest["path"], expires_at=datetime.now() + timedelta(hours=1))
+        with patch("tracker_views.TaskTracker") as task_tracker:
+            task_tracker.query.filter_by.return_value.first.return_value = tracker
+
+            info = test_app.get("/fastighet/tiles/task-1").json
+            assert info["tiles"] == ["/fastighet/tiles/task-1/{z}/{x}/{y}"]
+            west, south, east, north = info["bounds"]
+            assert 17.6 < west < east < 17.7 and 59.8 < south < north < 59.9
+
+            # Rutan med fastigheten på zoom 15
+            response = test_app.get("/fastighet/tiles/task-1/15/17989/9540")
+            assert [f["id"] for f in response.json["features"]] == ["1"]
+            etag = response.headers["ETag"]
+            response = test_app.get("/fastighet/tiles/task-1/15/17989/9540",
+                                    headers={"If-None-Match": etag})
+            assert response.status_code == 304
+
+            assert test_app.get("/fastighet/tiles/task-1/15/0/0").json["features"] == []
+            assert test_app.get("/fastighet/tiles/task-1/2/9/0").status_code == 400
+
+            tracker.tiles_id = None
+            assert test_app.get("/fastighet/tiles/task-1/15/0/0").status_code == 404
+
+
+def test_task_status_stores_legacy_result(test_app, tmp_path):
+    # Resultat från före artefaktlagret har DXF-filen som bytes och GeoJSON som dict
+    geojson = {"type": "FeatureCollection", "features": []}
+    task = Mock(state="SUCCESS", info={"geojson": geojson, "dxf": b"0\nEOF\n"})
+    tracker = Mock(file_path=None)
+    with patch("artifacts.artifact_dir", str(tmp_path)), \
+            patch("fastighet.routes.celery.AsyncResult", return_value=task), \
+            patch("fastighet.routes.db"), \
+            patch("fastighet.routes.TaskTracker") as task_tracker:
+        task_tracker.query.filter.return_value.all.return_value = [tracker]
+
+        response = test_app.get("/fastighet/task_status/task-1")
+        assert response.status_code == 200
+        assert response.json["file_url"] == "/fastighet/download_file/task-1"
+
+        with open(tracker.file_path, "rb") as f:
+            assert f.read() == b"0\nEOF\n"
+        with gzip.open(os.path.join(tmp_path, tracker.geojson_id)) as f:
+            assert json.load(f) == geojson
+        assert tracker.tiles_id is None
+
+
+def test_download_and_create_dxf_commits_from_file(tmp_path):
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates": [
+            [[6435049.0, 335110.0], [6435110.0, 335124.0], [6435100.0, 335200.0], [6435049.0, 335110.0]]
+        ]},
+        "properties": {"trakt": "ATTLERED", "etikett": "1:7"},
+    }]
+    bodies = []
+    gitea = MagicMock()
+    gitea.post.side_effect = lambda url, data, headers: bodies.append(b"".join(data)) or MagicMock()
+
+    with patch("artifacts.artifact_dir", str(tmp_path)), \
+            patch("src.fastighet.tasks.fetch_features", return_value=features), \
+            patch("gitea.get_gitea", return_value=gitea), \
+            patch("gitea.invalidate_repo"):
+        result = download_and_create_dxf(None, "12,55,12.01,55.01", "repo", "owner", "/", "token")
+
+    assert result["status"] == "committed"
+    assert (tmp_path / result["tiles"]["path"]).exists()
+    dxf = (tmp_path / result["dxf"]["path"]).read_bytes()
+    assert dxf.startswith(b"  0\nSECTION")
+    # Commiten innehåller samma bytes som artefakten
+    content = json.loads(bodies[0])["files"][0]["content"]
+    assert base64.b64decode(content) == dxf
+
+    # GeoJSON med (E, N) och oförändrade features
+    geojson = json.loads(gzip.decompress((tmp_path / result["geojson"]["path"]).read_bytes()))
+    assert geojson["features"][0]["geometry"]["coordinates"][0][0] == [335110.0, 6435049.0]
+    assert features[0]["geometry"]["coordinates"][0][0] == [6435049.0, 335110.0]
@@ -22,7 +22,6 @@ def client():
 def test_api_download_success(mock_send_task, mock_validate, client):
     # Setup mockar
     mock_validate.return_value = True
-    mock_send_task.return_value.id = "mock-task-id"
 
     # Setup testdata
     bbox = "12.0,55.0,12.01,55.001"
@@ -36,11 +35,12 @@ def test_api_download_success(mock_send_task, mock_validate, client):
     assert_successful_response(response, 202)
     data = response.get_json()
     assert "task_id" in data
-    assert data["task_id"] == "mock-task-id"
+    # Task-id skapas i förväg så att identiska beställningar kan samordnas
+    assert data["task_id"] == mock_send_task.call_args.kwargs["task_id"]
 
     # Kontrollera att celery-mocken anropades med rätt bbox
     mock_send_task.assert_called_once_with(
-        "hojd.routes.download_and_create_hojd", args=[bbox])
+        "hojd.routes.download_and_create_hojd", args=[bbox], task_id=data["task_id"])
 
 
 @patch("hojd.routes.validate_license_and_email")
@@ -48,7 +48,6 @@ def test_api_download_success(mock_send_task, mock_validate, client):
 def test_api_download_success_get(mock_send_task, mock_validate, client):
     # Setup mockar
     mock_validate.return_value = True
-    mock_send_task.return_value.id = "mock-task-id"
 
     # Setup testdata
     bbox = "12.0,55.0,12.01,55.001"
@@ -62,9 +61,49 @@ def test_api_download_success_get(mock_send_task, mock_validate, client):
     assert_successful_response(response, 202)
     data = response.get_json()
     assert "task_id" in data
-    assert data["task_id"] == "mock-task-id"
+    # Task-id skapas i förväg så att identiska beställningar kan samordnas
+    assert data["task_id"] == mock_send_task.call_args.kwargs["task_id"]
 
     # Kontrollera att celery-mocken anropades med rätt bbox
     mock_send_task.assert_called_once_with(
-        "hojd.routes.download_and_create_hojd", args=[bbox]
+        "hojd.routes.download_and_create_hojd", args=[bbox], task_id=data["task_id"]
     )
+
+
+@patch("hojd.routes.validate_license_and_email")
+@patch("hojd.routes.celery.send_task")
+def test_api_download_coalesces_identical_bbox(mock_send_task, mock_validate, client):
+    mock_validate.return_value = True
+
+    task_ids = []
+    for bbox, email in [
+        ("12.0,55.0,12.01,55.001", "first@example.com"),
+        ("12.00000001,55.0,12.01,55.001", "second@example.com"),
+    ]:
+        response = client.post(
+            "hojd/api/download",
+            json={"bbox": bbox},
+            headers={"Authorization": f"Bearer VALID_API_KEY_12345|{email}"},
+        )
+        assert_successful_response(response, 202)
+        task_ids.append(response.get_json()["task_id"])
+
+    # Den andra beställningen kopplas till tasken som redan startats
+    assert task_ids[0] == task_ids[1]
+    mock_send_task.assert_called_once()
+
+
+@patch("hojd.routes.validate_license_and_email")
+@patch("hojd.routes.celery.send_task")
+def test_api_download_invalid_bbox(mock_send_task, mock_validate, client):
+    mock_validate.return_value = True
+
+    for bbox in ["12.0,55.0", "12.01,55.0,12.0,55.001", "12.0,95.0,12.01,95.001"]:
+        response = client.get(
+            "hojd/api/download",
+            query_string={"bbox": bbox},
+            headers={"Authorization": "Bearer VALID_API_KEY_12345|test@example.com"},
+        )
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid bbox format"}
+    mock_send_task.assert_not_called()
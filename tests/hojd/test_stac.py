@@ -0,0 +1,60 @@
+import os
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+import src.hojd.stac as stac
+
+
+@pytest.fixture(autouse=True)
+def no_token_or_redis(tmp_path):
+    with patch("lantmateriet.get_redis", return_value=None), patch(
+        "lantmateriet.get_token", return_value="token"
+    ), patch("lantmateriet.rate_limiter.acquire", return_value=0), patch(
+        "artifacts.artifact_dir", str(tmp_path)
+    ):
+        yield
+
+
+def item(item_id, href):
+    return {
+        "id": item_id,
+        "geometry": {"type": "Point", "coordinates": [14.1, 56.4]},
+        "assets": {
+            "data": {"href": href},
+            "thumbnail": {"href": href + ".png"},
+        },
+    }
+
+
+def test_assets_streamed_to_zip_on_disk(requests_mock, tmp_path):
+    requests_mock.get("https://stac/a.tif", content=b"A" * 5000)
+    requests_mock.get("https://stac/b.tif", status_code=404)
+    items = [item("a", "https://stac/a.tif"), item("b", "https://stac/b.tif")]
+
+    zip_path = stac.save_stac_assets_to_zip(items, "0,0,1,1", asset_keys=["data"])
+
+    assert os.path.dirname(zip_path) == str(tmp_path / "tmp")
+    with zipfile.ZipFile(zip_path) as zf:
+        names = zf.namelist()
+        assert "metadata.json" in names
+        assert zf.read("a_data_a.tif") == b"A" * 5000
+        # TIFF lagras utan komprimering
+        assert zf.getinfo("a_data_a.tif").compress_type == zipfile.ZIP_STORED
+        assert "b_data_ERROR.txt" in names
+
+    # Inga temporära asset-filer ligger kvar
+    assert os.listdir(tmp_path / "tmp") == [os.path.basename(zip_path)]
+
+
+def test_asset_limit(requests_mock):
+    requests_mock.get("https://stac/x.tif", content=b"x")
+    items = [item(str(i), "https://stac/x.tif") for i in range(stac.MAX_ASSETS + 2)]
+
+    zip_path = stac.save_stac_assets_to_zip(items, "0,0,1,1", asset_keys=["data"])
+
+    with zipfile.ZipFile(zip_path) as zf:
+        names = zf.namelist()
+    assert sum(name.endswith("x.tif") for name in names) == stac.MAX_ASSETS
+    assert "_WARNING.txt" in names
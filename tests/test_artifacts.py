@@ -0,0 +1,62 @@
+import hashlib
+import os
+from unittest.mock import patch
+
+import pytest
+
+import src.artifacts as artifacts
+from src.artifacts import (
+    artifact_path,
+    read_artifact_json,
+    read_bytes,
+    store_bytes,
+    store_file,
+    store_json,
+    temp_path,
+)
+
+
+@pytest.fixture(autouse=True)
+def artifact_dir(tmp_path):
+    with patch.object(artifacts, "artifact_dir", str(tmp_path)):
+        yield tmp_path
+
+
+def test_store_bytes_manifest():
+    manifest = store_bytes(b"dxf content", "application/dxf", ".dxf")
+
+    sha256 = hashlib.sha256(b"dxf content").hexdigest()
+    assert manifest == {
+        "path": os.path.join(sha256[:2], sha256 + ".dxf"),
+        "size": len(b"dxf content"),
+        "sha256": sha256,
+        "content_type": "application/dxf",
+    }
+    assert read_bytes(manifest) == b"dxf content"
+
+
+def test_store_file_moves_and_deduplicates(artifact_dir):
+    first = temp_path(suffix=".zip")
+    with open(first, "wb") as f:
+        f.write(b"zip")
+    second = temp_path(suffix=".zip")
+    with open(second, "wb") as f:
+        f.write(b"zip")
+
+    manifest = store_file(first, "application/zip")
+    assert store_file(second, "application/zip") == manifest
+
+    assert not os.path.exists(first)
+    assert not os.path.exists(second)
+    assert os.path.exists(artifact_path(manifest))
+    assert os.listdir(artifact_dir / "tmp") == []
+
+
+def test_store_json_is_gzipped_and_deterministic():
+    data = {"type": "FeatureCollection", "features": []}
+    manifest = store_json(data, "application/geo+json", ".geojson")
+
+    assert manifest["path"].endswith(".gz")
+    assert manifest["content_type"] == "application/geo+json"
+    assert read_artifact_json(manifest) == data
+    assert store_json(data, "application/geo+json", ".geojson") == manifest
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.bbox import (
+    degrees_to_meters,
+    get_transformer,
+    measure_bbox,
+    normalize_bbox,
+    transform_bounds,
+    validate_bbox,
+)
+
+
+def test_degrees_to_meters():
+    bbox_4326 = '14.1007251130,56.4312900880,14.1167298421,56.4403897576'
+
+    coords = list(map(float, bbox_4326.split(',')))
+    minx, miny, maxx, maxy = coords
+
+    width, height = degrees_to_meters(minx, miny, maxx, maxy)
+
+    # Tillåt liten tolerans för rundningsfel (±5 meter)
+    assert abs(width - 1000) <= 5
+    assert abs(height - 1000) <= 5
+
+
+def test_get_transformer_is_cached():
+    assert get_transformer("EPSG:4326", "EPSG:3006") is get_transformer("EPSG:4326", "EPSG:3006")
+    assert get_transformer("EPSG:4326", "EPSG:3006") is not get_transformer("EPSG:3006", "EPSG:4326")
+    # Även de lokala zonerna i crs_list
+    east, north = get_transformer("EPSG:4326", "EPSG:3008").transform(13.5, 56.0)
+    assert east == pytest.approx(150000, abs=1000)
+
+
+def test_measure_bbox_follows_curved_edges():
+    # Breddgraderna blir bågar i SWEREF99 TM, med nederkantens lägsta punkt
+    # på mittmeridianen mellan hörnen
+    bounds = (13.0, 58.0, 17.0, 59.0)
+    corners = get_transformer("EPSG:4326", "EPSG:3006").transform(
+        [13.0, 17.0, 17.0, 13.0], [58.0, 58.0, 59.0, 59.0]
+    )
+    minx, miny, maxx, maxy = transform_bounds(bounds, "EPSG:4326", "EPSG:3006")
+    assert miny < min(corners[1]) - 100
+    assert maxy == pytest.approx(max(corners[1]))
+
+    width, height, area = measure_bbox(bounds)
+    assert width == pytest.approx(236500, rel=0.01)
+    assert height == pytest.approx(111400, rel=0.01)
+    # Ytan av rutan i grader, 4 x 1 grad på 58,5 grader nord
+    assert area == pytest.approx(4 * 58300 * 111400, rel=0.01)
+
+
+def test_validate_bbox():
+    assert validate_bbox(" 12, 55,12.01,55.001") == (12.0, 55.0, 12.01, 55.001)
+    for value in ["12,55", "a,b,c,d", "12.01,55,12,55.001", "12,55,190,56", None]:
+        with pytest.raises(ValueError, match="Invalid bbox format"):
+            validate_bbox(value)
+
+    bbox = "14.1007251130,56.4312900880,14.1167298421,56.4403897576"
+    assert validate_bbox(bbox, max_meters=1000)
+    with pytest.raises(ValueError, match="exceeds 500x500 meter limit"):
+        validate_bbox(bbox, max_meters=500)
+    # Arean, knappt 1 km², räknas längs de förtätade kanterna
+    with patch("src.bbox.degrees_to_meters", return_value=(0, 0)), \
+            pytest.raises(ValueError, match="area 9996.. m² exceeds 980100 m² limit"):
+        validate_bbox(bbox, max_meters=990)
+
+
+def test_normalize_bbox():
+    assert normalize_bbox("12.0,55.0,12.01,55.001") == "12,55,12.01,55.001"
+    assert normalize_bbox(" 12, 55.0000000001,12.0100004,55.001") == "12,55,12.01,55.001"
+    assert normalize_bbox("-0.0000001,-1.5,10,1.25") == "0,-1.5,10,1.25"
+    with pytest.raises(ValueError):
+        normalize_bbox("12,55,12,55")
@@ -0,0 +1,66 @@
+import pickle
+import time
+from unittest.mock import patch
+
+import fakeredis
+
+import src.cache as cache_module
+from src.cache import Cache, LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_byte_limit():
+    cache = LRUCache(max_bytes=10)
+    cache.set("a", b"12345", size=5)
+    cache.set("b", b"123456", size=6)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == b"123456"
+
+    # För stora värden cachas inte alls
+    cache.set("c", b"x" * 11, size=11)
+    assert cache.get("c") is None
+    assert cache.get("b") == b"123456"
+
+
+def test_lru_ttl():
+    cache = LRUCache()
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_shared_tier_byte_limit():
+    client = fakeredis.FakeRedis()
+    size = len(pickle.dumps(b"x" * 100))
+    with patch.object(cache_module, "get_redis", return_value=client):
+        cache = Cache("test", max_bytes=3 * size, ttl=60)
+        for key in "abc":
+            cache.set(key, b"x" * 100)
+        # Läs a från Redis, som en annan process utan a i sin LRU
+        cache._lru.clear()
+        assert cache.get("a") == b"x" * 100
+        cache.set("d", b"x" * 100)
+
+        stored = {key for key in "abcd" if client.exists(cache._redis_key(key))}
+        assert stored == {"a", "c", "d"}
+        assert int(client.get(cache._index_keys()[2])) == 3 * size
+
+        cache.delete("a")
+        assert int(client.get(cache._index_keys()[2])) == 2 * size
+        assert client.zcard(cache._index_keys()[0]) == 2
+
+        # För stora värden hamnar inte i Redis
+        cache.set("e", b"x" * 1000)
+        assert not client.exists(cache._redis_key("e"))
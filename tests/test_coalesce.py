@@ -0,0 +1,61 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+import src.coalesce as coalesce
+import src.tasks as tasks
+from src.cache import LRUCache
+from src.coalesce import forget, job_key, submit
+
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    with patch.object(coalesce, "get_redis", return_value=None), \
+            patch.object(coalesce, "_local", LRUCache(max_items=1024)):
+        yield
+
+
+def test_job_key_normalizes_bbox():
+    assert job_key("hojd", "12.0,55.0,12.01,55.001") == job_key("hojd", " 12, 55.0000000001,12.01,55.001")
+    assert job_key("hojd", "12.0,55.0,12.01,55.001") != job_key("fastighet", "12.0,55.0,12.01,55.001")
+    assert job_key("hojd", "12.0,55.0,12.01,55.001", scale=1) != job_key("hojd", "12.0,55.0,12.01,55.001")
+    assert job_key("hojd", "12.0,55.0") is None
+    assert job_key("hojd", None) is None
+
+
+def test_submit_attaches_to_running_job():
+    start = Mock()
+
+    task_id, attached = submit("hojd", "12.0,55.0,12.01,55.001", start)
+    assert not attached
+    start.assert_called_once_with(task_id)
+
+    assert submit("hojd", "12.0,55.0,12.01,55.001", start) == (task_id, True)
+    assert submit("hojd", "13.0,55.0,13.01,55.001", start)[1] is False
+    assert start.call_count == 2
+
+
+def test_failed_job_is_forgotten():
+    start = Mock()
+    task_id, _ = submit("hojd", "12.0,55.0,12.01,55.001", start)
+
+    forget(task_id)
+
+    new_task_id, attached = submit("hojd", "12.0,55.0,12.01,55.001", start)
+    assert not attached
+    assert new_task_id != task_id
+
+
+def test_start_error_releases_job():
+    with pytest.raises(RuntimeError):
+        submit("hojd", "12.0,55.0,12.01,55.001", Mock(side_effect=RuntimeError))
+
+    assert submit("hojd", "12.0,55.0,12.01,55.001", Mock())[1] is False
+
+
+def test_only_finished_failures_are_forgotten():
+    with patch.object(tasks, "finish"), patch.object(tasks, "forget") as forget_task:
+        for state in ("SUCCESS", "RETRY", "FAILURE", "REVOKED"):
+            tasks._finish_progress(task_id=state, state=state)
+
+    assert [call.args[0] for call in forget_task.call_args_list] == ["FAILURE", "REVOKED"]
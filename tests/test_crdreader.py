@@ -0,0 +1,97 @@
+import json
+import struct
+
+import pytest
+
+from src.crd_reader import (
+    CrdFile,
+    append_points,
+    crd_to_json,
+    get_point_count,
+    json_to_crd,
+)
+
+header = struct.pack("<d32s32s32s", 0.0, b"08-21-2024", b"Projekt", b"Alphanumeric")
+points = [
+    struct.pack("<ddd32s10s", 6259355.9767, 507880.3851, 123.5254, b"A K ST", b"1"),
+    struct.pack("<ddd32s10s", 6259356.2305, 507880.3633, 123.5448, b"R \xc3\xa5", b"2"),
+]
+crd = header + b"".join(points)
+
+
+def test_crd_to_json():
+    data = json.loads(crd_to_json(crd))
+
+    assert data["header"] == {
+        "id": 0.0,
+        "date": "08-21-2024",
+        "des": "Projekt",
+        "format": "Alphanumeric",
+    }
+    assert len(data["points"]) == 2
+    assert data["points"][0] == {
+        "nor": 6259355.9767,
+        "eas": 507880.3851,
+        "elv": 123.5254,
+        "des": "A K ST",
+        "id": "1",
+    }
+    assert data["points"][1]["des"] == "R å"
+
+
+def test_crd_to_json_same_format_as_json_dumps():
+    json_text = crd_to_json(crd)
+    assert json_text == json.dumps(json.loads(json_text), indent=4)
+
+
+def test_json_to_crd_round_trip():
+    assert json_to_crd(crd_to_json(crd)) == crd
+    assert json_to_crd(crd_to_json(header)) == header
+
+
+def test_crd_file_random_access():
+    crd_file = CrdFile(crd)
+
+    assert len(crd_file) == get_point_count(crd) == 2
+    assert crd_file[1]["id"] == "2"
+    assert crd_file[-1] == crd_file[1]
+    assert [point["id"] for point in crd_file[0:2]] == ["1", "2"]
+    assert crd_file.ids == ["1", "2"]
+    assert list(crd_file) == json.loads(crd_to_json(crd))["points"]
+    with pytest.raises(IndexError):
+        crd_file[2]
+
+
+def test_crd_file_chunks_and_partial_json():
+    crd_file = CrdFile(crd)
+
+    assert [len(chunk) for chunk in crd_file.iter_chunks(1)] == [1, 1]
+    data = json.loads(crd_file.to_json(1, 2))
+    assert [point["id"] for point in data["points"]] == ["2"]
+
+
+def test_crd_file_open(tmp_path):
+    path = tmp_path / "projekt.crd"
+    path.write_bytes(crd)
+
+    with CrdFile.open(path) as crd_file:
+        assert len(crd_file) == 2
+        assert crd_file.header["des"] == "Projekt"
+        mapped = crd_file._mmap
+    assert mapped.closed
+
+
+def test_append_points():
+    new_points = [
+        {"nor": 1.0, "eas": 2.0, "elv": 3.0, "des": "K", "id": "1"},
+        {"nor": 4.0, "eas": 5.0, "elv": 6.0, "des": "L", "id": "5"},
+    ]
+    appended = append_points(crd, new_points)
+
+    # Befintliga poster lämnas orörda
+    assert appended.startswith(crd)
+    assert get_point_count(appended) == 4
+    crd_file = CrdFile(appended)
+    assert crd_file.ids == ["1", "2", "3", "7"]
+    assert crd_file[3]["des"] == "L"
+    assert crd_file[3]["nor"] == 4.0
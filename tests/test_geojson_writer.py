@@ -0,0 +1,70 @@
+import copy
+import json
+
+from src.geojson_writer import iter_feature_collection, transform_geometry
+
+
+def _collection(features, **kwargs):
+    return json.loads(b"".join(iter_feature_collection(features, **kwargs)))
+
+
+FEATURES = [
+    {
+        "type": "Feature",
+        "geometry": {"type": "MultiPolygon", "coordinates": [
+            [
+                [[6400000.1234, 330000.5678], [6400010, 330000], [6400010, 330010], [6400000.1234, 330000.5678]],
+                [[6400002, 330002], [6400003, 330002], [6400003, 330003], [6400002, 330002]],
+            ],
+            [[[6400100, 330100], [6400110, 330100], [6400110, 330110], [6400100, 330100]]],
+        ]},
+        "properties": {"etikett": "1:7", "trakt": "ÅBY"},
+    },
+    {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [6400000, 330000, 12.5]},
+        "properties": {},
+    },
+]
+
+
+def test_swap_axes_and_precision():
+    original = copy.deepcopy(FEATURES)
+
+    collection = _collection(FEATURES, swap_axes=True, precision=2)
+
+    assert collection["type"] == "FeatureCollection"
+    multi = collection["features"][0]["geometry"]["coordinates"]
+    # Strukturen med delar, hål och ringar behålls
+    assert [len(ring) for polygon in multi for ring in polygon] == [4, 4, 4]
+    assert multi[0][0][0] == [330000.57, 6400000.12]
+    assert multi[1][0][2] == [330110, 6400110]
+    # Höjden följer med, bara de två första axlarna kastas om
+    assert collection["features"][1]["geometry"]["coordinates"] == [330000, 6400000, 12.5]
+    assert collection["features"][0]["properties"] == {"etikett": "1:7", "trakt": "ÅBY"}
+    # Indata ändras inte
+    assert FEATURES == original
+
+
+def test_output_is_deterministic_and_unchanged_by_default():
+    first = b"".join(iter_feature_collection(FEATURES))
+    assert first == b"".join(iter_feature_collection(copy.deepcopy(FEATURES)))
+    assert json.loads(first)["features"] == FEATURES
+    assert _collection([]) == {"type": "FeatureCollection", "features": []}
+
+
+def test_transform_geometry_edge_cases():
+    assert transform_geometry(None) is None
+    empty = {"type": "Polygon", "coordinates": []}
+    assert transform_geometry(empty, swap_axes=True) is empty
+
+    # Punkter med olika antal dimensioner
+    line = {"type": "LineString", "coordinates": [[1, 2], [3, 4, 5]]}
+    assert transform_geometry(line, swap_axes=True)["coordinates"] == [[2, 1], [4, 3, 5]]
+
+    collection = {"type": "GeometryCollection", "geometries": [
+        {"type": "Point", "coordinates": [1, 2]},
+    ]}
+    assert transform_geometry(collection, swap_axes=True)["geometries"] == [
+        {"type": "Point", "coordinates": [2, 1]},
+    ]
@@ -0,0 +1,79 @@
+import pytest
+
+import numpy as np
+
+from src.geometry import (
+    douglas_peucker,
+    douglas_peucker_ranks,
+    geometry_bounds,
+    parse_bbox,
+    select_features,
+    simplify_geometry,
+    simplify_line,
+)
+
+
+def _polygon(ring):
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def test_parse_bbox():
+    assert parse_bbox("1,2,3,4") == (1.0, 2.0, 3.0, 4.0)
+    for value in ("1,2,3", "3,2,1,4", "a,b,c,d", "1,2,nan,4"):
+        with pytest.raises(ValueError):
+            parse_bbox(value)
+
+
+def test_geometry_bounds():
+    multi = {
+        "type": "MultiPolygon",
+        "coordinates": [
+            [[[0, 0], [1, 0], [1, 1], [0, 0]]],
+            [[[5, 5], [6, 5], [6, 7], [5, 5]]],
+        ],
+    }
+    assert geometry_bounds(multi) == (0.0, 0.0, 6.0, 7.0)
+    assert geometry_bounds({"type": "Polygon", "coordinates": []}) is None
+
+
+def test_simplify_line_removes_points_within_tolerance():
+    line = [[0, 0], [1, 0.05], [2, -0.05], [3, 0], [3, 3]]
+    assert simplify_line(line, 0.1) == [[0, 0], [3, 0], [3, 3]]
+    assert simplify_line(line, 0.01) == line
+
+
+def test_douglas_peucker_ranks_match_every_tolerance():
+    rng = np.random.default_rng(1)
+    line = np.cumsum(rng.normal(size=(80, 2)), axis=0)
+    ring = np.vstack([line, line[:1]])
+    for points in (line, ring):
+        ranks = douglas_peucker_ranks(points)
+        for tolerance in (0, 0.2, 1, 3, 10):
+            assert ((ranks > tolerance) == douglas_peucker(points, tolerance)).all()
+
+
+def test_simplify_polygon_keeps_valid_rings():
+    ring = [[0, 0], [10, 0], [10, 0.01], [10, 10], [0, 10], [0, 0]]
+    simplified = simplify_geometry(_polygon(ring), 0.5)
+    assert simplified["coordinates"] == [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]
+
+    # En ring som skulle bli för kort behålls som den är
+    small = [[0, 0], [0.1, 0], [0.1, 0.1], [0, 0]]
+    assert simplify_geometry(_polygon(small), 1)["coordinates"] == [small]
+
+
+def test_select_features_filters_and_does_not_mutate():
+    near = {"type": "Feature", "geometry": _polygon(
+        [[0, 0], [10, 0], [10, 0.01], [10, 10], [0, 10], [0, 0]]
+    )}
+    far = {"type": "Feature", "geometry": _polygon(
+        [[100, 100], [110, 100], [110, 110], [100, 100]]
+    )}
+    geojson = {"type": "FeatureCollection", "features": [near, far]}
+
+    selected = select_features(geojson, bbox=(5, 5, 20, 20), tolerance=0.5)
+
+    assert len(selected["features"]) == 1
+    assert len(selected["features"][0]["geometry"]["coordinates"][0]) == 5
+    assert len(near["geometry"]["coordinates"][0]) == 6
+    assert geojson["features"] == [near, far]
@@ -0,0 +1,211 @@
+import base64
+import io
+import json
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+from requests import HTTPError
+
+from src.gitea import (
+    b64encode_stream,
+    fetch_dir_listing,
+    fetch_file,
+    fetch_file_content,
+    fetch_settings_index,
+    file_exists,
+    get_gitea,
+    iter_json_body,
+    pool_stats,
+    read_setting,
+)
+
+
+def test_sessions_share_connection_pool():
+    first = get_gitea({"access_token": "a", "token_type": "Bearer"})
+    second = get_gitea({"access_token": "b", "token_type": "Bearer"})
+
+    # Varje användare har sin egen token men samma pool
+    assert first.token["access_token"] == "a"
+    assert second.token["access_token"] == "b"
+    assert first.get_adapter("https://gitea") is second.get_adapter("https://gitea")
+
+
+def test_close_keeps_shared_pool():
+    first = get_gitea({"access_token": "a", "token_type": "Bearer"})
+    adapter = first.get_adapter("https://gitea")
+    first.close()
+
+    second = get_gitea({"access_token": "b", "token_type": "Bearer"})
+    assert second.get_adapter("https://gitea") is adapter
+    assert adapter.poolmanager is not None
+
+
+def test_pool_stats():
+    stats = pool_stats()
+    assert stats["hits"] == stats["checkouts"] - stats["new_connections"]
+    assert {"wait_time", "max_wait_time", "pid", "pool_maxsize"} <= stats.keys()
+
+
+def _repo_gitea(readable: bool):
+    """Gitea-mock för en användare som får, eller inte får, läsa repot."""
+    def get(url, **kwargs):
+        response = Mock()
+        if not readable:
+            response.raise_for_status.side_effect = HTTPError("404")
+        elif url.endswith("/repos/owner/private_repo"):
+            response.json.return_value = {"default_branch": "main"}
+        elif "/branches/" in url:
+            response.json.return_value = {"commit": {"id": "sha1"}}
+        else:
+            response.json.return_value = [{"name": "a.crd", "type": "file"}]
+        return response
+
+    gitea = Mock()
+    gitea.get.side_effect = get
+    return gitea
+
+
+@patch("cache.get_redis", return_value=None)
+def test_dir_listing_cache_checks_access_per_user(_):
+    owner = _repo_gitea(readable=True)
+    assert fetch_dir_listing(owner, "owner", "private_repo", "dir") == [
+        {"name": "a.crd", "type": "file"}
+    ]
+
+    # Listningen finns i cachen, men den andra användaren får inte läsa repot
+    other = _repo_gitea(readable=False)
+    with pytest.raises(HTTPError):
+        fetch_dir_listing(other, "owner", "private_repo", "dir")
+    assert other.get.call_args.args[0].endswith("/repos/owner/private_repo")
+
+    # En ny förfrågan från ägaren svarar ur cachen efter en kontroll av repot
+    again = _repo_gitea(readable=True)
+    fetch_dir_listing(again, "owner", "private_repo", "dir")
+    assert [call.args[0].rsplit("/", 2)[-2:] for call in again.get.call_args_list] == [
+        ["owner", "private_repo"]
+    ]
+
+
+@patch("cache.get_redis", return_value=None)
+def test_settings_index_and_cached_setting(_):
+    tree_response = Mock()
+    tree_response.json.return_value = {
+        "tree": [
+            {"path": "settings.ini", "type": "blob", "sha": "root"},
+            {"path": "proj", "type": "tree", "sha": "t1"},
+            {"path": "proj/a/settings.ini", "type": "blob", "sha": "deep"},
+            {"path": "proj/a/b.crd", "type": "blob", "sha": "crd"},
+        ],
+        "truncated": False,
+    }
+    blob_response = Mock()
+    blob_response.json.return_value = {
+        "content": base64.b64encode(b"[SurveyExport]\ndefaultCrs=EPSG:3008\n").decode()
+    }
+
+    gitea = Mock()
+    gitea.get.side_effect = lambda url, **kwargs: (
+        tree_response if "/git/trees/" in url else blob_response
+    )
+
+    index = fetch_settings_index(gitea, "owner", "settings_repo", "sha1")
+    assert index == {"": "root", "proj/a": "deep"}
+
+    assert read_setting(gitea, "owner", "settings_repo", "deep", "defaultCrs") == "EPSG:3008"
+    assert read_setting(gitea, "owner", "settings_repo", "deep", "defaultCrs") == "EPSG:3008"
+    assert read_setting(gitea, "owner", "settings_repo", "deep", "missing") is None
+
+    # Ett träd-anrop och ett blob-anrop per inställning
+    urls = [call.args[0] for call in gitea.get.call_args_list]
+    assert sum("/git/trees/" in url for url in urls) == 1
+    assert sum("/git/blobs/deep" in url for url in urls) == 2
+
+    # Indexet och värdet finns i cachen men lämnas inte ut utan läsrätt
+    other = Mock()
+    other.get.return_value.raise_for_status.side_effect = HTTPError("404")
+    with pytest.raises(HTTPError):
+        fetch_settings_index(other, "owner", "settings_repo", "sha1")
+    with pytest.raises(HTTPError):
+        read_setting(other, "owner", "settings_repo", "deep", "defaultCrs")
+
+
+def test_b64encode_stream():
+    content = bytes(range(256)) * 3001
+    expected = base64.b64encode(content)
+
+    assert b"".join(b64encode_stream(content)) == expected
+    assert b"".join(b64encode_stream(io.BytesIO(content))) == expected
+    # Bitar vars längd inte är delbar med 3
+    chunks = (content[i:i + 1000] for i in range(0, len(content), 1000))
+    assert b"".join(b64encode_stream(chunks)) == expected
+
+
+def test_iter_json_body_streams_raw_content():
+    commit_data = {
+        "branch": "main",
+        "message": "Lägg till filer",
+        "files": [
+            {"operation": "create", "path": "a.crd", "content": b"\x00\x01crd"},
+            {"operation": "create", "path": "b.rw5", "content": io.BytesIO(b"rw5")},
+            {"operation": "delete", "path": "c.txt"},
+            {"operation": "update", "path": "d.txt", "content": "ZA==", "sha": "1"},
+        ],
+    }
+    body = json.loads(b"".join(iter_json_body(commit_data)))
+
+    files = body["files"]
+    assert base64.b64decode(files[0]["content"]) == b"\x00\x01crd"
+    assert base64.b64decode(files[1]["content"]) == b"rw5"
+    assert "content" not in files[2]
+    assert files[3]["content"] == "ZA=="
+    assert body["message"] == "Lägg till filer"
+    # Indata ändras inte
+    assert commit_data["files"][0]["content"] == b"\x00\x01crd"
+
+
+def test_fetch_file_content_uses_raw_endpoint():
+    response = MagicMock(status_code=200, headers={})
+    response.__enter__.return_value = response
+    response.content = b"raw bytes"
+    gitea = Mock()
+    gitea.get.return_value = response
+
+    assert fetch_file_content(gitea, "owner", "repo", "dir/a.rw5") == b"raw bytes"
+    url = gitea.get.call_args.args[0]
+    assert url.endswith("/repos/owner/repo/raw/dir/a.rw5")
+    assert gitea.get.call_args.kwargs["stream"] is True
+
+
+def test_file_exists_for_files_and_folders():
+    def get(url, **kwargs):
+        # /raw svarar bara för filer, contents för både filer och mappar
+        found = url.endswith("/raw/dir/a.rw5") or url.endswith("/contents/dir")
+        return Mock(status_code=200 if found else 404)
+
+    gitea = Mock()
+    gitea.get.side_effect = get
+
+    assert file_exists(gitea, "owner", "repo", "dir/a.rw5")
+    assert gitea.get.call_count == 1
+    assert file_exists(gitea, "owner", "repo", "dir")
+    assert not file_exists(gitea, "owner", "repo", "missing.rw5")
+
+
+@patch("cache.get_redis", return_value=None)
+def test_fetch_file_revalidates_with_etag(_):
+    ok = MagicMock(status_code=200, headers={"ETag": '"blob1"'}, content=b"v1")
+    ok.__enter__.return_value = ok
+    not_modified = MagicMock(status_code=304, headers={"ETag": '"blob1"'})
+    not_modified.__enter__.return_value = not_modified
+
+    gitea = Mock()
+    gitea.get.side_effect = [ok, not_modified]
+
+    assert fetch_file(gitea, "owner", "etag_repo", "a.crd") == (b"v1", "blob1")
+    assert fetch_file(gitea, "owner", "etag_repo", "a.crd") == (b"v1", "blob1")
+
+    first, second = gitea.get.call_args_list
+    assert first.kwargs["headers"] is None
+    assert second.kwargs["headers"] == {"If-None-Match": '"blob1"'}
+    # Bara det första svaret lästes
+    not_modified.raise_for_status.assert_not_called()
@@ -50,9 +50,22 @@ def test_repo_contents(oauth2session, test_app):
         Mock()
     )  # Gör så att raise_for_status inte gör något
 
+    # Repo- och grensvar används för att cacha mappinnehållet per commit
+    repo_response = Mock()
+    repo_response.json.return_value = {"default_branch": "main"}
+    branch_response = Mock()
+    branch_response.json.return_value = {"commit": {"id": "abc123"}}
+
+    def get(url, **kwargs):
+        if url.endswith("/repos/user/repo"):
+            return repo_response
+        if "/branches/" in url:
+            return branch_response
+        return mock_response
+
     # Ställ in mock-objektet så att det returnerar mock-responsen
     mock_oauth2 = Mock()
-    mock_oauth2.get.return_value = mock_response
+    mock_oauth2.get.side_effect = get
     oauth2session.return_value = mock_oauth2
 
     response = test_app.get("/repo/user/repo/contents/file")
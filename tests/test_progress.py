@@ -0,0 +1,105 @@
+import json
+from unittest.mock import Mock, patch
+
+import src.progress as progress
+from src.progress import event_stream, finish, format_event, publish, report, start
+
+
+def test_format_event():
+    assert format_event({"event": "pages", "pages": 2}) == (
+        'event: progress\ndata: {"event": "pages", "pages": 2}\n\n'
+    )
+    assert format_event({"event": "failed"}).startswith("event: done\n")
+
+
+def test_publish_without_redis_does_nothing():
+    with patch.object(progress, "get_redis", return_value=None):
+        publish("task-1", "pages", pages=1)
+
+
+def test_report_publishes_for_current_task():
+    client = Mock()
+    pipe = client.pipeline.return_value
+    with patch.object(progress, "get_redis", return_value=client):
+        report("pages", pages=1)
+        client.pipeline.assert_not_called()
+
+        start("task-1")
+        report("pages", pages=1)
+        finish("task-1", "SUCCESS")
+        report("pages", pages=2)
+
+    messages = [call.args for call in pipe.publish.call_args_list]
+    assert messages == [
+        ("repo_browser:progress:task-1", json.dumps({"event": "pages", "pages": 1})),
+        ("repo_browser:progress:task-1", json.dumps({"event": "done", "state": "SUCCESS"})),
+    ]
+    pipe.set.assert_called_with(
+        "repo_browser:progress:task-1:last",
+        json.dumps({"event": "done", "state": "SUCCESS"}),
+        ex=progress.LAST_EVENT_TTL,
+    )
+
+
+def test_event_stream_relays_until_done():
+    client = Mock()
+    client.get.return_value = json.dumps({"event": "pages", "pages": 1})
+    pubsub = client.pubsub.return_value
+    pubsub.get_message.side_effect = [
+        None,
+        {"data": json.dumps({"event": "pages", "pages": 2}).encode()},
+        {"data": json.dumps({"event": "done", "state": "SUCCESS"}).encode()},
+    ]
+
+    chunks = list(event_stream(client, "task-1"))
+
+    pubsub.subscribe.assert_called_once_with("repo_browser:progress:task-1")
+    assert chunks == [
+        f"retry: {progress.RECONNECT_DELAY}\n\n",
+        format_event({"event": "pages", "pages": 1}),
+        ": keepalive\n\n",
+        format_event({"event": "pages", "pages": 2}),
+        format_event({"event": "done", "state": "SUCCESS"}),
+    ]
+    pubsub.close.assert_called_once()
+
+
+def test_event_stream_ends_on_stored_final_event():
+    client = Mock()
+    client.get.return_value = json.dumps({"event": "failed", "state": "FAILURE"})
+
+    chunks = list(event_stream(client, "task-1"))
+
+    assert chunks[-1] == format_event({"event": "failed", "state": "FAILURE"})
+    client.pubsub.return_value.get_message.assert_not_called()
+
+
+def _log_in(test_app, tasks=()):
+    with test_app.session_transaction() as s:
+        s["oauth_token"] = {"access_token": "token"}
+        s["user"] = {"email": "user@example.com"}
+        s["tasks"] = list(tasks)
+
+
+def test_events_endpoint_without_redis(test_app):
+    _log_in(test_app, tasks=["task-1"])
+    with patch("tasks_routes.get_redis", return_value=None):
+        response = test_app.get("/api/events/task-1")
+    assert response.status_code == 503
+
+
+def test_events_endpoint_only_streams_own_tasks(test_app):
+    # Utan inloggning skickas man till startsidan
+    assert test_app.get("/api/events/task-1").status_code == 302
+
+    _log_in(test_app)
+    with patch("tasks_routes.TaskTracker") as task_tracker, \
+            patch("tasks_routes.get_redis") as get_redis:
+        task_tracker.query.filter_by.return_value.first.return_value = None
+        response = test_app.get("/api/events/someone-elses")
+
+    assert response.status_code == 404
+    task_tracker.query.filter_by.assert_called_once_with(
+        user_email="user@example.com", task_id="someone-elses"
+    )
+    get_redis.assert_not_called()
@@ -1,6 +1,7 @@
 import pytest
 
 from src.rw5_reader import (
+    Rw5Document,
     change_jobb_name,
     change_point_id,
     get_all_points,
@@ -229,3 +230,46 @@ def test_rw5_to_json_and_back():
     rw5_data = json_to_rw5(json_data)
     assert "JB,NMNYADAL,DT03-17-2021,TM14:45:50" in rw5_data
     assert "GPS,PN1,LA56.534182082079,LN14.580282246876,EL233.590624" in rw5_data
+
+
+def test_rw5_document_matches_regex_functions():
+    for content in (data, data2):
+        document = Rw5Document(content)
+
+        assert str(document) == content
+        assert document.header == get_rw5_header(content)
+        for point_id in ["1", "2", "3", "4", "5", "6", "22", "23", "99"]:
+            assert document.get_point(point_id) == get_point(content, point_id)
+
+
+def test_rw5_document_get_points():
+    document = Rw5Document(data)
+    points = document.get_points([23, 4])
+
+    assert points == get_point(data, 23) + get_point(data, 4)
+    assert document.point_ids == ["1", "2", "3", "4", "5", "22", "23"]
+
+
+def test_rw5_document_change_point_id():
+    document = Rw5Document(data)
+    document.change_point_id(2, 5)
+    assert document.get_point(5) == ""
+    assert document.get_point(7).startswith("GPS,PN7,")
+    assert str(document) == change_point_id(data, 2, 5)
+
+    document = Rw5Document(data)
+    document.change_point_id(100)
+    assert document.get_point(104) == get_point(change_point_id(data, 100), 104)
+    assert str(document) == change_point_id(data, 100)
+
+
+def test_rw5_document_extract_and_renumber():
+    document = Rw5Document(data)
+    points = document.extract([23, 4, 77])
+    assert points.point_ids == ["23", "4"]
+
+    points.change_point_id(10)
+    assert str(points) == change_point_id(get_point(data, 23) + get_point(data, 4), 10)
+    assert points.get_point(14) == change_point_id(get_point(data, 4), 10)
+    # Originalet ändras inte
+    assert str(document) == data
@@ -0,0 +1,84 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from requests import HTTPError
+
+from src.search_index import TreeIndex, get_tree_index
+
+tree = [
+    {"path": ".gitea", "type": "tree", "sha": "1"},
+    {"path": ".gitea/workflows/export.yml", "type": "blob", "sha": "2"},
+    {"path": "Projekt", "type": "tree", "sha": "3"},
+    {"path": "Projekt/gata.crd", "type": "blob", "sha": "4"},
+    {"path": "Projekt/gata.rw5", "type": "blob", "sha": "5"},
+    {"path": "Projekt/Gatan 2/gata.crd", "type": "blob", "sha": "6"},
+    {"path": "Projekt/gatubelysning.dxf", "type": "blob", "sha": "7"},
+    {"path": "settings.ini", "type": "blob", "sha": "8"},
+]
+
+
+def test_search_ranks_exact_and_shallow_first():
+    index = TreeIndex("a", tree)
+    items, total = index.search("gata.crd")
+
+    assert total == 2
+    assert [item["path"] for item in items] == [
+        "Projekt/gata.crd",
+        "Projekt/Gatan 2/gata.crd",
+    ]
+
+
+def test_search_short_term_and_hidden_paths():
+    index = TreeIndex("a", tree)
+    items, total = index.search("ga")
+
+    paths = [item["path"] for item in items]
+    assert total == 4
+    assert ".gitea" not in paths
+    assert paths[0] == "Projekt/gata.crd"
+
+
+def test_search_pagination():
+    index = TreeIndex("a", tree)
+    first, total = index.search("gat", page=1, per_page=2)
+    second, _ = index.search("gat", page=2, per_page=2)
+
+    assert total == 4
+    assert len(first) == 2
+    assert not {item["path"] for item in first} & {item["path"] for item in second}
+
+
+def test_incremental_update():
+    index = TreeIndex("a", tree)
+    new_tree = [item for item in tree if item["path"] != "Projekt/gata.rw5"]
+    new_tree.append({"path": "Projekt/torg.crd", "type": "blob", "sha": "9"})
+
+    updated, changes = index.updated("b", new_tree)
+    assert changes == 2
+    assert updated.sha == "b"
+    assert updated.search("gata.rw5") == ([], 0)
+    assert updated.search("torg")[1] == 1
+    # Det gamla indexet ändras inte
+    assert index.sha == "a"
+    assert index.search("gata.rw5")[1] == 1
+    assert index.search("torg") == ([], 0)
+
+    # Bara postningarna som skillnaden rör kopieras, resten delas
+    touched = {"gat", "ata", "ta.", "a.r", ".rw", "rw5", "tor", "org", "rg.", "g.c", ".cr", "crd"}
+    for trigram, paths in index.postings.items():
+        if trigram in touched:
+            assert updated.postings.get(trigram) is not paths
+        else:
+            assert updated.postings[trigram] is paths
+
+
+def test_get_tree_index_checks_access_on_cache_hit():
+    gitea = Mock()
+    gitea.get.return_value.json.return_value = {"tree": tree, "truncated": False}
+    with patch("cache.get_redis", return_value=None):
+        assert get_tree_index(gitea, "owner", "search_repo", "a").sha == "a"
+
+        other = Mock()
+        other.get.return_value.raise_for_status.side_effect = HTTPError("404")
+        with pytest.raises(HTTPError):
+            get_tree_index(other, "owner", "search_repo", "a")
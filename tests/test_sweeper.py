@@ -0,0 +1,93 @@
+import os
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+import src.sweeper as sweeper
+from src.db import TaskTracker
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    TaskTracker.__table__.create(engine)
+    return engine
+
+
+def _add(engine, task_id, expires_at, file_path=None, geojson_id=None, tiles_id=None):
+    with engine.begin() as conn:
+        conn.execute(insert(TaskTracker).values(
+            user_email="user@example.com",
+            task_id=task_id,
+            expires_at=expires_at,
+            file_path=file_path,
+            geojson_id=geojson_id,
+            tiles_id=tiles_id,
+        ))
+
+
+def _trackers(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(TaskTracker.task_id, TaskTracker.file_path, TaskTracker.geojson_id,
+                   TaskTracker.tiles_id)
+        ).all()
+    return {task_id: tuple(values) for task_id, *values in rows}
+
+
+def test_sweep_expired_trackers(engine, tmp_path):
+    now = datetime.now()
+    expired_file = tmp_path / "expired.dxf"
+    shared_file = tmp_path / "shared.dxf"
+    expired_geojson = tmp_path / "expired.geojson.gz"
+    shared_geojson = tmp_path / "shared.geojson.gz"
+    expired_tiles = tmp_path / "expired.tiles"
+    for path in (expired_file, shared_file, expired_geojson, shared_geojson, expired_tiles):
+        path.write_bytes(b"data")
+
+    _add(engine, "expired", now - timedelta(hours=1), str(expired_file), "expired.geojson.gz",
+         "expired.tiles")
+    _add(engine, "shared-expired", now - timedelta(hours=1), str(shared_file), "shared.geojson.gz")
+    _add(engine, "shared-active", now + timedelta(hours=1), str(shared_file), "shared.geojson.gz")
+    _add(engine, "running", None)
+
+    with patch.object(sweeper, "BATCH_SIZE", 1), \
+            patch.object(sweeper, "artifact_dir", str(tmp_path)):
+        stats = sweeper.sweep_expired_trackers(engine, now)
+
+    assert stats == {"trackers": 2, "files": 3}
+    assert not expired_file.exists()
+    assert not expired_geojson.exists()
+    assert not expired_tiles.exists()
+    # En aktiv tracker använder fortfarande samma artefakter
+    assert shared_file.exists()
+    assert shared_geojson.exists()
+    assert _trackers(engine) == {
+        "expired": (None, None, None),
+        "shared-expired": (None, None, None),
+        "shared-active": (str(shared_file), "shared.geojson.gz", None),
+        "running": (None, None, None),
+    }
+
+
+def test_sweep_orphan_artifacts(engine, tmp_path):
+    old = time.time() - sweeper.ORPHAN_MAX_AGE - 60
+    orphan = tmp_path / "ab" / "orphan.geojson"
+    in_use = tmp_path / "cd" / "in_use.dxf"
+    recent = tmp_path / "ef" / "recent.zip"
+    for path in (orphan, in_use, recent):
+        path.parent.mkdir()
+        path.write_bytes(b"data")
+    os.utime(orphan, (old, old))
+    os.utime(in_use, (old, old))
+    _add(engine, "active", datetime.now() + timedelta(hours=1), str(in_use))
+
+    with patch.object(sweeper, "artifact_dir", str(tmp_path)):
+        assert sweeper.sweep_orphan_artifacts(engine) == 1
+
+    assert not orphan.exists()
+    assert in_use.exists()
+    assert recent.exists()
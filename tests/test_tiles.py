@@ -0,0 +1,130 @@
+import gzip
+import math
+from unittest.mock import patch
+
+import pytest
+from pyproj import Transformer
+
+from src.cache import LRUCache
+from src.tiles import (
+    HALF_WORLD,
+    TILE_MAX_ZOOM,
+    TILE_MIN_ZOOM,
+    build_pyramid,
+    load_level,
+    load_pyramid,
+    select_tile,
+    store_pyramid,
+    tile_bounds,
+)
+
+
+def _tile(lon, lat, zoom):
+    """XYZ-rutan som innehåller en punkt i WGS84."""
+    n = 2 ** zoom
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def _circle(north, east, radius, count):
+    ring = [
+        [north + radius * math.sin(2 * math.pi * i / count),
+         east + radius * math.cos(2 * math.pi * i / count)]
+        for i in range(count)
+    ]
+    return ring + [ring[0]]
+
+
+# Två fastigheter i Uppsala i Lantmäteriets (N, E) i SWEREF 99 TM
+FEATURES = [
+    {"type": "Feature", "id": "a", "properties": {"etikett": "1:1"},
+     "geometry": {"type": "Polygon", "coordinates": [
+         _circle(6639000, 648000, 100, 400), _circle(6639000, 648000, 20, 40),
+     ]}},
+    {"type": "Feature", "id": "b", "properties": {"etikett": "1:2"},
+     "geometry": {"type": "MultiPolygon", "coordinates": [
+         [_circle(6645000, 648000, 50, 100)],
+         [_circle(6645200, 648000, 1, 8)],
+     ]}},
+]
+
+
+def test_tile_bounds():
+    assert tile_bounds(0, 0, 0) == pytest.approx((-HALF_WORLD, -HALF_WORLD, HALF_WORLD, HALF_WORLD))
+    assert tile_bounds(1, 1, 0) == pytest.approx((0, 0, HALF_WORLD, HALF_WORLD))
+
+
+def test_build_pyramid_simplifies_per_zoom():
+    pyramid = build_pyramid(FEATURES, "EPSG:3006", swap_axes=True)
+
+    levels = pyramid["levels"]
+    assert len(levels) == TILE_MAX_ZOOM - TILE_MIN_ZOOM + 1
+    counts = [len(level[0]["geometry"]["coordinates"][0]) for level in levels]
+    # Färre punkter ju lägre zoom, men ringen finns kvar
+    assert counts == sorted(counts)
+    assert counts[0] >= 4 and counts[-1] > counts[0]
+    for level in levels:
+        polygon = level[0]["geometry"]["coordinates"]
+        assert len(polygon) == 2
+        assert all(ring[0] == ring[-1] and len(ring) >= 4 for ring in polygon)
+        assert [len(part) for part in level[1]["geometry"]["coordinates"]] == [1, 1]
+        assert level[0]["id"] == "a" and level[0]["properties"] == {}
+
+    # Projicerat till EPSG:3857 från (E, N)
+    to_3857 = Transformer.from_crs("EPSG:3006", "EPSG:3857", always_xy=True)
+    north, east = FEATURES[0]["geometry"]["coordinates"][0][0]
+    assert levels[-1][0]["geometry"]["coordinates"][0][0] == pytest.approx(
+        to_3857.transform(east, north), abs=0.1
+    )
+    minx, miny, maxx, maxy = pyramid["bounds"]
+    assert minx < maxx and miny < maxy
+
+
+def test_select_tile(tmp_path):
+    with patch("artifacts.artifact_dir", str(tmp_path)):
+        manifest = store_pyramid(build_pyramid(FEATURES, "EPSG:3006", swap_axes=True))
+        pyramid = load_pyramid(manifest["path"])
+        to_wgs84 = Transformer.from_crs("EPSG:3006", "EPSG:4326", always_xy=True)
+
+        lon, lat = to_wgs84.transform(648000, 6639000)
+        selected = select_tile(pyramid, 16, *_tile(lon, lat, 16))
+        assert [f["id"] for f in selected["features"]] == ["a"]
+
+        # Över högsta zoom används den mest detaljerade nivån
+        deep = select_tile(pyramid, 20, *_tile(lon, lat, 20))
+        assert deep["features"] == [load_level(pyramid, len(pyramid["levels"]) - 1)[0][0]]
+
+        # Under lägsta zoom syns båda i samma ruta
+        assert len(select_tile(pyramid, 2, *_tile(lon, lat, 2))["features"]) == 2
+        assert select_tile(pyramid, 16, 0, 0)["features"] == []
+
+        with pytest.raises(ValueError):
+            select_tile(pyramid, 3, 8, 0)
+
+
+def test_build_pyramid_wgs84_and_empty():
+    footprint = {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [
+        [[17.0, 59.0], [17.1, 59.0], [17.1, 59.1], [17.0, 59.1], [17.0, 59.0]]
+    ]}}
+    pyramid = build_pyramid([footprint, {"type": "Feature", "geometry": None}], "EPSG:4326")
+    assert [len(level) for level in pyramid["levels"]] == [1] * len(pyramid["levels"])
+    assert "id" not in pyramid["levels"][0][0]
+
+    assert build_pyramid([], "EPSG:4326")["bounds"] is None
+
+
+def test_tile_reads_only_its_level(tmp_path):
+    built = build_pyramid(FEATURES, "EPSG:3006", swap_axes=True)
+    with patch("artifacts.artifact_dir", str(tmp_path)):
+        manifest = store_pyramid(built)
+        assert store_pyramid(built) == manifest
+        pyramid = load_pyramid(manifest["path"])
+        assert pyramid["bounds"] == built["bounds"]
+
+        with patch("src.tiles._levels", LRUCache()), \
+                patch.object(gzip, "decompress", wraps=gzip.decompress) as decompress:
+            features, bounds = load_level(pyramid, 3)
+            decompress.assert_called_once()
+        assert features == built["levels"][3]
+        assert bounds.shape == (2, 4)